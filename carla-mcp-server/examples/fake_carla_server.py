@@ -0,0 +1,54 @@
+"""
+CARLA服务器替身程序 - 用于测试服务器池
+只模拟启动延迟并监听 -carla-port 指定的端口（接受连接后立即关闭），不提供CARLA RPC
+
+在 carla_config.yaml 中配置:
+    server_pool:
+      enabled: true
+      command: ["python", "examples/fake_carla_server.py", "--boot-delay=2"]
+"""
+import socket
+import sys
+import time
+
+
+def parse_args(argv):
+    port = 2000
+    boot_delay = 1.0
+    crash_after = None
+    for arg in argv:
+        if arg.startswith("-carla-port="):
+            port = int(arg.split("=", 1)[1])
+        elif arg.startswith("--boot-delay="):
+            boot_delay = float(arg.split("=", 1)[1])
+        elif arg.startswith("--crash-after="):
+            crash_after = float(arg.split("=", 1)[1])
+    return port, boot_delay, crash_after
+
+
+def main():
+    port, boot_delay, crash_after = parse_args(sys.argv[1:])
+    print(f"Fake CARLA booting (port {port}, delay {boot_delay}s)", flush=True)
+    time.sleep(boot_delay)
+
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    server.bind(("localhost", port))
+    server.listen(16)
+    server.settimeout(0.5)
+    print(f"Fake CARLA listening on port {port}", flush=True)
+
+    started = time.time()
+    while crash_after is None or time.time() - started < crash_after:
+        try:
+            conn, _ = server.accept()
+            conn.close()
+        except socket.timeout:
+            continue
+
+    print("Fake CARLA crashing", flush=True)
+    sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Actor Recycle Pool - actor回收池
+软重置时不销毁车辆和行人，而是关闭物理和自动驾驶后停放在保留区域；
+下次生成交通时优先把停放的actor传送回路面并重新启用，省去销毁和重新生成的开销。
+池大小有上限，超出时按停放时间先进先出淘汰（由管理器负责销毁被淘汰的actor）
+"""
+
+import time
+from collections import deque
+from typing import Dict, List, Tuple
+
+
+class ActorRecyclePool:
+    """停放中的车辆和行人（行人与其AI控制器成对保存）"""
+
+    def __init__(self, max_size: int = 300, parking_origin: Tuple[float, float, float] = (0.0, 0.0, 500.0),
+                 parking_spacing: float = 10.0, parking_columns: int = 50):
+        self.max_size = max_size
+        self.parking_origin = parking_origin
+        self.parking_spacing = parking_spacing
+        self.parking_columns = parking_columns
+
+        self.vehicles: deque = deque()  # (vehicle, parked_at)
+        self.walkers: deque = deque()   # (walker, controller, parked_at)
+        self._next_slot = 0
+        self.stats = {"parked": 0, "reused": 0, "evicted": 0}
+
+    def __len__(self) -> int:
+        return len(self.vehicles) + len(self.walkers)
+
+    def parking_slot(self) -> Tuple[float, float, float]:
+        """下一个停放位置（保留区域内的网格；物理已关闭，位置重叠也不会碰撞）"""
+        slot = self._next_slot % max(self.max_size, 1)
+        self._next_slot += 1
+        x0, y0, z0 = self.parking_origin
+        return (x0 + (slot % self.parking_columns) * self.parking_spacing,
+                y0 + (slot // self.parking_columns) * self.parking_spacing,
+                z0)
+
+    def park(self, vehicles: List, walker_pairs: List[Tuple]) -> Tuple[List, List[Tuple]]:
+        """加入停放的actor，返回因超出容量而被淘汰的 (车辆列表, 行人对列表)"""
+        now = time.time()
+        for vehicle in vehicles:
+            self.vehicles.append((vehicle, now))
+        for walker, controller in walker_pairs:
+            self.walkers.append((walker, controller, now))
+        self.stats["parked"] += len(vehicles) + len(walker_pairs)
+        return self._evict()
+
+    def _evict(self) -> Tuple[List, List[Tuple]]:
+        """淘汰停放时间最早的actor直到不超过容量"""
+        evicted_vehicles, evicted_walkers = [], []
+        while len(self) > self.max_size:
+            oldest_vehicle = self.vehicles[0][1] if self.vehicles else None
+            oldest_walker = self.walkers[0][2] if self.walkers else None
+            if oldest_walker is None or (oldest_vehicle is not None and oldest_vehicle <= oldest_walker):
+                evicted_vehicles.append(self.vehicles.popleft()[0])
+            else:
+                walker, controller, _ = self.walkers.popleft()
+                evicted_walkers.append((walker, controller))
+        self.stats["evicted"] += len(evicted_vehicles) + len(evicted_walkers)
+        return evicted_vehicles, evicted_walkers
+
+    def take_vehicles(self, count: int) -> List:
+        """取出最多count辆停放的车辆（先停放的先取出）"""
+        taken = [self.vehicles.popleft()[0] for _ in range(min(count, len(self.vehicles)))]
+        self.stats["reused"] += len(taken)
+        return taken
+
+    def take_walkers(self, count: int) -> List[Tuple]:
+        """取出最多count对停放的 (行人, 控制器)"""
+        taken = []
+        for _ in range(min(count, len(self.walkers))):
+            walker, controller, _ = self.walkers.popleft()
+            taken.append((walker, controller))
+        self.stats["reused"] += len(taken)
+        return taken
+
+    def drain(self) -> Tuple[List, List[Tuple]]:
+        """清空回收池，返回全部停放的actor（用于彻底清除）"""
+        vehicles = [vehicle for vehicle, _ in self.vehicles]
+        walkers = [(walker, controller) for walker, controller, _ in self.walkers]
+        self.vehicles.clear()
+        self.walkers.clear()
+        return vehicles, walkers
+
+    def parked_ids(self) -> set:
+        ids = {vehicle.id for vehicle, _ in self.vehicles}
+        ids.update(walker.id for walker, _, _ in self.walkers)
+        return ids
+
+    def info(self) -> Dict:
+        return {
+            "parked_vehicles": len(self.vehicles),
+            "parked_walkers": len(self.walkers),
+            "max_size": self.max_size,
+            **self.stats
+        }
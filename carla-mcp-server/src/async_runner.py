@@ -0,0 +1,125 @@
+"""
+Async Runner - CARLA阻塞调用的异步门面
+MCP工具在事件循环中运行，CARLA的RPC都是阻塞调用：统一交给有界线程池执行，
+每类操作有独立的超时时间。这样HTTP模式下一个耗时的清除操作不会阻塞 /health、/status 和其他客户端
+"""
+
+import asyncio
+import contextvars
+import functools
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+# 当前工具调用的截止时间（time.monotonic），由线程池中的调用继承，RPC工作线程的 call() 据此限时等待
+_deadline: contextvars.ContextVar = contextvars.ContextVar("carla_call_deadline", default=None)
+
+
+def remaining_time() -> Optional[float]:
+    """当前调用距截止时间的剩余秒数；不在限时调用中时返回None"""
+    deadline = _deadline.get()
+    return None if deadline is None else max(deadline - time.monotonic(), 0.0)
+
+
+class CarlaAsyncRunner:
+    """有界线程池 + 按操作的超时"""
+
+    def __init__(self, max_workers: int = 4, default_timeout: float = 120.0,
+                 timeouts: Dict[str, float] = None):
+        self.max_workers = max_workers
+        self.default_timeout = default_timeout
+        self.timeouts = timeouts or {}
+
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="carla-tool")
+
+        self._stats_lock = threading.Lock()
+        # pending：等待结果的调用数；in_flight：正在占用线程池线程的调用数（超时放弃等待后仍可能在执行）
+        self._gauges = {"in_flight": 0, "pending": 0}
+        self.stats = {"calls": 0, "timeouts": 0, "cancelled": 0, "errors": 0}
+
+        self.logger = logging.getLogger(__name__)
+
+    @classmethod
+    def from_config(cls, config: Dict) -> "CarlaAsyncRunner":
+        async_config = config.get("async", {})
+        return cls(
+            max_workers=async_config.get("max_workers", 4),
+            default_timeout=async_config.get("default_timeout", 120.0),
+            timeouts=async_config.get("timeouts")
+        )
+
+    def timeout_for(self, op: str, timeout: float = None) -> Optional[float]:
+        """显式超时优先，其次按操作名配置，最后使用默认值；<= 0 表示不限时"""
+        if timeout is None:
+            timeout = self.timeouts.get(op, self.default_timeout)
+        return timeout if timeout and timeout > 0 else None
+
+    def _count(self, key: str):
+        with self._stats_lock:
+            self.stats[key] += 1
+
+    def _gauge(self, key: str, delta: int):
+        with self._stats_lock:
+            self._gauges[key] += delta
+
+    def _occupy(self, deadline: Optional[float], fn: Callable, *args, **kwargs) -> Any:
+        """在线程池线程中执行，统计真实占用的线程数，并把截止时间传给内部的RPC调用"""
+        self._gauge("in_flight", 1)
+        _deadline.set(deadline)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            self._gauge("in_flight", -1)
+
+    async def _await(self, op: str, future, timeout: Optional[float],
+                     cancel_event: Optional[threading.Event]):
+        start = time.perf_counter()
+        self._count("calls")
+        self._gauge("pending", 1)
+        try:
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            self._count("timeouts")
+            if cancel_event is not None:
+                cancel_event.set()
+            self.logger.warning(f"{op} timed out after {timeout}s")
+            raise
+        except asyncio.CancelledError:
+            self._count("cancelled")
+            if cancel_event is not None:
+                cancel_event.set()
+            raise
+        except Exception:
+            self._count("errors")
+            raise
+        finally:
+            self._gauge("pending", -1)
+            self.logger.debug(f"{op} finished in {time.perf_counter() - start:.3f}s")
+
+    async def call(self, op: str, fn: Callable, *args, timeout: float = None,
+                   cancel_event: threading.Event = None, **kwargs) -> Any:
+        """在线程池中执行阻塞函数并等待结果
+
+        超时或调用方取消时抛出 asyncio.TimeoutError / CancelledError，并置位cancel_event
+        （支持取消的操作会在下一个检查点停止；线程本身无法被强制中断）。
+        内部的RPC工作线程调用在同一截止时间放弃排队中的请求，使线程池线程随之释放。
+        """
+        loop = asyncio.get_running_loop()
+        timeout = self.timeout_for(op, timeout)
+        deadline = time.monotonic() + timeout if timeout else None
+        # 带上当前上下文（工具调用的追踪span），线程池中的RPC耗时才能计入
+        context = contextvars.copy_context()
+        future = loop.run_in_executor(
+            self._executor, functools.partial(context.run, self._occupy, deadline, fn, *args, **kwargs)
+        )
+        return await self._await(op, future, timeout, cancel_event)
+
+    def info(self) -> Dict:
+        with self._stats_lock:
+            return {
+                "max_workers": self.max_workers,
+                **self._gauges,
+                **self.stats
+            }
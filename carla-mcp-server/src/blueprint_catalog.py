@@ -0,0 +1,139 @@
+"""
+Blueprint Catalog - 蓝图目录索引
+每个连接只加载一次蓝图库，按类别预先分组并缓存推荐属性值，
+生成actor时只需从内存表中挑选，不再逐个调用 has_attribute / get_attribute
+"""
+
+import random
+from typing import Dict, List, Optional
+
+
+def _recommended_values(blueprint, name: str) -> List[str]:
+    """读取属性的推荐值列表（属性不存在时返回空列表）"""
+    if not blueprint.has_attribute(name):
+        return []
+    return list(blueprint.get_attribute(name).recommended_values)
+
+
+def _int_attribute(blueprint, name: str) -> Optional[int]:
+    """读取整型属性（属性不存在或无法解析时返回None）"""
+    if not blueprint.has_attribute(name):
+        return None
+    try:
+        return blueprint.get_attribute(name).as_int()
+    except Exception:
+        return None
+
+
+def _str_attribute(blueprint, name: str) -> Optional[str]:
+    """读取字符串属性（属性不存在或为空时返回None）"""
+    if not blueprint.has_attribute(name):
+        return None
+    value = blueprint.get_attribute(name).as_str().strip().lower()
+    return value or None
+
+
+class BlueprintEntry:
+    """单个蓝图及其预先读取的属性"""
+
+    __slots__ = (
+        "blueprint", "id", "colors", "driver_ids",
+        "wheels", "generation", "base_type", "has_invincible"
+    )
+
+    def __init__(self, blueprint):
+        self.blueprint = blueprint
+        self.id = blueprint.id
+        self.colors = _recommended_values(blueprint, 'color')
+        self.driver_ids = _recommended_values(blueprint, 'driver_id')
+        self.wheels = _int_attribute(blueprint, 'number_of_wheels')
+        self.generation = _int_attribute(blueprint, 'generation')
+        self.base_type = _str_attribute(blueprint, 'base_type')
+        self.has_invincible = blueprint.has_attribute('is_invincible')
+
+
+class BlueprintCatalog:
+    """车辆/行人蓝图目录 - 按轮数、代际、基础类型分组"""
+
+    def __init__(self, blueprint_library, vehicle_filter: str = "vehicle.*",
+                 walker_filter: str = "walker.pedestrian.*"):
+        self.vehicle_filter = vehicle_filter
+        self.walker_filter = walker_filter
+
+        self.vehicles: List[BlueprintEntry] = [
+            BlueprintEntry(bp) for bp in blueprint_library.filter(vehicle_filter)
+        ]
+        self.walkers: List[BlueprintEntry] = [
+            BlueprintEntry(bp) for bp in blueprint_library.filter(walker_filter)
+        ]
+        self.walker_controller = blueprint_library.find('controller.ai.walker')
+
+        self.vehicles_by_wheels = self._group(self.vehicles, "wheels")
+        self.vehicles_by_generation = self._group(self.vehicles, "generation")
+        self.vehicles_by_base_type = self._group(self.vehicles, "base_type")
+        self.walkers_by_generation = self._group(self.walkers, "generation")
+
+    @staticmethod
+    def _group(entries: List[BlueprintEntry], field: str) -> Dict:
+        """按指定字段分组（字段为None的蓝图不参与分组）"""
+        groups: Dict = {}
+        for entry in entries:
+            key = getattr(entry, field)
+            if key is not None:
+                groups.setdefault(key, []).append(entry)
+        return groups
+
+    def vehicle_entries(self, wheels: int = None, generation: int = None,
+                        base_type: str = None) -> List[BlueprintEntry]:
+        """按类别筛选车辆蓝图（未指定的条件不做限制）"""
+        entries = self.vehicles
+        if wheels is not None:
+            entries = [e for e in entries if e.wheels == wheels]
+        if generation is not None:
+            entries = [e for e in entries if e.generation == generation]
+        if base_type is not None:
+            entries = [e for e in entries if e.base_type == base_type.lower()]
+        return entries
+
+    def pick_vehicle(self, rng=random, role_name: str = 'autopilot', **filters):
+        """随机挑选一个车辆蓝图并随机化外观
+
+        返回的蓝图对象为目录内共享实例，调用方应立即用于构造 SpawnActor 命令
+        （命令会复制蓝图）。
+        """
+        entries = self.vehicle_entries(**filters) if filters else self.vehicles
+        if not entries:
+            raise RuntimeError(f"No vehicle blueprints match {self.vehicle_filter} {filters or ''}".strip())
+
+        entry = rng.choice(entries)
+        blueprint = entry.blueprint
+        if entry.colors:
+            blueprint.set_attribute('color', rng.choice(entry.colors))
+        if entry.driver_ids:
+            blueprint.set_attribute('driver_id', rng.choice(entry.driver_ids))
+        blueprint.set_attribute('role_name', role_name)
+        return blueprint
+
+    def pick_walker(self, rng=random, generation: int = None):
+        """随机挑选一个行人蓝图"""
+        entries = self.walkers_by_generation.get(generation, []) if generation is not None else self.walkers
+        if not entries:
+            raise RuntimeError(f"No walker blueprints match {self.walker_filter}")
+
+        entry = rng.choice(entries)
+        blueprint = entry.blueprint
+        if entry.has_invincible:
+            blueprint.set_attribute('is_invincible', 'false')
+        return blueprint
+
+    def summary(self) -> Dict:
+        """目录统计信息"""
+        return {
+            "vehicle_filter": self.vehicle_filter,
+            "walker_filter": self.walker_filter,
+            "vehicles": len(self.vehicles),
+            "walkers": len(self.walkers),
+            "vehicles_by_wheels": {str(k): len(v) for k, v in self.vehicles_by_wheels.items()},
+            "vehicles_by_base_type": {k: len(v) for k, v in self.vehicles_by_base_type.items()},
+            "vehicles_by_generation": {str(k): len(v) for k, v in self.vehicles_by_generation.items()},
+        }
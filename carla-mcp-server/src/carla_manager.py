@@ -4,9 +4,23 @@ import subprocess
 import time
 import random
 import logging
+import numpy as np
 import psutil
 import yaml
-from typing import Optional, Dict, List
+import threading
+from typing import Optional, Dict, List, Callable
+
+from actor_recycle_pool import ActorRecyclePool
+from blueprint_catalog import BlueprintCatalog
+from logging_setup import LogSampler
+from metrics import CLEAR_PHASE_SECONDS, SPAWN_FAILED, SPAWN_REQUESTED, SPAWN_SUCCEEDED
+from nav_location_pool import NavLocationPool
+from process_tracker import CarlaProcessTracker
+from rpc_worker import CarlaRpcWorker
+from server_output import ServerOutputBuffer
+from server_pool import CarlaServerPool, PooledServer
+from spawn_planner import SpawnPlanner
+from status_cache import StatusSnapshotCache
 
 try:
     import carla
@@ -18,8 +32,51 @@ except ImportError:
 class CarlaManager:
     """CARLA仿真器管理器 - 负责启动、连接和控制CARLA"""
 
-    def __init__(self, config_path: str = None):
+    # 清除交通的预设档位，可在 carla_config.yaml 的 clear.profiles 中覆盖
+    CLEAR_PROFILES = {
+        # 稳定优先：小批次、批次间tick、长冷却
+        "conservative": {
+            "batch_size": 5, "batch_sleep": 0.03, "tick_between_batches": True,
+            "batch_autopilot_off": False, "cooldown_ticks": 60, "cooldown_sleep": 1.0,
+            "adaptive": False
+        },
+        "balanced": {
+            "batch_size": 25, "batch_sleep": 0.01, "tick_between_batches": True,
+            "batch_autopilot_off": True, "cooldown_ticks": 20, "cooldown_sleep": 0.3,
+            "adaptive": False
+        },
+        # 速度优先：根据 apply_batch_sync 延迟和错误率自适应调整批次大小
+        "fast": {
+            "batch_size": 20, "min_batch_size": 5, "max_batch_size": 500,
+            "target_batch_latency": 0.25, "batch_sleep": 0.0, "tick_between_batches": False,
+            "batch_autopilot_off": True, "cooldown_ticks": 5, "cooldown_sleep": 0.0,
+            "adaptive": True
+        },
+    }
+
+    def __init__(self, config_path: str = None, server_pool: CarlaServerPool = None,
+                 instance_id: str = "default", port: int = None, tm_port: int = None):
         self.config = self._load_config(config_path)
+        self.instance_id = instance_id
+        # 本实例所有CARLA调用的单一执行线程（读通道优先，相邻同类写请求合并）
+        self.rpc = CarlaRpcWorker(
+            f"carla-rpc-{instance_id}",
+            max_merge=self.config.get("rpc", {}).get("max_merge", 16)
+        )
+        # 状态快照：后台按TTL通过读通道刷新，查询状态时不直接访问仿真器；写操作完成后快照过期
+        status_config = self.config.get("status_cache", {})
+        self.status_cache = StatusSnapshotCache(
+            lambda: self.rpc.call("get_status", self.get_status, lane="read"),
+            ttl=status_config.get("ttl", 1.0),
+            idle_timeout=status_config.get("idle_timeout", 30.0),
+            name=f"status-{instance_id}"
+        )
+        self.rpc.after_write = self.status_cache.invalidate
+        # 本实例使用的RPC端口和TrafficManager端口（租用池中服务器时会切换）
+        self._base_port: int = port or self.config["carla"]["port"]
+        self._base_tm_port: int = tm_port or self._base_port + 6000
+        self.port: int = self._base_port
+        self.tm_port: int = self._base_tm_port
         self.process: Optional[subprocess.Popen] = None
         self.client: Optional[carla.Client] = None
         self.world: Optional[carla.World] = None
@@ -30,7 +87,62 @@ class CarlaManager:
         self.walkers: List[carla.Actor] = []
         self.walker_controllers: List[carla.Actor] = []
 
+        # 地图相关缓存：地图句柄和地图名按 world id 缓存 (world_id, map, name)，
+        # 生成点规划器按 (地图名, 采样间距) 缓存
+        self._map_cache: Optional[tuple] = None
+        self._spawn_point_cache: Dict[tuple, SpawnPlanner] = {}
+        self._spawn_cache_stats = {"hits": 0, "misses": 0}
+        # 行人导航点池（按地图名）
+        self._nav_pools: Dict[str, NavLocationPool] = {}
+
+        # 软重置回收池（停放的车辆/行人）以及被设置为危险模式的车辆
+        recycle_config = self.config.get("recycle", {})
+        self._recycle_pool = ActorRecyclePool(
+            max_size=recycle_config.get("max_pool_size", 300),
+            parking_origin=tuple(recycle_config.get("parking_origin", (0.0, 0.0, 500.0))),
+            parking_spacing=recycle_config.get("parking_spacing", 10.0)
+        )
+        self._danger_vehicle_ids: set = set()
+
+        # 已知CARLA进程（PID级存活检查，避免每次遍历全部进程）
+        process_config = self.config.get("process_tracking", {})
+        self._process_tracker = CarlaProcessTracker(
+            process_name=process_config.get("process_name", "CarlaUE4"),
+            rescan_ttl=process_config.get("rescan_ttl", 60.0),
+            watch_interval=process_config.get("watch_interval", 0.0),
+            # 每个实例只匹配自己端口上的进程（未指定 -carla-port 的进程视为默认端口2000），
+            # 避免默认实例把其他实例的服务器当作自己的而误判运行状态或将其停止
+            port=self._base_port
+        )
+        self._process_tracker.start_watcher()
+
+        # 自己启动的服务器进程的输出（后台线程持续读取，避免管道写满）
+        self._server_output = ServerOutputBuffer(self.config["carla"].get("output_buffer_lines", 500))
+        # 仿真帧率估算（由状态快照刷新时更新，供 /metrics 读取）
+        self._frame_sample: Optional[tuple] = None
+        self.frame_rate: Optional[float] = None
+        # 最近一次启动的时间线（各阶段相对启动开始的秒数）
+        self._boot_timeline: Dict[str, float] = {}
+
+        # 预启动服务器池及当前租用的服务器（generation 用于判断服务器是否已被替换）
+        self.server_pool = server_pool
+        self._leased_server: Optional[PooledServer] = None
+        self._lease_generation = 0
+
+        # 最近一次健康探针结果
+        self._last_health_probe: Optional[Dict] = None
+        # 健康探针专用的短超时客户端 (port, client)，不修改共享客户端的超时
+        self._probe_client: Optional[tuple] = None
+
+        # 批量actor解析计时统计
+        self._resolve_stats = {"calls": 0, "actors": 0, "seconds": 0.0}
+
+        # 蓝图目录（每个连接加载一次）
+        self._blueprint_catalog: Optional[BlueprintCatalog] = None
+
         self.logger = logging.getLogger(__name__)
+        # 逐个actor的调试日志（清除/生成循环中）按key采样，避免高负载时刷屏
+        self._actor_log = LogSampler.from_config(self.logger, self.config)
 
     def _load_config(self, config_path: str = None) -> Dict:
         """加载配置文件"""
@@ -62,8 +174,51 @@ class CarlaManager:
             "maps": {"default": "Town01"}
         }
 
+    def build_server_command(self, port: int, quality: str = None) -> List[str]:
+        """构建CARLA服务器启动命令"""
+        quality = quality or self.config["carla"]["default_quality"]
+        carla_exe = os.path.join(
+            self.config["carla"]["path"],
+            self.config["carla"]["executable"]
+        )
+
+        if not os.path.exists(carla_exe):
+            raise FileNotFoundError(f"CARLA executable not found: {carla_exe}")
+
+        cmd = [
+            carla_exe,
+            f"-quality-level={quality}",
+            f"-ResX={self.config['window']['width']}",
+            f"-ResY={self.config['window']['height']}",
+            f"-carla-port={port}"
+        ]
+
+        if self.config["window"]["windowed"]:
+            cmd.append("-windowed")
+        return cmd
+
+    def reset_pooled_server(self, server: PooledServer):
+        """重置归还到池中的服务器：重新加载默认地图，清除上一个会话留下的actor"""
+        if not carla:
+            return
+        client = carla.Client(self.config["carla"]["host"], server.port)
+        client.set_timeout(self.config["carla"].get("client_timeout", 10.0))
+        client.load_world(self.config["maps"]["default"])
+
+    @property
+    def leased_server(self) -> Optional[PooledServer]:
+        """当前租用的池服务器（未使用服务器池时为None）"""
+        return self._leased_server
+
+    def _has_valid_lease(self) -> bool:
+        return (self._leased_server is not None and
+                self.server_pool.is_leased(self._leased_server, self._lease_generation))
+
     async def start_carla(self, map_name: str = None, quality: str = None) -> Dict:
-        """启动CARLA服务器"""
+        """启动CARLA服务器（启用服务器池时改为租用预启动的服务器）"""
+        if self.server_pool and self.server_pool.enabled:
+            return await self._start_from_pool(map_name)
+
         if self.is_carla_running():
             return {"status": "already_running", "message": "CARLA已经在运行"}
 
@@ -71,75 +226,169 @@ class CarlaManager:
         map_name = map_name or self.config["maps"]["default"]
         quality = quality or self.config["carla"]["default_quality"]
 
-        try:
-            # 构建启动命令
-            carla_exe = os.path.join(
-                self.config["carla"]["path"],
-                self.config["carla"]["executable"]
-            )
-
-            if not os.path.exists(carla_exe):
-                raise FileNotFoundError(f"CARLA executable not found: {carla_exe}")
+        start = time.time()
+        timeline = self._boot_timeline = {}
 
-            cmd = [
-                carla_exe,
-                f"-quality-level={quality}",
-                f"-ResX={self.config['window']['width']}",
-                f"-ResY={self.config['window']['height']}",
-                f"-carla-port={self.config['carla']['port']}"
-            ]
-
-            if self.config["window"]["windowed"]:
-                cmd.append("-windowed")
+        def mark(stage: str):
+            timeline[stage] = round(time.time() - start, 3)
 
+        try:
+            # 构建启动命令
+            cmd = self.build_server_command(self.port, quality)
             self.logger.info(f"Starting CARLA: {' '.join(cmd)}")
 
-            # 启动CARLA进程
+            # 启动CARLA进程，输出由后台线程读入环形缓冲区
             self.process = subprocess.Popen(
                 cmd,
                 stdout=subprocess.PIPE,
                 stderr=subprocess.PIPE,
                 cwd=self.config["carla"]["path"]
             )
+            self._server_output = ServerOutputBuffer(self.config["carla"].get("output_buffer_lines", 500))
+            self._server_output.attach(self.process, name=f"carla-{self.instance_id}")
+            self._process_tracker.track(self.process.pid)
+            mark("process_spawned")
 
             # 等待服务器启动并连接
-            await self._wait_for_carla_ready()
+            await self._wait_for_carla_ready(start + self.config["carla"]["timeout"], mark)
 
             # 加载指定地图
             if map_name:
                 self.world = self.client.load_world(map_name)
+                self._invalidate_map_caches()
                 self.logger.info(f"Loaded map: {map_name}")
+            mark("map_loaded")
 
             # 初始化TrafficManager
-            self.traffic_manager = self.client.get_trafficmanager(
-                self.config["carla"]["port"] + 6000
-            )
+            self._init_traffic_manager()
+            mark("traffic_manager_ready")
 
+            self.logger.info(f"CARLA boot timeline: {timeline}")
             return {
                 "status": "started",
-                "port": self.config["carla"]["port"],
+                "port": self.port,
                 "map": map_name,
                 "quality": quality,
-                "process_id": self.process.pid
+                "process_id": self.process.pid,
+                "boot_timeline": timeline
             }
 
         except Exception as e:
-            self.logger.error(f"Failed to start CARLA: {e}")
+            self.logger.error(f"Failed to start CARLA: {e} (timeline: {timeline})")
+            output_tail = self._server_output.tail_text(20)
+            if output_tail:
+                self.logger.error(f"CARLA output:\n{output_tail}")
             if self.process:
                 self.process.terminate()
                 self.process = None
             raise
 
-    async def _wait_for_carla_ready(self):
-        """等待CARLA服务器就绪"""
+    async def _start_from_pool(self, map_name: str = None) -> Dict:
+        """从服务器池租用一个已就绪的服务器并连接"""
+        if self._has_valid_lease():
+            return {"status": "already_running", "message": "CARLA已经在运行",
+                    "port": self.port, "pool_server": self._leased_server.index}
+
+        map_name = map_name or self.config["maps"]["default"]
+        start = time.time()
+        loop = asyncio.get_running_loop()
+        server = await loop.run_in_executor(None, self.server_pool.lease, self.instance_id)
+        if server is None:
+            return {"status": "error", "message": "服务器池中没有可用的CARLA服务器"}
+
+        self._leased_server = server
+        self._lease_generation = server.generation
+        self.port = server.port
+        self.tm_port = server.tm_port
+        lease_wait = time.time() - start
+        timeline = self._boot_timeline = {"leased": round(lease_wait, 3)}
+
+        def mark(stage: str):
+            timeline[stage] = round(time.time() - start, 3)
+
+        try:
+            await self._wait_for_carla_ready(mark=mark)
+
+            if map_name:
+                self.world = self.client.load_world(map_name)
+                self._invalidate_map_caches()
+                self.logger.info(f"Loaded map: {map_name}")
+            mark("map_loaded")
+
+            self._init_traffic_manager()
+            mark("traffic_manager_ready")
+            self.logger.info(f"CARLA boot timeline (pool server {server.index}): {timeline}")
+
+            return {
+                "status": "started",
+                "pooled": True,
+                "pool_server": server.index,
+                "port": self.port,
+                "tm_port": self.tm_port,
+                "map": map_name,
+                "process_id": server.pid,
+                "lease_wait": round(lease_wait, 3),
+                "elapsed": round(time.time() - start, 3),
+                "boot_timeline": timeline
+            }
+
+        except Exception as e:
+            self.logger.error(f"Failed to connect to pooled CARLA server {server.index}: {e}")
+            self._release_pooled_server()
+            raise
+
+    def _release_pooled_server(self):
+        """断开连接并把租用的服务器归还到池中（池在后台重置）"""
+        server = self._leased_server
+        self.client = None
+        self.world = None
+        self.traffic_manager = None
+        self._blueprint_catalog = None
+        self._leased_server = None
+        self.port = self._base_port
+        self.tm_port = self._base_tm_port
+        if server is not None:
+            self.server_pool.release(server)
+
+    async def _wait_for_port(self, deadline: float) -> bool:
+        """TCP连接RPC端口直到服务器开始监听（指数退避），进程提前退出时立即失败"""
+        host = self.config["carla"]["host"]
+        delay = self.config["carla"].get("ready_backoff_initial", 0.1)
+        max_delay = self.config["carla"].get("ready_backoff_max", 2.0)
+
+        while time.time() < deadline:
+            if self.process and self.process.poll() is not None:
+                raise RuntimeError(
+                    f"CARLA exited during startup (code {self.process.returncode}): "
+                    f"{self._server_output.tail_text(5)}"
+                )
+            try:
+                _, writer = await asyncio.wait_for(asyncio.open_connection(host, self.port), timeout=1.0)
+                writer.close()
+                return True
+            except (OSError, asyncio.TimeoutError):
+                pass
+            await asyncio.sleep(min(delay, max(deadline - time.time(), 0)))
+            delay = min(delay * 2, max_delay)
+        return False
+
+    async def _wait_for_carla_ready(self, deadline: float = None, mark: Callable[[str], None] = None):
+        """等待CARLA服务器就绪：先等RPC端口可连接，再创建客户端（失败时指数退避重试）"""
         timeout = self.config["carla"]["timeout"]
-        start_time = time.time()
+        deadline = deadline or time.time() + timeout
 
-        while time.time() - start_time < timeout:
+        if not await self._wait_for_port(deadline):
+            raise TimeoutError(f"CARLA port {self.port} not open within {timeout} seconds")
+        if mark:
+            mark("port_open")
+
+        delay = self.config["carla"].get("ready_backoff_initial", 0.1)
+        max_delay = self.config["carla"].get("ready_backoff_max", 2.0)
+        while time.time() < deadline:
             try:
                 self.client = carla.Client(
                     self.config["carla"]["host"],
-                    self.config["carla"]["port"]
+                    self.port
                 )
                 client_timeout = self.config["carla"].get("client_timeout", 10.0)
                 self.client.set_timeout(client_timeout)
@@ -147,84 +396,117 @@ class CarlaManager:
                 # 尝试获取版本信息来测试连接
                 version = self.client.get_client_version()
                 self.world = self.client.get_world()
+                self._invalidate_map_caches()
+                self._blueprint_catalog = None
 
                 self.logger.info(f"Connected to CARLA {version}")
+                if mark:
+                    mark("client_ready")
                 return
 
             except Exception as e:
                 self.logger.debug(f"Waiting for CARLA... ({e})")
-                await asyncio.sleep(1)
+                await asyncio.sleep(min(delay, max(deadline - time.time(), 0)))
+                delay = min(delay * 2, max_delay)
 
         raise TimeoutError(f"CARLA failed to start within {timeout} seconds")
 
+    def get_server_output(self, lines: int = 50, stream: str = None) -> Dict:
+        """最近的服务器输出和启动时间线"""
+        return {
+            "status": "success",
+            "lines": self._server_output.tail(lines, stream),
+            "buffer": self._server_output.info(),
+            "boot_timeline": self._boot_timeline
+        }
+
     def stop_carla(self) -> Dict:
-        """停止CARLA服务器"""
+        """停止CARLA服务器（租用的池服务器只归还，不终止进程）"""
         try:
             # 清理所有actors
             self.clear_all_traffic()
 
+            if self._leased_server is not None:
+                server = self._leased_server
+                self._release_pooled_server()
+                return {
+                    "status": "released",
+                    "pool_server": server.index,
+                    "port": server.port,
+                    "message": f"已将CARLA服务器 {server.index} (端口 {server.port}) 归还到服务器池"
+                }
+
             # 断开客户端连接
             if self.client:
                 self.client = None
                 self.world = None
                 self.traffic_manager = None
+                self._blueprint_catalog = None
 
-            # 终止进程
-            terminated = False
-
-            # 首先尝试终止自己启动的进程
+            # 并行终止自己启动的进程和扫描到的所有CARLA进程，整体耗时受 shutdown_timeout 限制
             if self.process:
-                self.process.terminate()
-                try:
-                    self.process.wait(timeout=10)
-                except subprocess.TimeoutExpired:
-                    self.process.kill()
-                    self.process.wait()
-
-                self.logger.info(f"CARLA process {self.process.pid} terminated")
+                self._process_tracker.track(self.process.pid)
+            shutdown = self._process_tracker.shutdown(
+                timeout=self.config["carla"].get("shutdown_timeout", 15.0),
+                kill_grace=self.config["carla"].get("shutdown_kill_grace", 3.0),
+                exclude=self._pool_pids()
+            )
+            if self.process:
+                self.process.poll()
                 self.process = None
-                terminated = True
 
-            # 查找并终止所有CARLA进程
-            for proc in psutil.process_iter(['pid', 'name']):
-                try:
-                    if 'CarlaUE4' in proc.info['name']:
-                        self.logger.info(f"Terminating CARLA process {proc.info['pid']}")
-                        psutil.Process(proc.info['pid']).terminate()
-                        terminated = True
-                        # 等待进程结束
-                        try:
-                            psutil.Process(proc.info['pid']).wait(timeout=5)
-                        except psutil.TimeoutExpired:
-                            # 如果超时，强制结束
-                            psutil.Process(proc.info['pid']).kill()
-                except (psutil.NoSuchProcess, psutil.AccessDenied) as e:
-                    self.logger.debug(f"Could not terminate process: {e}")
-                    continue
+            processes = shutdown["processes"]
+            if not processes:
+                return {"status": "not_running", "message": "CARLA未在运行", "elapsed": shutdown["elapsed"]}
 
-            if terminated:
-                return {"status": "stopped", "message": "CARLA已停止"}
-            else:
-                return {"status": "not_running", "message": "CARLA未在运行"}
+            remaining = [p["pid"] for p in processes if p["outcome"] in ("still_running", "access_denied")]
+            return {
+                "status": "partial" if remaining else "stopped",
+                "processes": processes,
+                "elapsed": shutdown["elapsed"],
+                "message": f"以下CARLA进程未能停止: {remaining}" if remaining
+                           else f"CARLA已停止（{len(processes)} 个进程，{shutdown['elapsed']:.2f}秒）"
+            }
 
         except Exception as e:
             self.logger.error(f"Error stopping CARLA: {e}")
             return {"status": "error", "message": f"停止CARLA时出错: {e}"}
 
-    def is_carla_running(self) -> bool:
-        """检查CARLA是否正在运行"""
+    def shutdown(self, timeout: float = None) -> Dict:
+        """停止服务器（租用的池服务器只归还）并停止实例的后台线程，实例被移除或空闲回收时调用"""
+        try:
+            if self.is_carla_running():
+                result = self.rpc.call("stop_carla", self.stop_carla, timeout=timeout)
+            else:
+                result = {"status": "not_running"}
+                # 租到的服务器已崩溃时也要归还，由池负责重启
+                if self._leased_server is not None:
+                    self._release_pooled_server()
+        except Exception as e:
+            self.logger.error(f"Error shutting down instance {self.instance_id}: {e}")
+            result = {"status": "error", "message": f"停止实例时出错: {e}"}
+        finally:
+            self.status_cache.stop()
+            self.rpc.stop()
+            self._process_tracker.stop_watcher()
+        return result
+
+    def is_carla_running(self, full_scan: bool = False) -> bool:
+        """检查CARLA是否正在运行
+
+        默认只检查已知PID是否存活（缓存过期时才重新扫描）；full_scan=True 时强制遍历全部进程。
+        """
+        if self._leased_server is not None:
+            return self._has_valid_lease()
+
         if self.process and self.process.poll() is None:
             return True
 
-        # 检查是否有其他CARLA进程
-        for proc in psutil.process_iter(['pid', 'name']):
-            try:
-                if 'CarlaUE4' in proc.info['name']:
-                    return True
-            except (psutil.NoSuchProcess, psutil.AccessDenied):
-                continue
+        # 检查是否有其他CARLA进程（池中的预启动服务器不计入）
+        return self._process_tracker.is_running(full_scan=full_scan, exclude=self._pool_pids())
 
-        return False
+    def _pool_pids(self) -> set:
+        return self.server_pool.pids() if self.server_pool else set()
 
     def is_connected(self) -> bool:
         """检查是否已连接到CARLA"""
@@ -238,7 +520,7 @@ class CarlaManager:
 
             self.client = carla.Client(
                 self.config["carla"]["host"],
-                self.config["carla"]["port"]
+                self.port
             )
             client_timeout = self.config["carla"].get("client_timeout", 10.0)
             self.client.set_timeout(client_timeout)
@@ -246,17 +528,17 @@ class CarlaManager:
             # 测试连接
             version = self.client.get_client_version()
             self.world = self.client.get_world()
+            self._invalidate_map_caches()
+            self._blueprint_catalog = None
 
             # 初始化TrafficManager
-            self.traffic_manager = self.client.get_trafficmanager(
-                self.config["carla"]["port"] + 6000
-            )
+            self._init_traffic_manager()
 
             self.logger.info(f"Connected to CARLA {version}")
             return {
                 "status": "success",
                 "message": f"Connected to CARLA {version}",
-                "map": self.world.get_map().name
+                "map": self._get_map_name()
             }
 
         except Exception as e:
@@ -265,25 +547,56 @@ class CarlaManager:
             self.world = None
             return {"status": "error", "message": f"Failed to connect: {str(e)}"}
 
-    def generate_traffic(self, num_vehicles: int = None, num_walkers: int = None, danger: bool = False) -> Dict:
-        """生成交通流（基于CARLA官方示例）"""
+    def generate_traffic(self, num_vehicles: int = None, num_walkers: int = None, danger: bool = False,
+                         chunk_size: int = None,
+                         progress_callback: Optional[Callable[[int, int], None]] = None,
+                         cancel_event: Optional[threading.Event] = None) -> Dict:
+        """生成交通流（基于CARLA官方示例）
+
+        chunk_size > 0 时按块分批生成：每块完成后调用 progress_callback(已处理数, 总数)，
+        块之间检查 cancel_event，被取消时停止并返回已生成的部分结果。
+        """
         if not self.world:
             raise RuntimeError("CARLA not connected. Please start CARLA first.")
 
-        num_vehicles = num_vehicles or self.config["traffic"]["default_vehicles"]
-        num_walkers = num_walkers or self.config["traffic"]["default_walkers"]
+        # 显式传入0表示不生成该类参与者（add_vehicles / add_pedestrians）
+        if num_vehicles is None:
+            num_vehicles = self.config["traffic"]["default_vehicles"]
+        if num_walkers is None:
+            num_walkers = self.config["traffic"]["default_walkers"]
+        if chunk_size is None:
+            chunk_size = self.config["traffic"].get("spawn_chunk_size", 0)
+
+        total = num_vehicles + num_walkers
+        progress = {"done": 0}
+
+        def on_chunk(processed: int):
+            progress["done"] += processed
+            if progress_callback:
+                try:
+                    progress_callback(progress["done"], total)
+                except Exception as e:
+                    self.logger.debug(f"Progress callback failed: {e}")
 
         try:
             # 生成车辆
-            vehicles_spawned = self._spawn_vehicles(num_vehicles, danger)
+            vehicle_report = self._spawn_vehicles(num_vehicles, danger, chunk_size, on_chunk, cancel_event)
 
-            # 生成行人
-            walkers_spawned = self._spawn_walkers(num_walkers)
+            # 生成行人（车辆阶段被取消时不再生成）
+            if vehicle_report.get("cancelled"):
+                walker_report = {"requested": num_walkers, "planned": 0, "spawned": 0, "failed": 0, "retried": 0}
+            else:
+                walker_report = self._spawn_walkers(num_walkers, chunk_size, on_chunk, cancel_event)
 
+            self._record_spawn("vehicle", vehicle_report)
+            self._record_spawn("walker", walker_report)
+            cancelled = bool(vehicle_report.get("cancelled") or walker_report.get("cancelled"))
             return {
-                "status": "success",
-                "vehicles_spawned": vehicles_spawned,
-                "walkers_spawned": walkers_spawned,
+                "status": "cancelled" if cancelled else "success",
+                "vehicles_spawned": vehicle_report["spawned"],
+                "walkers_spawned": walker_report["spawned"],
+                "vehicle_spawn": vehicle_report,
+                "walker_spawn": walker_report,
                 "total_vehicles": len(self.vehicles),
                 "total_walkers": len(self.walkers)
             }
@@ -292,161 +605,742 @@ class CarlaManager:
             self.logger.error(f"Failed to generate traffic: {e}")
             return {"status": "error", "message": str(e)}
 
-    def _spawn_vehicles(self, num_vehicles: int, danger: bool = False) -> int:
-        """生成车辆"""
-        blueprint_library = self.world.get_blueprint_library()
-        vehicle_blueprints = blueprint_library.filter("vehicle.*")
+    def generate_density_traffic(self, vehicles_per_km: float = None, road_counts: Dict[int, int] = None,
+                                 danger: bool = False, seed: int = None, chunk_size: int = None,
+                                 progress_callback: Optional[Callable[[int, int], None]] = None,
+                                 cancel_event: Optional[threading.Event] = None) -> Dict:
+        """按道路长度加权的密度生成车辆
+
+        vehicles_per_km: 目标密度（辆/公里车道，不含路口）；
+        road_counts: 按道路指定数量 {road_id: 数量}，优先于 vehicles_per_km；
+        seed: 随机种子，相同种子和地图得到相同的生成点。
+        生成点由规划器一次性向量化计算，再走现有的分块批量 SpawnActor 流程。
+        """
+        if not self.world:
+            raise RuntimeError("CARLA not connected. Please start CARLA first.")
+        if vehicles_per_km is None and not road_counts:
+            return {"status": "error", "message": "vehicles_per_km 或 road_counts 至少需要指定一个"}
+        if chunk_size is None:
+            chunk_size = self.config["traffic"].get("spawn_chunk_size", 0)
+
+        try:
+            planner = self._get_spawn_planner(self.config["traffic"].get("spawn_point_distance", 30.0))
+            selected = planner.plan_density(
+                vehicles_per_km=vehicles_per_km,
+                road_counts=road_counts,
+                occupied_xy=self._occupied_vehicle_xy(),
+                rng=np.random.default_rng(seed)
+            )
+            spawn_points = [planner.transforms[i] for i in selected]
+
+            report = {"requested": len(spawn_points), "planned": len(spawn_points),
+                      "spawned": 0, "failed": 0, "retried": 0}
+            done = {"count": 0}
+
+            def on_chunk(processed: int):
+                done["count"] += processed
+                if progress_callback:
+                    try:
+                        progress_callback(done["count"], len(spawn_points))
+                    except Exception as e:
+                        self.logger.debug(f"Progress callback failed: {e}")
+
+            # 不使用备用点重试，保证分布与种子一致、可复现
+            self._spawn_vehicle_points(spawn_points, [], danger, chunk_size, on_chunk, cancel_event, report)
+
+            self._record_spawn("vehicle", report)
+            lane_km = float(planner.lane_lengths.sum()) / 1000.0
+            return {
+                "status": "cancelled" if report.get("cancelled") else "success",
+                "vehicles_spawned": report["spawned"],
+                "vehicle_spawn": report,
+                "lane_km": round(lane_km, 3),
+                "lanes_used": len({(planner.road_ids[i], planner.lane_ids[i]) for i in selected}),
+                "achieved_density": round(report["spawned"] / lane_km, 3) if lane_km else 0.0,
+                "seed": seed,
+                "total_vehicles": len(self.vehicles)
+            }
+
+        except Exception as e:
+            self.logger.error(f"Failed to generate density traffic: {e}")
+            return {"status": "error", "message": str(e)}
+
+    @staticmethod
+    def _chunks(items: List, chunk_size: int):
+        """按块切分列表；chunk_size <= 0 时整体作为一块"""
+        if chunk_size <= 0:
+            chunk_size = max(len(items), 1)
+        for start in range(0, len(items), chunk_size):
+            yield items[start:start + chunk_size]
+
+    def _get_map(self):
+        """获取当前地图句柄（按world id缓存）
+
+        get_map() 会传输并解析整张地图的OpenDRIVE，只在world变化（换图）后重新获取。
+        """
+        world_id = self.world.id
+        if self._map_cache and self._map_cache[0] == world_id:
+            return self._map_cache[1]
 
-        # 改进：使用道路waypoints作为生成点，确保车辆生成在车道上
         game_map = self.world.get_map()
-        waypoints = game_map.generate_waypoints(distance=30.0)  # 每30米一个点
+        if self._map_cache and self._map_cache[2] != game_map.name:
+            # 地图已变化，旧地图的生成点不再有效
+            self._spawn_point_cache.clear()
+        self._map_cache = (world_id, game_map, game_map.name)
+        return game_map
+
+    def _get_map_name(self) -> str:
+        """获取当前地图名称（随地图句柄按world id缓存）"""
+        self._get_map()
+        return self._map_cache[2]
+
+    def _invalidate_map_caches(self):
+        """地图变化（load_world / 重新连接）后丢弃地图相关缓存"""
+        self._map_cache = None
+        self._spawn_point_cache.clear()
+        self._nav_pools.clear()
+        # 世界已替换，停放的actor随旧世界一起消失
+        self._recycle_pool.drain()
+        self._danger_vehicle_ids.clear()
+
+    def _get_nav_pool(self) -> NavLocationPool:
+        """获取当前地图的行人导航点池"""
+        map_name = self._get_map_name()
+        pool = self._nav_pools.get(map_name)
+        if pool is None or pool.world is not self.world:
+            traffic_config = self.config["traffic"]
+            pool = NavLocationPool(
+                self.world,
+                map_name,
+                capacity=traffic_config.get("walker_pool_size", 500),
+                min_separation=traffic_config.get("walker_min_separation", 2.0),
+                # 补充在RPC工作线程上排在当前写操作之后执行，不与其他CARLA调用并发，也不抢占状态读取
+                schedule=lambda refill: self.rpc.submit("nav_refill", refill)
+            )
+            self._nav_pools[map_name] = pool
+        return pool
+
+    def _get_spawn_planner(self, distance: float = 30.0) -> SpawnPlanner:
+        """获取车辆生成点规划器（按地图名和采样间距缓存）"""
+        key = (self._get_map_name(), distance)
+        cached = self._spawn_point_cache.get(key)
+        if cached is not None:
+            self._spawn_cache_stats["hits"] += 1
+            return cached
+
+        self._spawn_cache_stats["misses"] += 1
 
-        # 过滤出主要道路上的waypoints（排除人行道等）
-        valid_spawn_points = []
+        # 使用道路waypoints作为生成点，确保车辆生成在车道上
+        game_map = self._get_map()
+        waypoints = game_map.generate_waypoints(distance=distance)
+
+        # 过滤出主要道路上的waypoints（排除人行道等），同时记录道路/车道索引
+        spawn_points = []
+        road_ids, lane_ids, s_values = [], [], []
         for waypoint in waypoints:
             if waypoint.lane_type == carla.LaneType.Driving:
                 # 确保waypoint在道路上而不是交叉路口
                 if not waypoint.is_junction:
                     spawn_transform = waypoint.transform
                     spawn_transform.location.z += 0.5  # 稍微抬高避免碰撞
-                    valid_spawn_points.append(spawn_transform)
+                    spawn_points.append(spawn_transform)
+                    road_ids.append(waypoint.road_id)
+                    lane_ids.append(waypoint.lane_id)
+                    s_values.append(waypoint.s)
+
+        planner = SpawnPlanner(
+            spawn_points,
+            min_spacing=self.config["traffic"].get("spawn_min_spacing", 6.0),
+            road_ids=road_ids,
+            lane_ids=lane_ids,
+            s_values=s_values,
+            lane_lengths=self._lane_lengths_from_topology(game_map),
+            sample_distance=distance
+        )
+        self._spawn_point_cache[key] = planner
+        self.logger.info(f"Spawn point cache built for {key[0]} (distance={distance}): {len(spawn_points)} points")
+        return planner
 
-        if num_vehicles > len(valid_spawn_points):
-            self.logger.warning(f"Requested {num_vehicles} vehicles but only {len(valid_spawn_points)} valid spawn points available")
-            num_vehicles = len(valid_spawn_points)
+    def _lane_lengths_from_topology(self, game_map) -> Dict[tuple, float]:
+        """从地图拓扑统计每条车道（road_id, lane_id）的长度（米，不含路口）"""
+        lane_lengths: Dict[tuple, float] = {}
+        try:
+            for start, end in game_map.get_topology():
+                if start.is_junction or start.road_id != end.road_id or start.lane_id != end.lane_id:
+                    continue
+                key = (start.road_id, start.lane_id)
+                lane_lengths[key] = lane_lengths.get(key, 0.0) + abs(end.s - start.s)
+        except Exception as e:
+            self.logger.debug(f"Failed to index lane lengths from topology: {e}")
+        return lane_lengths
+
+    def _occupied_vehicle_xy(self) -> np.ndarray:
+        """世界中现有车辆的平面位置（位置来自客户端快照，不逐车发RPC）"""
+        parked_ids = self._recycle_pool.parked_ids()
+        vehicles = self.world.get_actors().filter('vehicle.*')
+        locations = [vehicle.get_location() for vehicle in vehicles if vehicle.id not in parked_ids]
+        return np.array([(loc.x, loc.y) for loc in locations], dtype=np.float64).reshape(-1, 2)
+
+    def _spawn_point_cache_info(self) -> Dict:
+        """生成点缓存统计"""
+        return {
+            "hits": self._spawn_cache_stats["hits"],
+            "misses": self._spawn_cache_stats["misses"],
+            "entries": len(self._spawn_point_cache)
+        }
 
-        # 随机选择生成点
-        random.shuffle(valid_spawn_points)
-        spawn_points = valid_spawn_points
+    def _init_traffic_manager(self):
+        """获取TrafficManager并一次性应用全车队相同的全局行驶参数
 
-        batch_commands = []
-        for i in range(num_vehicles):
-            blueprint = random.choice(vehicle_blueprints)
+        原先逐车设置的速度差、跟车距离在整个车队中都相同，改为全局设置；
+        自动变道是TrafficManager的默认行为，无需逐车开启。
+        """
+        self.traffic_manager = self.client.get_trafficmanager(
+            self.tm_port
+        )
 
-            # 随机化车辆外观
-            if blueprint.has_attribute('color'):
-                color = random.choice(blueprint.get_attribute('color').recommended_values)
-                blueprint.set_attribute('color', color)
+        traffic_config = self.config["traffic"]
+        self.traffic_manager.global_percentage_speed_difference(
+            traffic_config.get("speed_difference", -30)  # 比限速快30%
+        )
+        self.traffic_manager.set_global_distance_to_leading_vehicle(
+            traffic_config.get("safe_distance", 2.0)  # 跟车距离
+        )
 
-            if blueprint.has_attribute('driver_id'):
-                driver_id = random.choice(blueprint.get_attribute('driver_id').recommended_values)
-                blueprint.set_attribute('driver_id', driver_id)
+    def _get_blueprint_catalog(self) -> BlueprintCatalog:
+        """获取蓝图目录（每个连接只加载一次蓝图库）"""
+        if self._blueprint_catalog is None:
+            traffic_config = self.config["traffic"]
+            self._blueprint_catalog = BlueprintCatalog(
+                self.world.get_blueprint_library(),
+                vehicle_filter=traffic_config.get("vehicle_filter", "vehicle.*"),
+                walker_filter=traffic_config.get("walker_filter", "walker.pedestrian.*")
+            )
+            self.logger.info(
+                f"Blueprint catalog loaded: {len(self._blueprint_catalog.vehicles)} vehicles, "
+                f"{len(self._blueprint_catalog.walkers)} walkers"
+            )
+        return self._blueprint_catalog
+
+    def _resolve_batch_actors(self, results) -> List:
+        """把 apply_batch_sync 的成功结果一次性解析为actor句柄
+
+        收集所有成功的actor id，只调用一次 world.get_actors(ids)，
+        替代逐个 world.get_actor() 的往返调用；返回顺序与结果顺序一致。
+        """
+        actor_ids = [result.actor_id for result in results if not result.error]
+        if not actor_ids:
+            return []
+
+        start = time.perf_counter()
+        actors_by_id = {actor.id: actor for actor in self.world.get_actors(actor_ids)}
+        elapsed = time.perf_counter() - start
+
+        self._resolve_stats["calls"] += 1
+        self._resolve_stats["actors"] += len(actor_ids)
+        self._resolve_stats["seconds"] += elapsed
+
+        missing = len(actor_ids) - len(actors_by_id)
+        if missing:
+            self.logger.warning(f"{missing} spawned actors could not be resolved")
+        return [actors_by_id[actor_id] for actor_id in actor_ids if actor_id in actors_by_id]
+
+    def _actor_resolution_info(self) -> Dict:
+        """批量actor解析统计（saved_round_trips 为相对逐个 get_actor 节省的调用数）"""
+        calls = self._resolve_stats["calls"]
+        actors = self._resolve_stats["actors"]
+        return {
+            "calls": calls,
+            "actors": actors,
+            "saved_round_trips": actors - calls,
+            "total_ms": round(self._resolve_stats["seconds"] * 1000, 3),
+            "avg_ms_per_call": round(self._resolve_stats["seconds"] * 1000 / calls, 3) if calls else 0.0
+        }
+
+    def _record_spawn(self, kind: str, report: Dict):
+        """把一次生成的统计计入 /metrics（生成成功率）"""
+        if report.get("requested"):
+            SPAWN_REQUESTED.inc(report["requested"], instance=self.instance_id, kind=kind)
+            SPAWN_SUCCEEDED.inc(report["spawned"], instance=self.instance_id, kind=kind)
+            SPAWN_FAILED.inc(report["failed"], instance=self.instance_id, kind=kind)
+
+    def _spawn_vehicles(self, num_vehicles: int, danger: bool = False, chunk_size: int = 0,
+                        on_chunk: Optional[Callable[[int], None]] = None,
+                        cancel_event: Optional[threading.Event] = None) -> Dict:
+        """生成车辆，返回 requested / planned / spawned / failed / retried 统计"""
+        report = {"requested": num_vehicles, "planned": 0, "spawned": 0, "failed": 0, "retried": 0}
+        if num_vehicles <= 0:
+            return report
+
+        # 从缓存的规划器中选出互相保持间距、且远离现有车辆的生成点，
+        # 多规划的部分作为失败重试时的备用生成点
+        traffic_config = self.config["traffic"]
+        planner = self._get_spawn_planner(traffic_config.get("spawn_point_distance", 30.0))
+        num_spares = int(np.ceil(num_vehicles * traffic_config.get("spawn_spare_ratio", 0.2)))
+        selected = planner.plan(num_vehicles + num_spares, occupied_xy=self._occupied_vehicle_xy())
+        spawn_points = [planner.transforms[i] for i in selected[:num_vehicles]]
+        spares = [planner.transforms[i] for i in selected[num_vehicles:]]
+
+        report["planned"] = len(spawn_points)
+        if report["planned"] < num_vehicles:
+            self.logger.warning(
+                f"Requested {num_vehicles} vehicles but only {report['planned']} collision-free spawn points available"
+            )
+
+        return self._spawn_vehicle_points(spawn_points, spares, danger, chunk_size, on_chunk, cancel_event, report)
+
+    def _spawn_vehicle_points(self, spawn_points: List, spares: List, danger: bool, chunk_size: int,
+                              on_chunk: Optional[Callable[[int], None]],
+                              cancel_event: Optional[threading.Event], report: Dict) -> Dict:
+        """在规划好的生成点上分块批量生成车辆，失败时从spares中取备用点重试
+
+        回收池中有停放的车辆时，先用一个批次把它们传送到前面的生成点并重新启用。
+        """
+        if len(self._recycle_pool.vehicles) > 0 and spawn_points:
+            reused, spawn_points = self._reuse_parked_vehicles(spawn_points, danger)
+            report["reused"] = reused
+            report["spawned"] += reused
+            if on_chunk and reused:
+                on_chunk(reused)
+
+        def take_spares(count: int) -> List:
+            taken = spares[:count]
+            del spares[:count]
+            return taken
+
+        for chunk in self._chunks(spawn_points, chunk_size):
+            if cancel_event is not None and cancel_event.is_set():
+                report["cancelled"] = True
+                self.logger.info(f"Vehicle spawn cancelled after {report['spawned']} vehicles")
+                break
+
+            report["spawned"] += self._spawn_chunk_with_retry(
+                chunk, lambda points: len(self._spawn_vehicle_batch(points, danger)), take_spares, report
+            )
+            if on_chunk:
+                on_chunk(len(chunk))
+
+        return report
+
+    def _spawn_chunk_with_retry(self, chunk: List, spawn_batch: Callable[[List], int],
+                                alternates: Callable[[int], List], report: Dict) -> int:
+        """生成一块actor，失败的命令在未使用的备用位置上以后续批次重试（次数有上限）
+
+        spawn_batch(points) 返回成功数量，alternates(n) 返回最多n个备用生成点；
+        report 中累计 failed（失败的命令数）和 retried（重试的命令数）。
+        """
+        max_attempts = self.config["traffic"].get("spawn_retry_attempts", 3)
+
+        spawned = spawn_batch(chunk)
+        missing = len(chunk) - spawned
+        report["failed"] += missing
+
+        attempt = 0
+        while missing > 0 and attempt < max_attempts:
+            retry_points = alternates(missing)
+            if not retry_points:
+                self.logger.debug(f"No alternate spawn locations left for {missing} failed spawns")
+                break
+
+            attempt += 1
+            recovered = spawn_batch(retry_points)
+            report["retried"] += len(retry_points)
+            report["failed"] += len(retry_points) - recovered
+            spawned += recovered
+            missing -= recovered
+
+        return spawned
+
+    def _spawn_vehicle_batch(self, spawn_points: List, danger: bool = False) -> List:
+        """在给定生成点上批量生成车辆（一个 apply_batch_sync），返回成功的车辆"""
+        if not spawn_points:
+            return []
 
-            # 设置自动驾驶角色
-            blueprint.set_attribute('role_name', 'autopilot')
+        catalog = self._get_blueprint_catalog()
+
+        # 自动驾驶随生成命令一起下发（FutureActor 引用同一批次中刚生成的车辆）
+        tm_port = self.tm_port
+        SpawnActor = carla.command.SpawnActor
+        SetAutopilot = carla.command.SetAutopilot
+        FutureActor = carla.command.FutureActor
+
+        batch_commands = []
+        for spawn_point in spawn_points:
+            # 从目录中挑选蓝图（已随机化外观并设置自动驾驶角色）
+            blueprint = catalog.pick_vehicle()
 
             batch_commands.append(
-                carla.command.SpawnActor(blueprint, spawn_points[i])
+                SpawnActor(blueprint, spawn_point).then(SetAutopilot(FutureActor, True, tm_port))
             )
 
         # 批量生成
         results = self.client.apply_batch_sync(batch_commands, True)
 
         # 收集成功生成的车辆
-        vehicles_spawned = 0
-        for result in results:
-            if not result.error:
-                vehicle = self.world.get_actor(result.actor_id)
-                self.vehicles.append(vehicle)
-
-                # 设置自动驾驶
-                tm_port = self.config["carla"]["port"] + 6000
-                vehicle.set_autopilot(True, tm_port)
-
-                # 配置TrafficManager参数以确保正常行驶
-                if self.traffic_manager:
-                    # 设置基本行驶参数
-                    self.traffic_manager.vehicle_percentage_speed_difference(vehicle, -30)  # 比限速快30%
-                    self.traffic_manager.auto_lane_change(vehicle, True)  # 启用自动变道
-                    self.traffic_manager.distance_to_leading_vehicle(vehicle, 2.0)  # 跟车距离2米
-
-                    # 如果启用危险模式
-                    if danger:
-                        self.traffic_manager.ignore_lights_percentage(vehicle, 100)
-                        self.traffic_manager.ignore_signs_percentage(vehicle, 100)
-                        self.traffic_manager.ignore_vehicles_percentage(vehicle, 50)
-                    else:
-                        # 正常模式：遵守交通规则
-                        self.traffic_manager.ignore_lights_percentage(vehicle, 0)
-                        self.traffic_manager.ignore_signs_percentage(vehicle, 0)
-
-                vehicles_spawned += 1
-
-        return vehicles_spawned
-
-    def _spawn_walkers(self, num_walkers: int) -> int:
-        """生成行人"""
-        blueprint_library = self.world.get_blueprint_library()
-        walker_blueprints = blueprint_library.filter("walker.pedestrian.*")
-
-        # 获取人行道生成点
-        spawn_points = []
-        for i in range(num_walkers * 10):  # 尝试更多点以确保足够的生成位置
-            spawn_point = carla.Transform()
-            loc = self.world.get_random_location_from_navigation()
-            if loc is not None:
-                spawn_point.location = loc
-                spawn_points.append(spawn_point)
+        spawned = self._resolve_batch_actors(results)
+        self.vehicles.extend(spawned)
+
+        # 危险模式的忽略规则没有全局等价设置，只对本批车辆逐车设置；
+        # 正常模式（遵守交通规则）即TrafficManager默认值，无需额外调用
+        self._apply_danger_settings(spawned, danger)
+
+        return spawned
+
+    def _apply_danger_settings(self, vehicles: List, danger: bool):
+        """危险模式逐车设置忽略规则；复用的车辆若之前处于危险模式则恢复默认"""
+        if not self.traffic_manager:
+            return
+
+        if danger:
+            for vehicle in vehicles:
+                self.traffic_manager.ignore_lights_percentage(vehicle, 100)
+                self.traffic_manager.ignore_signs_percentage(vehicle, 100)
+                self.traffic_manager.ignore_vehicles_percentage(vehicle, 50)
+                self._danger_vehicle_ids.add(vehicle.id)
+        else:
+            for vehicle in vehicles:
+                if vehicle.id in self._danger_vehicle_ids:
+                    self.traffic_manager.ignore_lights_percentage(vehicle, 0)
+                    self.traffic_manager.ignore_signs_percentage(vehicle, 0)
+                    self.traffic_manager.ignore_vehicles_percentage(vehicle, 0)
+                    self._danger_vehicle_ids.discard(vehicle.id)
+
+    def _parking_transform(self):
+        """回收池保留区域中的下一个停放位置"""
+        x, y, z = self._recycle_pool.parking_slot()
+        return carla.Transform(carla.Location(x=x, y=y, z=z))
+
+    def soft_reset(self) -> Dict:
+        """软重置：不销毁车辆和行人，关闭物理/自动驾驶后停放到保留区域，供下次生成时复用
+
+        停放用一个 ApplyTransform / SetSimulatePhysics / SetAutopilot 命令批次完成；
+        超出回收池容量的actor按停放时间先进先出淘汰并销毁。
+        """
+        if not self.world or not self.client:
+            return {"status": "error", "message": "CARLA未连接"}
+
+        start = time.perf_counter()
+        tm_port = self.tm_port
+        command = carla.command
+
+        try:
+            vehicles = [vehicle for vehicle in self.vehicles if vehicle.is_alive]
+
+            # 行人和控制器按 parent 配对，无法配对的直接销毁
+            controller_by_walker = {
+                controller.parent.id: controller
+                for controller in self.walker_controllers
+                if controller.is_alive and controller.parent is not None
+            }
+            walker_pairs = [
+                (walker, controller_by_walker[walker.id])
+                for walker in self.walkers
+                if walker.is_alive and walker.id in controller_by_walker
+            ]
+            paired_ids = {walker.id for walker, _ in walker_pairs} | {c.id for _, c in walker_pairs}
+            unpaired = [a for a in self.walkers + self.walker_controllers if a.id not in paired_ids]
+
+            # 停止行人AI（没有对应的批量命令）
+            for _, controller in walker_pairs:
+                try:
+                    controller.stop()
+                except Exception as e:
+                    self._actor_log.debug("controller_stop", "停止控制器失败: %s", e)
+
+            commands = []
+            for vehicle in vehicles:
+                commands.append(command.SetAutopilot(vehicle.id, False, tm_port))
+                commands.append(command.SetSimulatePhysics(vehicle.id, False))
+                commands.append(command.ApplyTransform(vehicle.id, self._parking_transform()))
+            for walker, _ in walker_pairs:
+                commands.append(command.SetSimulatePhysics(walker.id, False))
+                commands.append(command.ApplyTransform(walker.id, self._parking_transform()))
+
+            errors = 0
+            if commands:
+                results = self.client.apply_batch_sync(commands, True)
+                errors = sum(1 for result in results if result.error)
+
+            self.vehicles.clear()
+            self.walkers.clear()
+            self.walker_controllers.clear()
+
+            evicted_vehicles, evicted_pairs = self._recycle_pool.park(vehicles, walker_pairs)
+            evicted = self._destroy_recycled(evicted_vehicles, evicted_pairs, unpaired)
+
+            elapsed = time.perf_counter() - start
+            self.logger.info(
+                f"Soft reset: parked {len(vehicles)} vehicles, {len(walker_pairs)} walkers, "
+                f"evicted {evicted} actors in {elapsed:.3f}s"
+            )
+            return {
+                "status": "parked",
+                "parked_vehicles": len(vehicles),
+                "parked_walkers": len(walker_pairs),
+                "command_errors": errors,
+                "destroyed": evicted,
+                "pool": self._recycle_pool.info(),
+                "elapsed": round(elapsed, 3),
+                "message": f"已停放 {len(vehicles)} 辆车和 {len(walker_pairs)} 个行人，下次生成交通时复用"
+            }
+
+        except Exception as e:
+            self.logger.error(f"Soft reset failed: {e}", exc_info=True)
+            return {"status": "error", "message": f"软重置失败: {str(e)}"}
+
+    def _destroy_recycled(self, vehicles: List, walker_pairs: List, extra: List = None) -> int:
+        """在一个批次中销毁被淘汰的actor（控制器在前，已停止）"""
+        controllers = [controller for _, controller in walker_pairs]
+        walkers = [walker for walker, _ in walker_pairs]
+        actors = controllers + (extra or []) + walkers + vehicles
+        if not actors:
+            return 0
+
+        results = self.client.apply_batch_sync(
+            [carla.command.DestroyActor(actor.id) for actor in actors], True
+        )
+        return sum(1 for result in results if not result.error)
+
+    def _park_back(self, vehicles: List, walker_pairs: List):
+        """把取出后未能复用的actor放回回收池（超出容量被淘汰的直接销毁）"""
+        evicted_vehicles, evicted_pairs = self._recycle_pool.park(vehicles, walker_pairs)
+        try:
+            self._destroy_recycled(evicted_vehicles, evicted_pairs)
+        except Exception as e:
+            self.logger.warning(f"Failed to destroy evicted actors: {e}")
+
+    def _destroy_failed_reuse(self, vehicles: List, walker_pairs: List):
+        """销毁复用失败的actor；销毁也失败时放回回收池，保证始终有记录"""
+        try:
+            self._destroy_recycled(vehicles, walker_pairs)
+            self.logger.info(f"Destroyed {len(vehicles) + len(walker_pairs)} parked actors that failed to reuse")
+        except Exception as e:
+            self.logger.warning(f"Failed to destroy actors that failed to reuse: {e}")
+            self._park_back(vehicles, walker_pairs)
+
+    def _reuse_parked_vehicles(self, spawn_points: List, danger: bool) -> tuple:
+        """把停放的车辆传送到生成点并重新启用物理和自动驾驶（一个批次）
+
+        返回 (复用数量, 剩余需要新生成的生成点)。任一命令失败的车辆会被销毁，避免泄漏在服务器上。
+        """
+        vehicles = self._recycle_pool.take_vehicles(len(spawn_points))
+        tm_port = self.tm_port
+        command = carla.command
+
+        commands = []
+        for vehicle, spawn_point in zip(vehicles, spawn_points):
+            commands.append(command.ApplyTransform(vehicle.id, spawn_point))
+            commands.append(command.SetSimulatePhysics(vehicle.id, True))
+            commands.append(command.SetAutopilot(vehicle.id, True, tm_port))
+        try:
+            results = self.client.apply_batch_sync(commands, True)
+        except Exception:
+            # 整个批次失败：车辆仍处于停放状态，放回回收池
+            self._park_back(vehicles, [])
+            raise
+
+        reused, failed, failed_points = [], [], []
+        for i, (vehicle, spawn_point) in enumerate(zip(vehicles, spawn_points)):
+            if any(result.error for result in results[3 * i:3 * i + 3]):
+                failed.append(vehicle)
+                failed_points.append(spawn_point)
+            else:
+                reused.append(vehicle)
+
+        if failed:
+            self._destroy_failed_reuse(failed, [])
+        self.vehicles.extend(reused)
+        self._apply_danger_settings(reused, danger)
+        return len(reused), failed_points + spawn_points[len(vehicles):]
+
+    def _reuse_parked_walkers(self, spawn_points: List, nav_pool: NavLocationPool) -> tuple:
+        """把停放的行人传送到生成点并重新启动AI（传送为一个批次）
+
+        返回 (复用数量, 剩余需要新生成的生成点)。传送或重启AI失败的行人连同控制器一起销毁。
+        """
+        pairs = self._recycle_pool.take_walkers(len(spawn_points))
+        command = carla.command
+
+        commands = []
+        for (walker, _), spawn_point in zip(pairs, spawn_points):
+            commands.append(command.ApplyTransform(walker.id, spawn_point))
+            commands.append(command.SetSimulatePhysics(walker.id, True))
+        try:
+            results = self.client.apply_batch_sync(commands, True)
+        except Exception:
+            self._park_back([], pairs)
+            raise
+
+        reused, failed, failed_points = 0, [], []
+        for i, ((walker, controller), spawn_point) in enumerate(zip(pairs, spawn_points)):
+            if any(result.error for result in results[2 * i:2 * i + 2]):
+                failed.append((walker, controller))
+                failed_points.append(spawn_point)
+                continue
+            try:
+                controller.start()
+                controller.go_to_location(nav_pool.destination())
+                controller.set_max_speed(1 + random.random())  # 随机速度 1-2 m/s
+            except Exception as e:
+                self._actor_log.debug("walker_reuse", "重新启动行人AI失败: %s", e)
+                failed.append((walker, controller))
+                failed_points.append(spawn_point)
+                continue
+            self.walkers.append(walker)
+            self.walker_controllers.append(controller)
+            reused += 1
+
+        if failed:
+            self._destroy_failed_reuse([], failed)
+        return reused, failed_points + spawn_points[len(pairs):]
+
+    def _spawn_walkers(self, num_walkers: int, chunk_size: int = 0,
+                       on_chunk: Optional[Callable[[int], None]] = None,
+                       cancel_event: Optional[threading.Event] = None) -> Dict:
+        """生成行人，返回 requested / planned / spawned / failed / retried 统计"""
+        report = {"requested": num_walkers, "planned": 0, "spawned": 0, "failed": 0, "retried": 0}
+        if num_walkers <= 0:
+            return report
+
+        # 从导航点池中取出互不重叠的生成点
+        nav_pool = self._get_nav_pool()
+        spawn_points = [carla.Transform(loc) for loc in nav_pool.take(num_walkers)]
 
         if len(spawn_points) < num_walkers:
             self.logger.warning(f"Only found {len(spawn_points)} walker spawn points for {num_walkers} walkers")
-            num_walkers = len(spawn_points)
+        report["planned"] = len(spawn_points)
+
+        # 优先复用回收池中停放的行人
+        if len(self._recycle_pool.walkers) > 0 and spawn_points:
+            reused, spawn_points = self._reuse_parked_walkers(spawn_points, nav_pool)
+            report["reused"] = reused
+            report["spawned"] += reused
+            if on_chunk and reused:
+                on_chunk(reused)
+
+        for chunk in self._chunks(spawn_points, chunk_size):
+            if cancel_event is not None and cancel_event.is_set():
+                report["cancelled"] = True
+                self.logger.info(f"Walker spawn cancelled after {report['spawned']} walkers")
+                break
+
+            report["spawned"] += self._spawn_chunk_with_retry(
+                chunk,
+                lambda points: self._spawn_walker_batch(points, nav_pool),
+                lambda count: [carla.Transform(loc) for loc in nav_pool.take(count)],
+                report
+            )
+            if on_chunk:
+                on_chunk(len(chunk))
+
+        return report
+
+    def _spawn_walker_batch(self, spawn_points: List, nav_pool: NavLocationPool) -> int:
+        """在给定生成点上批量生成行人及其AI控制器，返回成功生成的行人数"""
+        if not spawn_points:
+            return 0
+
+        catalog = self._get_blueprint_catalog()
 
         # 批量生成行人
         batch_commands = []
-        for i in range(num_walkers):
-            blueprint = random.choice(walker_blueprints)
-
-            # 随机化外观
-            if blueprint.has_attribute('is_invincible'):
-                blueprint.set_attribute('is_invincible', 'false')
+        for spawn_point in spawn_points:
+            blueprint = catalog.pick_walker()
 
             batch_commands.append(
-                carla.command.SpawnActor(blueprint, spawn_points[i])
+                carla.command.SpawnActor(blueprint, spawn_point)
             )
 
         results = self.client.apply_batch_sync(batch_commands, True)
 
         # 为成功生成的行人创建控制器
-        walker_controller_bp = blueprint_library.find('controller.ai.walker')
-        batch_controller_commands = []
-        walkers_spawned = 0
-
-        for result in results:
-            if not result.error:
-                walker = self.world.get_actor(result.actor_id)
-                self.walkers.append(walker)
-                batch_controller_commands.append(
-                    carla.command.SpawnActor(walker_controller_bp, carla.Transform(), walker.id)
-                )
-                walkers_spawned += 1
+        walker_controller_bp = catalog.walker_controller
+        walkers = self._resolve_batch_actors(results)
+        self.walkers.extend(walkers)
+
+        batch_controller_commands = [
+            carla.command.SpawnActor(walker_controller_bp, carla.Transform(), walker.id)
+            for walker in walkers
+        ]
 
         # 生成控制器
         controller_results = self.client.apply_batch_sync(batch_controller_commands, True)
+        controllers = self._resolve_batch_actors(controller_results)
+        self.walker_controllers.extend(controllers)
 
         # 启动行人AI
-        for i, result in enumerate(controller_results):
-            if not result.error:
-                controller = self.world.get_actor(result.actor_id)
-                self.walker_controllers.append(controller)
-                controller.start()
-                controller.go_to_location(self.world.get_random_location_from_navigation())
-                controller.set_max_speed(1 + random.random())  # 随机速度 1-2 m/s
-
-        return walkers_spawned
-
-    def clear_all_traffic(self) -> Dict:
-        """清除所有交通参与者 - 稳定优先的保守批量销毁方案"""
+        for controller in controllers:
+            controller.start()
+            controller.go_to_location(nav_pool.destination())
+            controller.set_max_speed(1 + random.random())  # 随机速度 1-2 m/s
+
+        return len(walkers)
+
+    def _get_clear_profile(self, profile: str = None) -> Dict:
+        """获取清除档位参数（内置默认值 + 配置文件覆盖）"""
+        clear_config = self.config.get("clear", {})
+        profile = profile or clear_config.get("profile", "conservative")
+        if profile not in self.CLEAR_PROFILES:
+            available = ", ".join(self.CLEAR_PROFILES.keys())
+            raise ValueError(f"Unknown clear profile: {profile}. Available: {available}")
+
+        settings = dict(self.CLEAR_PROFILES[profile])
+        settings.update(clear_config.get("profiles", {}).get(profile) or {})
+        settings["name"] = profile
+        return settings
+
+    def clear_all_traffic(self, profile: str = None, sweep: bool = False, role_name: str = None,
+                          type_prefixes: List[str] = None,
+                          progress_callback: Optional[Callable[[str, Dict, Dict], None]] = None) -> Dict:
+        """清除所有交通参与者 - 按档位（conservative / balanced / fast）分批销毁
+
+        sweep=True 时额外查询一次 world.get_actors()，按类型前缀（及可选的 role_name）
+        清扫不在本地记录中的孤儿actor（MCP进程重启、其他客户端生成等）。
+        progress_callback(当前阶段, 各阶段耗时, 已清除数量) 在每个阶段开始和每批销毁后调用。
+        """
         import time
         start_time = time.time()
 
-        self.logger.info("=== CLEAR_ALL_TRAFFIC START (保守批量销毁方案) ===")
-        self.logger.info(f"Initial counts: vehicles={len(self.vehicles)}, walkers={len(self.walkers)}, controllers={len(self.walker_controllers)}")
-
         if not self.world or not self.client:
             return {"status": "error", "message": "CARLA未连接"}
 
         try:
+            settings = self._get_clear_profile(profile)
+        except ValueError as e:
+            return {"status": "error", "message": str(e)}
+
+        self.logger.info(f"=== CLEAR_ALL_TRAFFIC START (profile={settings['name']}) ===")
+        self.logger.info(f"Initial counts: vehicles={len(self.vehicles)}, walkers={len(self.walkers)}, controllers={len(self.walker_controllers)}")
+
+        # 各阶段耗时（秒）
+        phase_timings: Dict[str, float] = {}
+        phase_start = [time.perf_counter()]
+
+        current_phase = [None]
+
+        def report(phase: str = None):
+            if phase is not None:
+                current_phase[0] = phase
+            if progress_callback:
+                try:
+                    progress_callback(current_phase[0], phase_timings, cleared_count)
+                except Exception as e:
+                    self.logger.debug(f"Clear progress callback failed: {e}")
+
+        def end_phase(name: str):
+            now = time.perf_counter()
+            phase_timings[name] = round(now - phase_start[0], 4)
+            CLEAR_PHASE_SECONDS.observe(now - phase_start[0], instance=self.instance_id, phase=name)
+            phase_start[0] = now
+            report()
+
+        try:
+            # 回收池中停放的actor也一并清除
+            parked_vehicles, parked_walkers = self._recycle_pool.drain()
+            self.vehicles.extend(parked_vehicles)
+            self.walkers.extend(walker for walker, _ in parked_walkers)
+            self.walker_controllers.extend(controller for _, controller in parked_walkers)
+
             # 记录当前状态
             initial_counts = {
                 "vehicles": len(self.vehicles),
@@ -456,12 +1350,21 @@ class CarlaManager:
 
             cleared_count = {"vehicles": 0, "walkers": 0, "controllers": 0}
 
+            def on_destroyed(key: str):
+                def update(destroyed: int):
+                    cleared_count[key] = destroyed
+                    report()
+                return update
+
+            tracked_ids = {actor.id for actor in self.vehicles + self.walkers + self.walker_controllers}
+
             # 阶段1: 停止传感器回调 (如果有的话)
             self.logger.info("阶段1: 停止传感器回调...")
             # 注意：当前实现中没有传感器，跳过此步骤
 
             # 阶段2: 停止并销毁 Walker 控制器
             self.logger.info("阶段2: 停止并销毁行人控制器...")
+            report("controllers")
             if self.walker_controllers:
                 # 先停止所有控制器
                 for controller in self.walker_controllers:
@@ -469,7 +1372,7 @@ class CarlaManager:
                         if controller.is_alive:
                             controller.stop()
                     except Exception as e:
-                        self.logger.debug(f"停止控制器失败: {e}")
+                        self._actor_log.debug("controller_stop", "停止控制器失败: %s", e)
 
                 # 等待停止生效
                 time.sleep(0.05)
@@ -477,63 +1380,108 @@ class CarlaManager:
 
                 # 分批销毁控制器
                 cleared_count["controllers"] = self._batch_destroy_actors(
-                    self.walker_controllers, "控制器", batch_size=5
+                    self.walker_controllers, "控制器", settings=settings,
+                    on_progress=on_destroyed("controllers")
                 )
                 self.walker_controllers.clear()
+            end_phase("controllers")
 
             # 阶段3: 车辆退出 TrafficManager
             self.logger.info("阶段3: 车辆退出 TrafficManager...")
+            report("autopilot_off")
             if self.vehicles and self.traffic_manager:
-                for vehicle in self.vehicles:
+                if settings.get("batch_autopilot_off"):
+                    # 一个批次关闭所有车辆的自动驾驶
+                    tm_port = self.tm_port
+                    commands = [carla.command.SetAutopilot(vehicle.id, False, tm_port) for vehicle in self.vehicles]
                     try:
-                        if vehicle.is_alive:
-                            vehicle.set_autopilot(False)
+                        self.client.apply_batch_sync(commands, False)
                     except Exception as e:
-                        self.logger.debug(f"禁用自动驾驶失败: {e}")
+                        self.logger.debug(f"批量禁用自动驾驶失败: {e}")
+                else:
+                    for vehicle in self.vehicles:
+                        try:
+                            if vehicle.is_alive:
+                                vehicle.set_autopilot(False)
+                        except Exception as e:
+                            self._actor_log.debug("autopilot_off", "禁用自动驾驶失败: %s", e)
 
                 time.sleep(0.05)
                 self.world.tick()
+            end_phase("autopilot_off")
 
             # 阶段4: 分批销毁行人
             self.logger.info("阶段4: 分批销毁行人...")
+            report("walkers")
             if self.walkers:
                 cleared_count["walkers"] = self._batch_destroy_actors(
-                    self.walkers, "行人", batch_size=5
+                    self.walkers, "行人", settings=settings,
+                    on_progress=on_destroyed("walkers")
                 )
                 self.walkers.clear()
+            # 行人已清除，导航点池中的占用位置可以重新使用
+            for nav_pool in self._nav_pools.values():
+                nav_pool.release_reserved()
+            end_phase("walkers")
 
             # 阶段5: 分批销毁车辆
             self.logger.info("阶段5: 分批销毁车辆...")
+            report("vehicles")
             if self.vehicles:
                 cleared_count["vehicles"] = self._batch_destroy_actors(
-                    self.vehicles, "车辆", batch_size=5
+                    self.vehicles, "车辆", settings=settings,
+                    on_progress=on_destroyed("vehicles")
                 )
                 self.vehicles.clear()
+            end_phase("vehicles")
+
+            # 阶段5b: 清扫孤儿actor（不在本地列表中的同类actor）
+            orphan_count = None
+            if sweep:
+                self.logger.info("阶段5b: 清扫孤儿actor...")
+                report("orphan_sweep")
+                orphan_count = self._sweep_orphan_actors(tracked_ids, role_name, type_prefixes)
+                end_phase("orphan_sweep")
 
             # 阶段6: 冷却期 - tick 多帧
             self.logger.info("阶段6: 冷却期...")
-            for i in range(60):  # 60帧 ≈ 1秒
+            report("cooldown")
+            for i in range(settings["cooldown_ticks"]):
                 self.world.tick()
                 if i % 20 == 0:  # 每20帧检查一次
                     time.sleep(0.02)
 
-            time.sleep(1.0)  # 额外1秒冷却
+            if settings["cooldown_sleep"] > 0:
+                time.sleep(settings["cooldown_sleep"])  # 额外冷却
+            end_phase("cooldown")
 
             # 阶段7: 健康探针
             self.logger.info("阶段7: 健康探针...")
-            health_check_passed = self._health_check()
+            report("health_check")
+            health_probe = self._health_check()
+            health_check_passed = health_probe["passed"]
+            end_phase("health_check")
 
             elapsed = time.time() - start_time
             self.logger.info(f"=== CLEAR_ALL_TRAFFIC END: {elapsed:.3f}s ===")
             self.logger.info(f"成功清除交通 (cleared: {cleared_count}, health_check: {health_check_passed})")
 
-            return {
+            result = {
                 "status": "cleared",
                 "method": "batch_destroy",
+                "profile": settings["name"],
                 "cleared": cleared_count,
                 "health_check": health_check_passed,
+                "health_probe": health_probe,
+                "phase_timings": phase_timings,
+                "elapsed": round(elapsed, 3),
                 "message": f"批量销毁清除了 {cleared_count['vehicles']} 辆车, {cleared_count['walkers']} 个行人, {cleared_count['controllers']} 个控制器"
             }
+            if orphan_count is not None:
+                result["tracked_removed"] = sum(cleared_count.values())
+                result["orphans_removed"] = orphan_count
+                result["message"] += f"; 清扫孤儿actor {sum(orphan_count.values())} 个"
+            return result
 
         except Exception as e:
             elapsed = time.time() - start_time
@@ -553,14 +1501,88 @@ class CarlaManager:
 
                 return {"status": "error", "message": f"批量销毁和兜底方案都失败: {str(e)}"}
 
-    def _batch_destroy_actors(self, actors: List, actor_type: str, batch_size: int = 5) -> int:
-        """分批销毁actors"""
+    def _sweep_orphan_actors(self, tracked_ids: set, role_name: str = None,
+                             type_prefixes: List[str] = None) -> Dict[str, int]:
+        """查询一次世界中的全部actor，销毁匹配类型前缀（和role_name）但未被本地记录的actor
+
+        按 控制器 -> 行人 -> 车辆 的顺序放在同一个批次中销毁（批次内按顺序执行），
+        控制器在销毁前先停止。返回按类型统计的销毁数量。
+        """
+        type_prefixes = type_prefixes or self.config.get("clear", {}).get(
+            "sweep_type_prefixes", ["vehicle.", "walker.pedestrian.", "controller.ai.walker"]
+        )
+
+        controllers, walkers, others = [], [], []
+        for actor in self.world.get_actors():
+            if actor.id in tracked_ids or not actor.type_id.startswith(tuple(type_prefixes)):
+                continue
+            if actor.type_id.startswith("controller.ai.walker"):
+                controllers.append(actor)
+            elif actor.type_id.startswith("walker."):
+                walkers.append(actor)
+            else:
+                others.append(actor)
+
+        if role_name is not None:
+            walkers = [a for a in walkers if a.attributes.get("role_name") == role_name]
+            others = [a for a in others if a.attributes.get("role_name") == role_name]
+            # 控制器没有role_name，按其所属行人筛选
+            walker_ids = {a.id for a in walkers}
+            controllers = [a for a in controllers if a.parent is not None and a.parent.id in walker_ids]
+
+        orphans = controllers + walkers + others
+        counts = {"controllers": len(controllers), "walkers": len(walkers), "vehicles": len(others)}
+        if not orphans:
+            self.logger.info("未发现孤儿actor")
+            return {key: 0 for key in counts}
+
+        self.logger.info(f"发现孤儿actor: {counts}")
+        for controller in controllers:
+            try:
+                controller.stop()
+            except Exception as e:
+                self._actor_log.debug("orphan_controller_stop", "停止孤儿控制器失败: %s", e)
+
+        results = self.client.apply_batch_sync([carla.command.DestroyActor(a.id) for a in orphans], True)
+        removed = {"controllers": 0, "walkers": 0, "vehicles": 0}
+        for index, (actor, result) in enumerate(zip(orphans, results)):
+            if result.error:
+                self._actor_log.debug("orphan_destroy", "销毁孤儿actor %s 失败: %s", actor.id, result.error)
+                continue
+            if index < len(controllers):
+                removed["controllers"] += 1
+            elif index < len(controllers) + len(walkers):
+                removed["walkers"] += 1
+            else:
+                removed["vehicles"] += 1
+        return removed
+
+    def _batch_destroy_actors(self, actors: List, actor_type: str, batch_size: int = 5,
+                              settings: Dict = None,
+                              on_progress: Optional[Callable[[int], None]] = None) -> int:
+        """分批销毁actors（on_progress(已销毁数量) 在每批之后调用）
+
+        settings 为清除档位参数；adaptive 档位根据每批 apply_batch_sync 的延迟和
+        错误情况调整批次大小：无错误且低于目标延迟时翻倍，出现错误或明显超时时减半。
+        自适应得到的批次大小写回 settings["batch_size"]，后续阶段沿用。
+        """
         import time
+        settings = settings or {"batch_size": batch_size, "batch_sleep": 0.03, "tick_between_batches": True}
+        batch_size = settings["batch_size"]
+        adaptive = settings.get("adaptive", False)
+        min_batch = settings.get("min_batch_size", 1)
+        max_batch = settings.get("max_batch_size", batch_size)
+        target_latency = settings.get("target_batch_latency", 0.25)
+
         destroyed_count = 0
+        batch_index = 0
+        i = 0
 
-        for i in range(0, len(actors), batch_size):
+        while i < len(actors):
             batch = actors[i:i+batch_size]
-            self.logger.debug(f"销毁 {actor_type} 批次 {i//batch_size + 1}: {len(batch)} 个")
+            i += len(batch)
+            batch_index += 1
+            self._actor_log.debug("destroy_batch", "销毁 %s 批次 %d: %d 个", actor_type, batch_index, len(batch))
 
             # 准备批量销毁命令
             batch_commands = []
@@ -569,57 +1591,100 @@ class CarlaManager:
                     if actor.is_alive:
                         batch_commands.append(carla.command.DestroyActor(actor.id))
                 except Exception as e:
-                    self.logger.debug(f"检查 {actor_type} 状态失败: {e}")
+                    self._actor_log.debug("actor_check", "检查 %s 状态失败: %s", actor_type, e)
 
+            errors = 0
+            latency = 0.0
             if batch_commands:
                 try:
                     # 执行批量销毁
+                    batch_start = time.perf_counter()
                     results = self.client.apply_batch_sync(batch_commands, True)  # do_tick=True
+                    latency = time.perf_counter() - batch_start
 
                     # 统计成功销毁的数量
                     for result in results:
                         if not result.error:
                             destroyed_count += 1
                         else:
-                            self.logger.debug(f"销毁 {actor_type} 失败: {result.error}")
+                            errors += 1
+                            self._actor_log.debug("actor_destroy", "销毁 %s 失败: %s", actor_type, result.error)
 
                 except Exception as e:
+                    errors = len(batch_commands)
                     self.logger.error(f"批量销毁 {actor_type} 失败: {e}")
 
-            # 批次间延迟
-            if i + batch_size < len(actors):
-                time.sleep(0.03)  # 30ms
-                self.world.tick()
+            if on_progress:
+                on_progress(destroyed_count)
+
+            if adaptive:
+                if errors:
+                    batch_size = max(min_batch, batch_size // 2)
+                elif latency > 2 * target_latency:
+                    batch_size = max(min_batch, batch_size // 2)
+                elif latency < target_latency:
+                    batch_size = min(max_batch, batch_size * 2)
 
-        self.logger.info(f"{actor_type} 销毁完成: {destroyed_count}/{len(actors)}")
+            # 批次间延迟
+            if i < len(actors):
+                if settings.get("batch_sleep", 0) > 0:
+                    time.sleep(settings["batch_sleep"])
+                if settings.get("tick_between_batches", True):
+                    self.world.tick()
+
+        settings["batch_size"] = batch_size
+        self.logger.info(f"{actor_type} 销毁完成: {destroyed_count}/{len(actors)} ({batch_index} 批)")
         return destroyed_count
 
-    def _health_check(self) -> bool:
-        """健康探针检查"""
+    def _health_check(self) -> Dict:
+        """健康探针检查
+
+        只使用轻量RPC：服务器版本 + 世界快照帧号推进（tick前后对比），不调用 get_map()。
+        探针使用单独的、超时为 carla.health_probe_timeout 的客户端，不影响共享客户端上的其他调用；
+        返回是否通过及各步耗时。
+        """
+        probe = {"passed": False, "latency": 0.0}
+        if not self.client or not self.world:
+            probe["error"] = "CARLA未连接"
+            self._last_health_probe = probe
+            return probe
+
+        carla_config = self.config["carla"]
+        probe_timeout = carla_config.get("health_probe_timeout", 2.0)
+        start = time.perf_counter()
         try:
-            # 检查基本连接
-            if not self.client or not self.world:
-                return False
-
-            # 尝试获取世界快照
-            snapshot = self.world.get_snapshot()
-            if snapshot is None:
-                return False
-
-            # 检查地图是否可访问
-            game_map = self.world.get_map()
-            if game_map is None:
-                return False
-
-            # 尝试tick一次
-            self.world.tick()
-
-            self.logger.info("健康检查通过")
-            return True
+            if self._probe_client is None or self._probe_client[0] != self.port:
+                client = carla.Client(carla_config["host"], self.port)
+                client.set_timeout(probe_timeout)
+                self._probe_client = (self.port, client)
+            client = self._probe_client[1]
+            probe["server_version"] = client.get_server_version()
+            probe["version_latency"] = round(time.perf_counter() - start, 4)
+
+            world = client.get_world()
+            frame_before = world.get_snapshot().frame
+            tick_start = time.perf_counter()
+            world.tick(probe_timeout)
+            frame_after = world.get_snapshot().frame
+            probe["tick_latency"] = round(time.perf_counter() - tick_start, 4)
+            probe["frame"] = frame_after
+            probe["frame_advance"] = frame_after - frame_before
+
+            probe["passed"] = frame_after > frame_before
+            if not probe["passed"]:
+                probe["error"] = "世界帧号未推进"
 
         except Exception as e:
-            self.logger.error(f"健康检查失败: {e}")
-            return False
+            probe["error"] = str(e)
+        finally:
+            probe["latency"] = round(time.perf_counter() - start, 4)
+
+        if probe["passed"]:
+            self.logger.info(f"健康检查通过 ({probe['latency'] * 1000:.1f} ms)")
+        else:
+            self.logger.error(f"健康检查失败: {probe.get('error')}")
+        self._last_health_probe = probe
+        return probe
 
     def _fallback_load_world(self, initial_counts: Dict) -> Dict:
         """兜底方案：load_world"""
@@ -628,18 +1693,17 @@ class CarlaManager:
         self.logger.info("执行兜底 load_world 方案...")
 
         # 获取当前地图名称和天气
-        current_map_full_name = self.world.get_map().name
+        current_map_full_name = self._get_map_name()
         current_weather = self.world.get_weather()
         current_map_name = current_map_full_name.split('/')[-1] if '/' in current_map_full_name else current_map_full_name
 
         # 重新加载世界
         self.world = self.client.load_world(current_map_name)
+        self._invalidate_map_caches()
         self.world.set_weather(current_weather)
 
         # 重新获取TrafficManager
-        self.traffic_manager = self.client.get_trafficmanager(
-            self.config["carla"]["port"] + 6000
-        )
+        self._init_traffic_manager()
 
         # 清空列表
         self.vehicles.clear()
@@ -692,26 +1756,72 @@ class CarlaManager:
             self.logger.error(f"Error setting weather: {e}")
             return {"status": "error", "message": str(e)}
 
+    def actor_counts(self) -> Dict[str, int]:
+        """当前记录的actor数量（只读内存，不访问仿真器）"""
+        parked = self._recycle_pool.info()
+        return {
+            "vehicle": len(self.vehicles),
+            "walker": len(self.walkers),
+            "controller": len(self.walker_controllers),
+            "parked_vehicle": parked["parked_vehicles"],
+            "parked_walker": parked["parked_walkers"],
+        }
+
+    def _update_frame_rate(self, frame: int) -> Optional[float]:
+        """根据相邻两次状态查询之间的帧号增量估算仿真帧率（帧/秒，墙钟时间）"""
+        now = time.time()
+        previous, self._frame_sample = self._frame_sample, (frame, now)
+        if previous is not None and now > previous[1] and frame >= previous[0]:
+            self.frame_rate = round((frame - previous[0]) / (now - previous[1]), 2)
+        return self.frame_rate
+
     def get_status(self) -> Dict:
         """获取CARLA状态信息"""
         try:
             status = {
+                "instance_id": self.instance_id,
+                "rpc_worker": self.rpc.info(),
+                "status_cache": self.status_cache.info(),
                 "carla_running": self.is_carla_running(),
                 "connected": self.client is not None,
                 "world_loaded": self.world is not None,
+                "spawn_point_cache": self._spawn_point_cache_info(),
+                "actor_resolution": self._actor_resolution_info(),
             }
 
+            if self._blueprint_catalog:
+                status["blueprint_catalog"] = self._blueprint_catalog.summary()
+
+            if self._last_health_probe:
+                status["last_health_probe"] = self._last_health_probe
+
+            if len(self._recycle_pool) > 0:
+                status["recycle_pool"] = self._recycle_pool.info()
+
+            if self._nav_pools:
+                status["nav_location_pools"] = [pool.info() for pool in self._nav_pools.values()]
+
             if self.world:
+                frame = self.world.get_snapshot().timestamp.frame
                 status.update({
-                    "map_name": self.world.get_map().name,
+                    "map_name": self._get_map_name(),
                     "weather": str(self.world.get_weather()),
                     "active_vehicles": len(self.vehicles),
                     "active_walkers": len(self.walkers),
-                    "tick": self.world.get_snapshot().timestamp.frame
+                    "tick": frame,
+                    "frame_rate": self._update_frame_rate(frame)
                 })
 
             if self.process:
                 status["process_id"] = self.process.pid
+            if self.server_pool and self.server_pool.enabled:
+                status["server_pool"] = self.server_pool.info()
+            if self._leased_server is not None:
+                status["pool_server"] = self._leased_server.info()
+                status["process_id"] = self._leased_server.pid
+            status["port"] = self.port
+            status["tm_port"] = self.tm_port
+            status["carla_processes"] = self._process_tracker.info()
 
             return {"status": "success", "data": status}
 
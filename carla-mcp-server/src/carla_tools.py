@@ -3,20 +3,134 @@ CARLA MCP Tools - MCP工具函数定义
 提供给LLM调用的自然语言接口
 """
 
+import asyncio
+import threading
 from typing import Dict
-from carla_manager import CarlaManager
+from async_runner import CarlaAsyncRunner
+from clear_jobs import ClearJobManager
+from manager_registry import ManagerRegistry
+from logging_setup import dropped_records
+from metrics import METRICS
+from rpc_worker import MergeSpec
+from tool_tracing import ToolTracer
+
+# CARLA实例注册表：各工具函数通过 instance 参数选择实例，不指定时使用默认实例
+registry = ManagerRegistry()
+
+# 默认CARLA管理器实例（向后兼容）
+carla_manager = registry.get()
+
+# 预启动服务器池（server_pool.enabled 为 true 时启用，由 start_carla 租用）
+server_pool = registry.server_pool
+
+# 阻塞CARLA调用的异步门面（有界线程池 + 按操作的超时）
+runner = CarlaAsyncRunner.from_config(registry.config)
+
+# 后台清除任务（每个实例同时最多一个）
+clear_jobs = ClearJobManager()
+
+# 工具调用追踪（慢调用存储、span导出）
+tracer = ToolTracer.from_config(registry.config)
+
+
+def _collect_metrics():
+    """/metrics 抓取时的实例指标：只读取内存中的记录，不访问仿真器"""
+    actors, connected, frame_rate, snapshot_age = [], [], [], []
+    queue_depth, queue_wait, processed, merged = [], [], [], []
+    for manager in registry.managers():
+        instance = {"instance": manager.instance_id}
+        for kind, count in manager.actor_counts().items():
+            actors.append((dict(instance, kind=kind), count))
+        is_connected = manager.is_connected()
+        connected.append((instance, 1 if is_connected else 0))
+        if is_connected:
+            # 帧率随状态快照刷新更新；抓取本身不算作读取，不会让后台刷新保持运行，
+            # 刷新已暂停（无人查询状态）时不导出过期的帧率，快照年龄仍可用于判断新鲜度
+            if manager.frame_rate is not None and manager.status_cache.refreshing:
+                frame_rate.append((instance, manager.frame_rate))
+            if manager.status_cache.version:
+                snapshot_age.append((instance, round(manager.status_cache.age(), 3)))
+
+        rpc_info = manager.rpc.info()
+        for lane, lane_info in rpc_info["lanes"].items():
+            queue_depth.append((dict(instance, lane=lane), lane_info["depth"]))
+            queue_wait.append((dict(instance, lane=lane), lane_info["wait_max"]))
+            processed.append((dict(instance, lane=lane), lane_info["processed"]))
+        merged.append((instance, rpc_info["merged"]))
+
+    runner_info = runner.info()
+    return [
+        ("carla_tracked_actors", "gauge", "Actors tracked by the manager", actors),
+        ("carla_connected", "gauge", "Whether the instance has a CARLA client connection", connected),
+        ("carla_simulator_frame_rate", "gauge", "Simulator frames per wall-clock second", frame_rate),
+        ("carla_status_snapshot_age_seconds", "gauge", "Age of the cached status snapshot", snapshot_age),
+        ("carla_rpc_queue_depth", "gauge", "Requests waiting on the instance RPC worker", queue_depth),
+        ("carla_rpc_queue_wait_max_seconds", "gauge", "Longest queue wait seen on the RPC worker", queue_wait),
+        ("carla_rpc_processed_total", "counter", "Requests executed by the RPC worker", processed),
+        ("carla_rpc_merged_total", "counter", "Write requests merged into another batch", merged),
+        ("carla_async_in_flight", "gauge", "Tool calls running on the async runner", [({}, runner_info["in_flight"])]),
+        ("carla_async_timeouts_total", "counter", "Tool calls that hit their timeout", [({}, runner_info["timeouts"])]),
+        ("carla_log_records_dropped_total", "counter", "Log records dropped because the log queue was full",
+         [({}, dropped_records())]),
+    ]
+
+
+METRICS.register_collector(_collect_metrics)
+
+
+def _with_connection(manager, method):
+    """包装为调用前确保已连接CARLA的函数（整体在实例的RPC工作线程中执行）"""
+    def run(*args, **kwargs):
+        if not manager.is_connected():
+            connect_result = manager.connect_to_carla()
+            if connect_result.get("status") != "success":
+                return connect_result
+        return method(*args, **kwargs)
+    return run
 
-# 全局CARLA管理器实例
-carla_manager = CarlaManager()
 
+def _spawn_merge(kind: str, actor: str) -> MergeSpec:
+    """相邻的同类快速生成请求（只有数量参数）合并为一次批量生成
 
-def start_carla(map_name: str = "Town01", quality: str = "Low") -> Dict:
+    actor 为结果中的参与者前缀（vehicle / walker）。实际生成的数量按排队顺序分给各请求，
+    每个请求最多分到自己请求的数量；合并批次的完整报告放在 merged_spawn 中。
+    """
+    spawned_key, report_key = f"{actor}s_spawned", f"{actor}_spawn"
+
+    def combine(arg_list):
+        return (sum(args[0] for args in arg_list),)
+
+    def split(result, arg_list):
+        if len(arg_list) == 1 or not isinstance(result, dict) or spawned_key not in result:
+            return [result] * len(arg_list)
+        remaining = result[spawned_key]
+        parts = []
+        for args in arg_list:
+            share = min(args[0], remaining)
+            remaining -= share
+            parts.append(dict(
+                result,
+                **{spawned_key: share, report_key: {"requested": args[0], "spawned": share}},
+                merged_requests=len(arg_list),
+                merged_spawn=result.get(report_key)
+            ))
+        return parts
+
+    return MergeSpec(kind, combine, split)
+
+
+# 正在进行的分块交通生成任务的取消事件 -> 实例ID
+_active_spawn_cancels: Dict[threading.Event, str] = {}
+
+
+def start_carla(map_name: str = "Town01", quality: str = "Low", instance: str = None) -> Dict:
     """
     启动CARLA仿真器
 
     Args:
         map_name: 地图名称 (Town01, Town02, Town03, Town04, Town05, Town10HD)
         quality: 图形质量 (Low, Epic)
+        instance: CARLA实例ID，不指定时使用默认实例
 
     Returns:
         包含启动状态信息的字典
@@ -26,36 +140,47 @@ def start_carla(map_name: str = "Town01", quality: str = "Low") -> Dict:
         启动并加载Town03: start_carla("Town03")
         高质量模式启动: start_carla("Town01", "Epic")
     """
-    import asyncio
-    import threading
-
     try:
-        result = {}
-
-        def run_in_thread():
-            """在独立线程中运行异步CARLA启动逻辑"""
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            try:
-                async_result = loop.run_until_complete(carla_manager.start_carla(map_name, quality))
-                result.update(async_result)
-            finally:
-                loop.close()
-
-        # 在独立线程中运行异步操作，避免与主事件循环冲突
-        thread = threading.Thread(target=run_in_thread)
-        thread.start()
-        thread.join()
-
-        return result
+        manager = registry.get(instance)
+        # 启动协程在实例RPC工作线程的常驻事件循环中运行，不再为每次调用新建线程和事件循环
+        return manager.rpc.call("start_carla", manager.start_carla, map_name, quality)
     except Exception as e:
         return {"status": "error", "message": f"启动CARLA失败: {str(e)}"}
 
 
-def stop_carla() -> Dict:
+async def run_tool(op: str, fn, *args, timeout: float = None, cancel_event: threading.Event = None,
+                   **kwargs) -> Dict:
+    """
+    在有界线程池中执行阻塞的工具函数，供异步的MCP工具和HTTP端点调用
+
+    Args:
+        op: 操作名，用于查找 async.timeouts 中的超时配置
+        fn: 阻塞的工具函数
+        timeout: 显式超时（秒），覆盖配置
+
+    Returns:
+        工具函数的结果；超时时返回错误字典（支持取消的操作会通过cancel_event停止）
+
+    Examples:
+        await run_tool("clear_traffic", clear_traffic, "fast")
+    """
+    try:
+        return await runner.call(op, fn, *args, timeout=timeout, cancel_event=cancel_event, **kwargs)
+    except asyncio.TimeoutError:
+        return {
+            "status": "error",
+            "timeout": True,
+            "message": f"{op} 超时（{runner.timeout_for(op, timeout)}秒），操作可能仍在后台继续执行"
+        }
+
+
+def stop_carla(instance: str = None) -> Dict:
     """
     停止CARLA仿真器
 
+    Args:
+        instance: CARLA实例ID，不指定时使用默认实例
+
     Returns:
         包含停止状态信息的字典
 
@@ -63,12 +188,15 @@ def stop_carla() -> Dict:
         关闭CARLA: stop_carla()
     """
     try:
-        return carla_manager.stop_carla()
+        manager = registry.get(instance)
+        return manager.rpc.call("stop_carla", manager.stop_carla)
     except Exception as e:
         return {"status": "error", "message": f"停止CARLA失败: {str(e)}"}
 
 
-def generate_traffic(num_vehicles: int = 30, num_walkers: int = 10, danger: bool = False) -> Dict:
+def generate_traffic(num_vehicles: int = 30, num_walkers: int = 10, danger: bool = False,
+                     chunk_size: int = None, progress_callback=None, cancel_event=None,
+                     instance: str = None) -> Dict:
     """
     生成自动驾驶交通流
 
@@ -76,6 +204,10 @@ def generate_traffic(num_vehicles: int = 30, num_walkers: int = 10, danger: bool
         num_vehicles: 车辆数量 (默认30辆)
         num_walkers: 行人数量 (默认10个)
         danger: 是否启用危险驾驶模式 (默认False)
+        chunk_size: 分块大小，0表示一次性生成 (默认使用配置 traffic.spawn_chunk_size)
+        progress_callback: 每块完成后的回调 progress_callback(已处理数, 总数)
+        cancel_event: threading.Event，置位后在下一块之前停止并返回部分结果
+        instance: CARLA实例ID，不指定时使用默认实例
 
     Returns:
         包含生成结果的字典
@@ -84,36 +216,199 @@ def generate_traffic(num_vehicles: int = 30, num_walkers: int = 10, danger: bool
         生成默认交通: generate_traffic()
         生成50辆车和20个行人: generate_traffic(50, 20)
         生成危险驾驶交通: generate_traffic(30, 10, True)
+        每50个一块生成1000辆车: generate_traffic(1000, 0, False, 50)
     """
     try:
-        # 确保CARLA已连接
-        if not carla_manager.is_connected():
-            connect_result = carla_manager.connect_to_carla()
-            if connect_result.get("status") != "success":
-                return connect_result
-
-        return carla_manager.generate_traffic(num_vehicles, num_walkers, danger)
+        manager = registry.get(instance)
+        # 确保CARLA已连接，连接和生成都在实例的RPC工作线程中执行
+        return manager.rpc.call(
+            "generate_traffic", _with_connection(manager, manager.generate_traffic),
+            num_vehicles, num_walkers, danger, chunk_size, progress_callback, cancel_event
+        )
     except Exception as e:
         return {"status": "error", "message": f"生成交通失败: {str(e)}"}
 
 
-def clear_traffic() -> Dict:
+async def generate_traffic_streaming(num_vehicles: int = 30, num_walkers: int = 10, danger: bool = False,
+                                     chunk_size: int = None, report_progress=None,
+                                     instance: str = None) -> Dict:
+    """
+    分块生成交通流，并在每块完成后异步上报进度
+
+    Args:
+        report_progress: 异步回调 report_progress(已处理数, 总数)，例如 MCP Context.report_progress
+        instance: CARLA实例ID，不指定时使用默认实例
+
+    Returns:
+        包含生成结果的字典；被 cancel_traffic_generation() 取消时返回部分结果
+
+    Examples:
+        await generate_traffic_streaming(1000, 0, False, 50, ctx.report_progress)
+    """
+    loop = asyncio.get_running_loop()
+    cancel_event = threading.Event()
+    _active_spawn_cancels[cancel_event] = registry.resolve_id(instance)
+
+    def on_progress(done: int, total: int):
+        # 在工作线程中被调用，把进度通知投递回事件循环
+        if report_progress:
+            asyncio.run_coroutine_threadsafe(report_progress(done, total), loop)
+
+    try:
+        # 超时或客户端取消请求时 runner 会置位 cancel_event，工作线程在下一块之前停止
+        return await run_tool(
+            "generate_traffic", generate_traffic, num_vehicles, num_walkers, danger, chunk_size,
+            on_progress, cancel_event, instance, cancel_event=cancel_event
+        )
+    finally:
+        _active_spawn_cancels.pop(cancel_event, None)
+
+
+def generate_density_traffic(vehicles_per_km: float = 10.0, road_counts: Dict = None,
+                             danger: bool = False, seed: int = None, instance: str = None) -> Dict:
+    """
+    按道路长度加权的密度生成车辆（用于可复现的吞吐量测试）
+
+    Args:
+        vehicles_per_km: 目标密度，每公里车道的车辆数 (默认10)
+        road_counts: 按道路指定数量 {road_id: 数量}，指定时优先于密度
+        danger: 是否启用危险驾驶模式 (默认False)
+        seed: 随机种子，相同地图和种子得到相同分布
+        instance: CARLA实例ID，不指定时使用默认实例
+
+    Returns:
+        包含生成结果和实际密度的字典
+
+    Examples:
+        每公里20辆车: generate_density_traffic(20)
+        可复现分布: generate_density_traffic(15, seed=42)
+        指定道路: generate_density_traffic(road_counts={"12": 5, "37": 10})
+    """
+    try:
+        manager = registry.get(instance)
+        if road_counts:
+            road_counts = {int(road_id): int(count) for road_id, count in road_counts.items()}
+        return manager.rpc.call(
+            "generate_density_traffic", _with_connection(manager, manager.generate_density_traffic),
+            vehicles_per_km, road_counts, danger, seed
+        )
+    except Exception as e:
+        return {"status": "error", "message": f"按密度生成交通失败: {str(e)}"}
+
+
+def cancel_traffic_generation(instance: str = None) -> Dict:
+    """
+    取消正在进行的分块交通生成（已生成的车辆和行人保留）
+
+    Args:
+        instance: CARLA实例ID，不指定时使用默认实例
+
+    Returns:
+        包含取消结果的字典
+
+    Examples:
+        取消生成: cancel_traffic_generation()
+    """
+    pending = [event for event, instance_id in list(_active_spawn_cancels.items())
+               if instance is None or instance_id == instance]
+    for cancel_event in pending:
+        cancel_event.set()
+    return {
+        "status": "success",
+        "cancelled_jobs": len(pending),
+        "message": f"已请求取消 {len(pending)} 个交通生成任务" if pending else "没有正在进行的交通生成任务"
+    }
+
+
+def clear_traffic(profile: str = None, sweep_orphans: bool = False, role_name: str = None,
+                  background: bool = False, instance: str = None) -> Dict:
     """
     清除所有交通参与者（车辆和行人）
 
+    Args:
+        profile: 清除档位 (conservative, balanced, fast)，默认使用配置文件中的 clear.profile
+        sweep_orphans: 是否同时清扫世界中不在本地记录里的车辆/行人（默认False）
+        role_name: 清扫时只匹配该 role_name 的actor（例如 "autopilot"）
+        background: 是否在后台执行并立即返回任务ID（默认False）
+        instance: CARLA实例ID，不指定时使用默认实例
+
     Returns:
-        包含清除结果的字典
+        包含清除结果和各阶段耗时的字典；后台模式下返回任务ID
 
     Examples:
         清空所有车辆和行人: clear_traffic()
+        快速清空: clear_traffic("fast")
+        MCP重启后清空残留车辆: clear_traffic(sweep_orphans=True)
+        后台清空: clear_traffic(background=True)
     """
     try:
-        return carla_manager.clear_all_traffic()
+        manager = registry.get(instance)
+        # 清扫模式在MCP进程重启后也应可用，必要时先连接
+        clear = _with_connection(manager, manager.clear_all_traffic) if sweep_orphans else manager.clear_all_traffic
+
+        if background:
+            params = {"profile": profile, "sweep_orphans": sweep_orphans, "role_name": role_name,
+                      "instance": manager.instance_id}
+            job = clear_jobs.submit(
+                lambda progress: manager.rpc.call(
+                    "clear_traffic", clear, profile, sweep_orphans, role_name, progress_callback=progress
+                ),
+                params,
+                key=manager.instance_id
+            )
+            return {
+                "status": "accepted",
+                "job_id": job.id,
+                "job": job.to_dict(),
+                "message": f"清除任务已在后台执行，使用 get_clear_job_progress('{job.id}') 查询进度"
+            }
+
+        return manager.rpc.call("clear_traffic", clear, profile, sweep_orphans, role_name)
     except Exception as e:
         return {"status": "error", "message": f"清除交通失败: {str(e)}"}
 
 
-def set_weather(weather: str = "ClearNoon") -> Dict:
+def soft_reset_traffic(instance: str = None) -> Dict:
+    """
+    软重置交通：车辆和行人不销毁，而是停放到保留区域，下次生成交通时直接复用
+
+    Args:
+        instance: CARLA实例ID，不指定时使用默认实例
+
+    Returns:
+        包含停放数量、被淘汰销毁的数量和回收池状态的字典
+
+    Examples:
+        场景之间快速重置: soft_reset_traffic()
+    """
+    try:
+        manager = registry.get(instance)
+        return manager.rpc.call("soft_reset", manager.soft_reset)
+    except Exception as e:
+        return {"status": "error", "message": f"软重置失败: {str(e)}"}
+
+
+def get_clear_job_status(job_id: str = None) -> Dict:
+    """
+    查询后台清除任务的进度
+
+    Args:
+        job_id: 任务ID，不指定时返回最近的任务
+
+    Returns:
+        包含当前阶段、已清除数量和各阶段耗时的字典
+
+    Examples:
+        查询最近的清除任务: get_clear_job_status()
+        查询指定任务: get_clear_job_status("3f2a9c1b7d4e")
+    """
+    job = clear_jobs.get(job_id)
+    if job is None:
+        return {"status": "error", "message": f"未找到清除任务: {job_id}" if job_id else "没有清除任务"}
+    return {"status": "success", "job": job.to_dict()}
+
+
+def set_weather(weather: str = "ClearNoon", instance: str = None) -> Dict:
     """
     设置天气条件
 
@@ -121,6 +416,7 @@ def set_weather(weather: str = "ClearNoon") -> Dict:
         weather: 天气预设名称
                 可选值: ClearNoon, CloudyNoon, WetNoon, HardRainNoon,
                        ClearSunset, CloudySunset, WetSunset, HardRainSunset
+        instance: CARLA实例ID，不指定时使用默认实例
 
     Returns:
         包含设置结果的字典
@@ -131,35 +427,52 @@ def set_weather(weather: str = "ClearNoon") -> Dict:
         设置日落: set_weather("ClearSunset")
     """
     try:
-        return carla_manager.set_weather(weather)
+        manager = registry.get(instance)
+        return manager.rpc.call("set_weather", manager.set_weather, weather)
     except Exception as e:
         return {"status": "error", "message": f"设置天气失败: {str(e)}"}
 
 
-def get_status() -> Dict:
+def get_status(instance: str = None, fresh: bool = False) -> Dict:
     """
-    获取CARLA仿真器当前状态
+    获取CARLA仿真器当前状态（默认返回后台按TTL刷新的状态快照，不直接访问仿真器）
+
+    Args:
+        instance: CARLA实例ID，不指定时使用默认实例
+        fresh: 为True时同步刷新快照后返回
 
     Returns:
-        包含详细状态信息的字典
+        包含详细状态信息的字典，snapshot 字段为快照的版本号、ETag和年龄（秒）
 
     Examples:
         查看状态: get_status()
-        检查是否在运行: get_status()
+        强制刷新: get_status(fresh=True)
     """
     try:
-        return carla_manager.get_status()
+        manager = registry.get(instance)
+        cached = manager.status_cache.get(fresh)
+        result = cached["result"]
+        if result.get("status") == "success":
+            result["data"]["async_runner"] = runner.info()
+        result["snapshot"] = {
+            "version": cached["version"],
+            "etag": cached["etag"],
+            "age": cached["age"],
+            "fresh": cached["fresh"],
+        }
+        return result
     except Exception as e:
         return {"status": "error", "message": f"获取状态失败: {str(e)}"}
 
 
-def spawn_vehicles(count: int = 10, vehicle_type: str = "random") -> Dict:
+def spawn_vehicles(count: int = 10, vehicle_type: str = "random", instance: str = None) -> Dict:
     """
     快速生成车辆（仅车辆，不包含行人）
 
     Args:
         count: 车辆数量
         vehicle_type: 车辆类型 (当前仅支持"random")
+        instance: CARLA实例ID，不指定时使用默认实例
 
     Returns:
         包含生成结果的字典
@@ -169,17 +482,22 @@ def spawn_vehicles(count: int = 10, vehicle_type: str = "random") -> Dict:
         生成50辆车: spawn_vehicles(50)
     """
     try:
-        return carla_manager.generate_traffic(count, 0, False)
+        manager = registry.get(instance)
+        return manager.rpc.call(
+            "spawn_vehicles", lambda total: manager.generate_traffic(total, 0, False), count,
+            merge=_spawn_merge("spawn_vehicles", "vehicle")
+        )
     except Exception as e:
         return {"status": "error", "message": f"生成车辆失败: {str(e)}"}
 
 
-def spawn_pedestrians(count: int = 10) -> Dict:
+def spawn_pedestrians(count: int = 10, instance: str = None) -> Dict:
     """
     快速生成行人（仅行人，不包含车辆）
 
     Args:
         count: 行人数量
+        instance: CARLA实例ID，不指定时使用默认实例
 
     Returns:
         包含生成结果的字典
@@ -189,23 +507,34 @@ def spawn_pedestrians(count: int = 10) -> Dict:
         生成20个行人: spawn_pedestrians(20)
     """
     try:
-        return carla_manager.generate_traffic(0, count, False)
+        manager = registry.get(instance)
+        return manager.rpc.call(
+            "spawn_pedestrians", lambda total: manager.generate_traffic(0, total, False), count,
+            merge=_spawn_merge("spawn_pedestrians", "walker")
+        )
     except Exception as e:
         return {"status": "error", "message": f"生成行人失败: {str(e)}"}
 
 
-def is_running() -> Dict:
+def is_running(full_scan: bool = False, instance: str = None) -> Dict:
     """
     检查CARLA是否正在运行
 
+    Args:
+        full_scan: 是否强制遍历主机上的全部进程（默认只检查已知的CARLA进程）
+        instance: CARLA实例ID，不指定时使用默认实例
+
     Returns:
         包含运行状态的字典
 
     Examples:
         检查是否运行: is_running()
+        重新扫描所有进程: is_running(full_scan=True)
     """
     try:
-        running = carla_manager.is_carla_running()
+        manager = registry.get(instance)
+        # 只检查进程/租用状态，不访问仿真器，因此不经过RPC工作线程（不会排在长时间的写操作之后）
+        running = manager.is_carla_running(full_scan)
         return {
             "status": "success",
             "running": running,
@@ -215,6 +544,85 @@ def is_running() -> Dict:
         return {"status": "error", "message": f"检查状态失败: {str(e)}"}
 
 
+def get_server_output(lines: int = 50, stream: str = None, instance: str = None) -> Dict:
+    """
+    获取CARLA服务器进程最近的输出和最近一次启动的时间线
+
+    Args:
+        lines: 返回的最大行数 (默认50)
+        stream: 只返回 "stdout" 或 "stderr"，默认两者都返回
+        instance: CARLA实例ID，不指定时使用默认实例
+
+    Returns:
+        包含输出行、缓冲区状态和启动时间线的字典
+
+    Examples:
+        查看启动日志: get_server_output()
+        只看错误输出: get_server_output(100, "stderr")
+    """
+    try:
+        return registry.get(instance).get_server_output(lines, stream)
+    except Exception as e:
+        return {"status": "error", "message": f"获取服务器输出失败: {str(e)}"}
+
+
+def get_slow_calls(limit: int = 20, tool: str = None, clear: bool = False) -> Dict:
+    """
+    查询最近的慢工具调用（超过 tracing.slow_threshold 的调用）
+
+    Args:
+        limit: 最多返回的条数
+        tool: 只返回指定工具的调用
+        clear: 返回后清空慢调用存储
+
+    Returns:
+        包含慢调用列表（墙钟耗时、RPC排队/执行时间、Python时间、参数/结果大小）的字典
+
+    Examples:
+        查看慢调用: get_slow_calls()
+        只看清除操作: get_slow_calls(tool="remove_all_traffic")
+    """
+    calls = tracer.slow_calls(limit, tool)
+    if clear:
+        tracer.clear()
+    return {"status": "success", "tracing": tracer.info(), "slow_calls": calls}
+
+
+def list_instances() -> Dict:
+    """
+    列出所有CARLA实例
+
+    Returns:
+        包含各实例端口、连接状态和actor数量的字典
+
+    Examples:
+        查看实例: list_instances()
+    """
+    return {"status": "success", "per_session": registry.per_session, "instances": registry.list()}
+
+
+def remove_instance(instance: str) -> Dict:
+    """
+    停止并移除一个CARLA实例（默认实例不能移除）
+
+    Args:
+        instance: CARLA实例ID
+
+    Returns:
+        包含停止结果的字典
+
+    Examples:
+        移除实例: remove_instance("worker-2")
+    """
+    manager = registry.find(instance)
+    if manager is None or instance == registry.DEFAULT_ID:
+        return {"status": "error", "message": f"无法移除实例: {instance}"}
+
+    registry.remove(instance)
+    result = manager.shutdown()
+    return {"status": "removed", "instance": instance, "stop_result": result}
+
+
 # 为了向后兼容，提供一些别名
 restart_carla = lambda: stop_carla() if carla_manager.is_carla_running() else start_carla()
 get_carla_status = get_status
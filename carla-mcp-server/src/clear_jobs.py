@@ -0,0 +1,126 @@
+"""
+Clear Jobs - 后台清除任务
+清除交通可能耗时较长（分批销毁、冷却、健康探针），后台模式下立即返回任务ID，
+由单独的工作线程执行清除流程，并记录当前阶段、已销毁数量和各阶段耗时供查询
+"""
+
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+
+
+class ClearJob:
+    """单个后台清除任务的状态"""
+
+    def __init__(self, params: Dict = None, key: str = None):
+        self.id = uuid.uuid4().hex[:12]
+        self.params = params or {}
+        self.key = key
+        self.status = "pending"  # pending / running / completed / failed
+        self.current_phase: Optional[str] = None
+        self.phase_timings: Dict[str, float] = {}
+        self.cleared: Dict[str, int] = {}
+        self.result: Optional[Dict] = None
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def update(self, phase: str, phase_timings: Dict[str, float], cleared: Dict[str, int]):
+        """清除流程的进度回调"""
+        with self._lock:
+            self.current_phase = phase
+            self.phase_timings = dict(phase_timings)
+            self.cleared = dict(cleared)
+
+    def to_dict(self) -> Dict:
+        with self._lock:
+            now = time.time()
+            end = self.finished_at or now
+            data = {
+                "job_id": self.id,
+                "status": self.status,
+                "params": self.params,
+                "current_phase": self.current_phase,
+                "cleared": dict(self.cleared),
+                "phase_timings": dict(self.phase_timings),
+                "elapsed": round(end - self.started_at, 3) if self.started_at else 0.0,
+                "queued": round((self.started_at or now) - self.created_at, 3),
+            }
+            if self.result is not None:
+                data["result"] = self.result
+            if self.error is not None:
+                data["error"] = self.error
+            return data
+
+
+class ClearJobManager:
+    """后台清除任务管理器 - 同一个key（CARLA实例）的任务顺序执行，保留最近的任务记录"""
+
+    def __init__(self, max_history: int = 20, max_workers: int = 4):
+        self.max_history = max_history
+        self._jobs: "OrderedDict[str, ClearJob]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="clear-job")
+        self.logger = logging.getLogger(__name__)
+
+    def _active_locked(self, key: str = None) -> Optional[ClearJob]:
+        for job in self._jobs.values():
+            if job.key == key and job.status in ("pending", "running"):
+                return job
+        return None
+
+    def active_job(self, key: str = None) -> Optional[ClearJob]:
+        """返回正在排队或执行的任务"""
+        with self._lock:
+            return self._active_locked(key)
+
+    def submit(self, run: Callable[[Callable], Dict], params: Dict = None, key: str = None) -> ClearJob:
+        """提交清除任务；run(progress_callback) 执行实际的清除流程并返回结果
+
+        同一个key已有任务在排队或执行时直接返回该任务，避免重复清除。
+        """
+        with self._lock:
+            active = self._active_locked(key)
+            if active is not None:
+                return active
+
+            job = ClearJob(params, key)
+            self._jobs[job.id] = job
+            while len(self._jobs) > self.max_history:
+                self._jobs.popitem(last=False)
+
+        self._executor.submit(self._run, job, run)
+        return job
+
+    def _run(self, job: ClearJob, run: Callable[[Callable], Dict]):
+        job.status = "running"
+        job.started_at = time.time()
+        try:
+            result = run(job.update)
+            job.result = result
+            job.status = "failed" if result.get("status") == "error" else "completed"
+        except Exception as e:
+            self.logger.error(f"Clear job {job.id} failed: {e}", exc_info=True)
+            job.error = str(e)
+            job.status = "failed"
+        finally:
+            job.finished_at = time.time()
+            job.current_phase = None
+
+    def get(self, job_id: str = None) -> Optional[ClearJob]:
+        """按ID获取任务；不指定ID时返回最近的任务"""
+        with self._lock:
+            if job_id is None:
+                return next(reversed(self._jobs.values()), None)
+            return self._jobs.get(job_id)
+
+    def list(self) -> list:
+        with self._lock:
+            jobs = list(self._jobs.values())
+        return [job.to_dict() for job in jobs]
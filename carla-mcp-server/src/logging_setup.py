@@ -0,0 +1,180 @@
+"""
+Logging Setup - 非阻塞日志管道
+所有日志记录先放入队列（QueueHandler），由后台 QueueListener 线程写入控制台和文件，
+磁盘I/O不再落在清除/生成循环的热路径上；日志文件按大小和时间间隔轮转。
+日志级别来自 carla_config.yaml 的 logging.level，环境变量 CARLA_MCP_LOG_LEVEL 优先。
+逐个actor的调试日志通过 LogSampler 采样，高负载时只保留前若干条和按比例抽样的记录
+"""
+
+import atexit
+import logging
+import os
+import queue
+import sys
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Dict, Optional
+
+LOG_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+LEVEL_ENV = "CARLA_MCP_LOG_LEVEL"
+
+
+class SizeAndTimeRotatingFileHandler(RotatingFileHandler):
+    """超过 max_bytes 或距上次轮转超过 rotate_interval 秒时轮转（编号备份 .1 .2 ...）"""
+
+    def __init__(self, filename: str, max_bytes: int = 0, backup_count: int = 5,
+                 rotate_interval: float = 0, encoding: str = "utf-8"):
+        super().__init__(filename, maxBytes=max_bytes, backupCount=backup_count, encoding=encoding, delay=True)
+        self.rotate_interval = rotate_interval
+        self._next_rollover = time.time() + rotate_interval if rotate_interval else None
+
+    def shouldRollover(self, record) -> bool:
+        if self._next_rollover is not None and time.time() >= self._next_rollover:
+            # 空文件不轮转，只顺延下次轮转时间
+            if self.stream is None or self.stream.tell() == 0:
+                self._next_rollover = time.time() + self.rotate_interval
+                return False
+            return True
+        return bool(super().shouldRollover(record))
+
+    def doRollover(self):
+        super().doRollover()
+        if self.rotate_interval:
+            self._next_rollover = time.time() + self.rotate_interval
+
+
+class DroppingQueueHandler(QueueHandler):
+    """队列满时丢弃记录并计数，而不是阻塞调用方"""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class LogSampler:
+    """按key采样的高频日志
+
+    每个时间窗口内，同一key的前 burst 条全部放行，之后每 every 条放行一条；
+    窗口结束时把被丢弃的数量汇总记录一次。
+    """
+
+    def __init__(self, logger: logging.Logger, burst: int = 20, every: int = 100, window: float = 1.0):
+        self.logger = logger
+        self.burst = burst
+        self.every = max(every, 1)
+        self.window = window
+        self._counts: Dict[str, list] = {}  # key -> [窗口开始时间, 本窗口计数, 本窗口丢弃数]
+        self._lock = threading.Lock()
+        self.suppressed = 0
+
+    @classmethod
+    def from_config(cls, logger: logging.Logger, config: Dict) -> "LogSampler":
+        sampling = config.get("logging", {}).get("actor_sampling", {})
+        return cls(
+            logger,
+            burst=sampling.get("burst", 20),
+            every=sampling.get("every", 100),
+            window=sampling.get("window", 1.0)
+        )
+
+    def allow(self, key: str) -> bool:
+        now = time.monotonic()
+        summary = None
+        with self._lock:
+            state = self._counts.get(key)
+            if state is None or now - state[0] >= self.window:
+                if state is not None and state[2]:
+                    summary = state[2]
+                state = self._counts[key] = [now, 0, 0]
+            state[1] += 1
+            allowed = state[1] <= self.burst or (state[1] - self.burst) % self.every == 0
+            if not allowed:
+                state[2] += 1
+                self.suppressed += 1
+        if summary:
+            self.logger.debug(f"上一采样窗口丢弃了 {summary} 条 '{key}' 日志")
+        return allowed
+
+    def debug(self, key: str, message: str, *args):
+        """DEBUG级别启用且通过采样时才格式化并记录"""
+        if self.logger.isEnabledFor(logging.DEBUG) and self.allow(key):
+            self.logger.debug(message, *args)
+
+
+_listener: Optional[QueueListener] = None
+_queue_handler: Optional[DroppingQueueHandler] = None
+
+
+def resolve_level(config: Dict) -> int:
+    """环境变量 CARLA_MCP_LOG_LEVEL 优先，其次 logging.level，默认 INFO"""
+    name = os.environ.get(LEVEL_ENV) or config.get("logging", {}).get("level", "INFO")
+    level = logging.getLevelName(str(name).upper())
+    return level if isinstance(level, int) else logging.INFO
+
+
+def setup_logging(config: Dict) -> QueueListener:
+    """根日志器只挂一个队列handler，控制台和轮转文件handler由后台线程驱动（重复调用会先停止旧的监听线程）"""
+    global _listener, _queue_handler
+    log_config = config.get("logging", {})
+    level = resolve_level(config)
+    formatter = logging.Formatter(log_config.get("format", LOG_FORMAT))
+
+    handlers = []
+    console = logging.StreamHandler(sys.stderr)
+    console.setFormatter(formatter)
+    handlers.append(console)
+
+    log_file = log_config.get("file", "carla_mcp_debug.log")
+    if log_file:
+        directory = os.path.dirname(log_file)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        file_handler = SizeAndTimeRotatingFileHandler(
+            log_file,
+            max_bytes=log_config.get("max_bytes", 10 * 1024 * 1024),
+            backup_count=log_config.get("backup_count", 5),
+            rotate_interval=log_config.get("rotate_interval", 86400)
+        )
+        file_handler.setFormatter(formatter)
+        handlers.append(file_handler)
+
+    shutdown_logging()
+
+    log_queue = queue.Queue(maxsize=log_config.get("queue_size", 10000))
+    _queue_handler = DroppingQueueHandler(log_queue)
+    _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(_queue_handler)
+    root.setLevel(level)
+
+    for name, logger_level in (log_config.get("loggers") or {}).items():
+        logging.getLogger(name).setLevel(str(logger_level).upper())
+
+    _listener.start()
+    return _listener
+
+
+def shutdown_logging():
+    """停止后台监听线程（会先写完队列中剩余的记录）"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(shutdown_logging)
+
+
+def dropped_records() -> int:
+    """因队列已满被丢弃的日志条数"""
+    return _queue_handler.dropped if _queue_handler else 0
@@ -0,0 +1,194 @@
+"""
+Manager Registry - 多CARLA实例管理
+按实例ID（显式指定或MCP会话ID）维护独立的 CarlaManager，每个实例有自己的
+client / world / TrafficManager端口和actor记录，使一个MCP服务器可以同时驱动多个CARLA服务器；
+所有实例共享同一个预启动服务器池。
+按会话ID自动创建的实例空闲超过 instances.idle_timeout 秒后被回收：
+停止服务器（池服务器只归还）、RPC工作线程和状态刷新线程
+"""
+
+import logging
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from carla_manager import CarlaManager
+from server_pool import CarlaServerPool
+
+
+class ManagerRegistry:
+    """CarlaManager 注册表"""
+
+    DEFAULT_ID = "default"
+
+    def __init__(self, config_path: str = None):
+        self._config_path = config_path
+        self._managers: Dict[str, CarlaManager] = {}
+        self._lock = threading.Lock()
+        self.logger = logging.getLogger(__name__)
+
+        default = CarlaManager(config_path, instance_id=self.DEFAULT_ID)
+        self.config = default.config
+
+        instances_config = self.config.get("instances", {})
+        # per_session 为 true 时，未指定实例的会话各自使用以会话ID命名的实例
+        self.per_session = instances_config.get("per_session", False)
+        self.max_instances = instances_config.get("max_instances", 8)
+        self.port_step = instances_config.get("port_step", 3)
+        self._static_ports: Dict[str, Dict] = instances_config.get("ports") or {}
+        # 会话实例的空闲回收（秒，0表示不回收）；显式指定ID的实例只能通过 remove_instance 移除
+        self.idle_timeout = instances_config.get("idle_timeout", 1800)
+        self._session_instances: set = set()
+        self._last_used: Dict[str, float] = {}
+        self._sweeper: Optional[threading.Thread] = None
+        self.evicted = 0
+
+        # 预启动服务器池（server_pool.enabled 为 true 时启用，由各实例的 start_carla 租用）
+        self.server_pool = CarlaServerPool(
+            self.config,
+            command_builder=default.build_server_command,
+            reset_fn=default.reset_pooled_server
+        )
+        default.server_pool = self.server_pool
+        self._managers[self.DEFAULT_ID] = default
+
+    def resolve_id(self, instance: str = None, session_id: str = None) -> str:
+        """显式实例ID优先；否则按配置使用会话ID或默认实例"""
+        if instance:
+            return instance
+        if self.per_session and session_id:
+            return session_id
+        return self.DEFAULT_ID
+
+    def get(self, instance: str = None, session_id: str = None) -> CarlaManager:
+        """获取实例，不存在时创建（达到上限时先回收空闲的会话实例）"""
+        instance_id = self.resolve_id(instance, session_id)
+        evicted: List[CarlaManager] = []
+        try:
+            with self._lock:
+                manager = self._managers.get(instance_id)
+                if manager is None:
+                    if len(self._managers) >= self.max_instances:
+                        evicted = self._pop_idle_locked()
+                    if len(self._managers) >= self.max_instances:
+                        raise RuntimeError(f"CARLA实例数量已达上限 ({self.max_instances})")
+                    port, tm_port = self._allocate_ports_locked(instance_id)
+                    manager = CarlaManager(
+                        self._config_path, instance_id=instance_id, port=port, tm_port=tm_port,
+                        server_pool=self.server_pool
+                    )
+                    self._managers[instance_id] = manager
+                    if not instance and instance_id == session_id:
+                        self._session_instances.add(instance_id)
+                        self._start_sweeper_locked()
+                    self.logger.info(f"Created CARLA instance '{instance_id}' (port {port}, tm_port {tm_port})")
+                self._last_used[instance_id] = time.monotonic()
+                return manager
+        finally:
+            if evicted:
+                self._shutdown_async(evicted)
+
+    def _pop_idle_locked(self) -> List[CarlaManager]:
+        """移出空闲超时的会话实例（调用方持有锁，停止操作在锁外进行）"""
+        if not self.idle_timeout:
+            return []
+        now = time.monotonic()
+        idle = [
+            instance_id for instance_id in self._session_instances
+            if now - self._last_used.get(instance_id, now) > self.idle_timeout
+        ]
+        evicted = []
+        for instance_id in idle:
+            self._session_instances.discard(instance_id)
+            self._last_used.pop(instance_id, None)
+            manager = self._managers.pop(instance_id, None)
+            if manager is not None:
+                evicted.append(manager)
+        return evicted
+
+    def _shutdown_async(self, managers: List[CarlaManager]):
+        """在后台线程中停止被回收的实例（停止服务器可能耗时数秒）"""
+        self.evicted += len(managers)
+
+        def _shutdown():
+            for manager in managers:
+                self.logger.info(f"Evicting idle CARLA instance '{manager.instance_id}'")
+                manager.shutdown(timeout=self.config["carla"].get("shutdown_timeout", 15.0) + 30.0)
+
+        threading.Thread(target=_shutdown, name="carla-instance-evict", daemon=True).start()
+
+    def _start_sweeper_locked(self):
+        """有会话实例时启动定期回收线程（没有会话实例后自动退出）"""
+        if not self.idle_timeout or (self._sweeper and self._sweeper.is_alive()):
+            return
+
+        def _sweep():
+            interval = min(max(self.idle_timeout / 4, 1.0), 60.0)
+            while True:
+                time.sleep(interval)
+                with self._lock:
+                    evicted = self._pop_idle_locked()
+                    done = not self._session_instances
+                    if done:
+                        self._sweeper = None
+                if evicted:
+                    self._shutdown_async(evicted)
+                if done:
+                    return
+
+        self._sweeper = threading.Thread(target=_sweep, name="carla-instance-sweeper", daemon=True)
+        self._sweeper.start()
+
+    def _allocate_ports_locked(self, instance_id: str) -> Tuple[int, int]:
+        """instances.ports 中配置的端口优先，否则从默认端口起按 port_step 找一组未占用的端口"""
+        static = self._static_ports.get(instance_id)
+        if static:
+            port = static["port"]
+            return port, static.get("tm_port", port + 6000)
+
+        used_ports = {manager.port for manager in self._managers.values()}
+        used_ports.update(ports["port"] for ports in self._static_ports.values())
+        used_tm_ports = {manager.tm_port for manager in self._managers.values()}
+        port = self.config["carla"]["port"]
+        while port in used_ports:
+            port += self.port_step
+        tm_port = port + 6000
+        while tm_port in used_tm_ports:
+            tm_port += 1
+        return port, tm_port
+
+    def find(self, instance: str = None, session_id: str = None) -> Optional[CarlaManager]:
+        """获取已存在的实例，不创建"""
+        instance_id = self.resolve_id(instance, session_id)
+        with self._lock:
+            manager = self._managers.get(instance_id)
+            if manager is not None:
+                self._last_used[instance_id] = time.monotonic()
+            return manager
+
+    def remove(self, instance_id: str) -> Optional[CarlaManager]:
+        """移除实例（默认实例不能移除），由调用方负责先停止/归还服务器"""
+        if instance_id == self.DEFAULT_ID:
+            return None
+        with self._lock:
+            self._session_instances.discard(instance_id)
+            self._last_used.pop(instance_id, None)
+            return self._managers.pop(instance_id, None)
+
+    def managers(self) -> List[CarlaManager]:
+        with self._lock:
+            return list(self._managers.values())
+
+    def list(self) -> List[Dict]:
+        return [
+            {
+                "instance_id": manager.instance_id,
+                "port": manager.port,
+                "tm_port": manager.tm_port,
+                "connected": manager.is_connected(),
+                "pooled": manager.leased_server is not None,
+                "active_vehicles": len(manager.vehicles),
+                "active_walkers": len(manager.walkers),
+            }
+            for manager in self.managers()
+        ]
@@ -3,10 +3,12 @@ CARLA MCP Server - 主服务器入口
 通过MCP协议为LLM提供CARLA控制接口
 """
 
-import logging
+import json
 import sys
 import os
-from fastmcp import FastMCP
+import time
+from fastmcp import FastMCP, Context
+from fastmcp.server.middleware import Middleware
 
 # 添加当前目录到Python路径
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
@@ -14,57 +16,141 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 from carla_tools import (
     start_carla,
     stop_carla,
-    generate_traffic,
+    generate_traffic_streaming,
+    cancel_traffic_generation,
+    generate_density_traffic,
     clear_traffic,
+    get_clear_job_status,
+    soft_reset_traffic,
+    clear_jobs,
+    server_pool,
+    registry,
+    list_instances,
+    get_server_output,
+    get_slow_calls,
+    tracer,
+    run_tool,
+    remove_instance,
     set_weather,
     get_status,
     spawn_vehicles,
     spawn_pedestrians,
     is_running
 )
+from logging_setup import setup_logging
+from metrics import METRICS, TOOL_ERRORS, TOOL_LATENCY
+
+# 配置日志：队列 + 后台写入线程，文件按大小/时间轮转，级别来自 logging.level 或 CARLA_MCP_LOG_LEVEL
+setup_logging(registry.config)
+
+
+class ToolMetricsMiddleware(Middleware):
+    """记录每个工具调用的耗时直方图和错误数（抛出异常或返回 status=error）"""
+
+    async def on_call_tool(self, context, call_next):
+        tool = context.message.name
+        start = time.perf_counter()
+        try:
+            result = await call_next(context)
+        except Exception:
+            TOOL_ERRORS.inc(tool=tool)
+            raise
+        finally:
+            TOOL_LATENCY.observe(time.perf_counter() - start, tool=tool)
+
+        content = getattr(result, "structured_content", None)
+        if getattr(result, "is_error", False) or (isinstance(content, dict) and content.get("status") == "error"):
+            TOOL_ERRORS.inc(tool=tool)
+        return result
+
+
+def _payload_size(value) -> int:
+    """参数/结果序列化后的字节数"""
+    try:
+        return len(json.dumps(value, ensure_ascii=False, default=str).encode("utf-8"))
+    except (TypeError, ValueError):
+        return 0
+
+
+def _result_size(result) -> int:
+    content = getattr(result, "structured_content", None)
+    if content is not None:
+        return _payload_size(content)
+    return sum(len(getattr(block, "text", "") or "") for block in getattr(result, "content", None) or [])
+
+
+class ToolTracingMiddleware(Middleware):
+    """为每个工具调用生成追踪span：墙钟时间、CARLA RPC排队/执行时间、Python时间、参数和结果大小"""
+
+    async def on_call_tool(self, context, call_next):
+        arguments = context.message.arguments or {}
+        span, token = tracer.start(context.message.name, _payload_size(arguments), arguments.get("instance"))
+        if span is None:
+            return await call_next(context)
+
+        try:
+            result = await call_next(context)
+        except Exception as e:
+            tracer.finish(span, token, error=str(e))
+            raise
+
+        content = getattr(result, "structured_content", None)
+        error = content.get("message") if isinstance(content, dict) and content.get("status") == "error" else None
+        tracer.finish(span, token, _result_size(result), error)
+        return result
 
-# 配置日志
-logging.basicConfig(
-    level=logging.DEBUG,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('carla_mcp_debug.log', encoding='utf-8'),
-        logging.StreamHandler()
-    ]
-)
 
 # 创建MCP服务器实例
 mcp = FastMCP("CARLA MCP Server")
+mcp.add_middleware(ToolMetricsMiddleware())
+mcp.add_middleware(ToolTracingMiddleware())
+
+
+def _instance(instance: str = None, ctx: Context = None) -> str:
+    """显式实例ID优先；instances.per_session 启用时未指定实例的会话使用各自的实例"""
+    session_id = None
+    if ctx is not None and registry.per_session:
+        try:
+            session_id = ctx.session_id
+        except Exception:
+            session_id = None
+    return registry.resolve_id(instance, session_id)
 
 
 @mcp.tool
-def start_carla_simulator(map_name: str = "Town01", quality: str = "Low") -> dict:
+async def start_carla_simulator(map_name: str = "Town01", quality: str = "Low",
+                                instance: str = None, ctx: Context = None) -> dict:
     """
     启动CARLA仿真器
 
     Args:
         map_name: 地图名称，可选值: Town01, Town02, Town03, Town04, Town05, Town10HD
         quality: 图形质量，可选值: Low, Epic
+        instance: CARLA实例ID，不指定时使用默认实例（或按会话区分的实例）
 
     Returns:
         包含启动状态的字典
     """
-    return start_carla(map_name, quality)
+    return await run_tool("start_carla", start_carla, map_name, quality, _instance(instance, ctx))
 
 
 @mcp.tool
-def stop_carla_simulator() -> dict:
+async def stop_carla_simulator(instance: str = None, ctx: Context = None) -> dict:
     """
     停止CARLA仿真器
 
+    Args:
+        instance: CARLA实例ID，不指定时使用默认实例（或按会话区分的实例）
+
     Returns:
         包含停止状态的字典
     """
-    return stop_carla()
+    return await run_tool("stop_carla", stop_carla, _instance(instance, ctx))
 
 
 @mcp.tool
-def create_traffic_flow(num_vehicles: int = 30, num_walkers: int = 10, danger_mode: bool = False) -> dict:
+async def create_traffic_flow(num_vehicles: int = 30, num_walkers: int = 10, danger_mode: bool = False,
+                              chunk_size: int = None, instance: str = None, ctx: Context = None) -> dict:
     """
     生成自动驾驶交通流
 
@@ -72,130 +158,300 @@ def create_traffic_flow(num_vehicles: int = 30, num_walkers: int = 10, danger_mo
         num_vehicles: 车辆数量，默认30辆
         num_walkers: 行人数量，默认10个
         danger_mode: 是否启用危险驾驶模式，默认False
+        chunk_size: 分块大小，大于0时分块生成并在每块完成后发送进度通知，0表示一次性生成，
+                    默认使用配置 traffic.spawn_chunk_size
+        instance: CARLA实例ID，不指定时使用默认实例（或按会话区分的实例）
 
     Returns:
         包含交通生成结果的字典
     """
-    return generate_traffic(num_vehicles, num_walkers, danger_mode)
+    report_progress = None
+    if ctx is not None:
+        async def report_progress(done: int, total: int):
+            await ctx.report_progress(progress=done, total=total)
+
+    return await generate_traffic_streaming(
+        num_vehicles, num_walkers, danger_mode, chunk_size, report_progress, _instance(instance, ctx)
+    )
+
+
+@mcp.tool
+async def create_density_traffic(vehicles_per_km: float = 10.0, road_counts: dict = None,
+                                 danger_mode: bool = False, seed: int = None,
+                                 instance: str = None, ctx: Context = None) -> dict:
+    """
+    按道路长度加权的密度生成车辆，负载均匀且可复现
+
+    Args:
+        vehicles_per_km: 目标密度，每公里车道的车辆数，默认10
+        road_counts: 按道路指定数量，例如 {"12": 5, "37": 10}，指定时优先于密度
+        danger_mode: 是否启用危险驾驶模式，默认False
+        seed: 随机种子，相同地图和种子得到相同的生成分布
+        instance: CARLA实例ID，不指定时使用默认实例（或按会话区分的实例）
+
+    Returns:
+        包含车辆生成结果和实际密度的字典
+    """
+    return await run_tool(
+        "generate_traffic", generate_density_traffic,
+        vehicles_per_km, road_counts, danger_mode, seed, _instance(instance, ctx)
+    )
 
 
 @mcp.tool
-def remove_all_traffic() -> dict:
+def cancel_traffic_flow(instance: str = None, ctx: Context = None) -> dict:
+    """
+    取消正在进行的分块交通生成，已生成的车辆和行人保留
+
+    Args:
+        instance: CARLA实例ID，不指定时使用默认实例（或按会话区分的实例）
+
+    Returns:
+        包含取消结果的字典
+    """
+    return cancel_traffic_generation(_instance(instance, ctx))
+
+
+@mcp.tool
+async def remove_all_traffic(profile: str = None, sweep_orphans: bool = False, role_name: str = None,
+                             background: bool = False, instance: str = None, ctx: Context = None) -> dict:
     """
     清除所有交通参与者
 
+    Args:
+        profile: 清除档位，可选值: conservative（稳定优先）, balanced, fast（自适应批次，速度优先），
+                 默认使用配置文件中的设置
+        sweep_orphans: 是否同时清扫世界中未被记录的车辆和行人（MCP重启、其他客户端生成的），默认False
+        role_name: 清扫时只匹配该role_name的actor，例如 "autopilot"
+        background: 是否在后台执行，为True时立即返回任务ID，用 get_clear_job_progress 查询进度
+        instance: CARLA实例ID，不指定时使用默认实例（或按会话区分的实例）
+
     Returns:
-        包含清除结果的字典
+        包含清除结果、各阶段耗时以及已记录/孤儿actor清除数量的字典；后台模式下返回任务ID
     """
-    return clear_traffic()
+    return await run_tool(
+        "clear_traffic", clear_traffic, profile, sweep_orphans, role_name, background, _instance(instance, ctx)
+    )
 
 
 @mcp.tool
-def change_weather_condition(weather_preset: str = "ClearNoon") -> dict:
+async def reset_traffic_soft(instance: str = None, ctx: Context = None) -> dict:
+    """
+    软重置交通：把车辆和行人停放到保留区域而不销毁，下次创建交通时优先复用，
+    适合频繁重置场景。需要彻底清除时使用 remove_all_traffic
+
+    Args:
+        instance: CARLA实例ID，不指定时使用默认实例（或按会话区分的实例）
+
+    Returns:
+        包含停放数量和回收池状态的字典
+    """
+    return await run_tool("soft_reset", soft_reset_traffic, _instance(instance, ctx))
+
+
+@mcp.tool
+def get_carla_server_output(lines: int = 50, stream: str = None,
+                            instance: str = None, ctx: Context = None) -> dict:
+    """
+    查看CARLA服务器进程最近的输出（用于排查启动失败或崩溃）以及最近一次启动的时间线
+
+    Args:
+        lines: 返回的最大行数，默认50
+        stream: 只返回 "stdout" 或 "stderr"，默认两者都返回
+        instance: CARLA实例ID，不指定时使用默认实例（或按会话区分的实例）
+
+    Returns:
+        包含输出行和启动时间线（进程启动、端口可连接、客户端就绪、地图加载）的字典
+    """
+    return get_server_output(lines, stream, _instance(instance, ctx))
+
+
+@mcp.tool
+def get_slow_tool_calls(limit: int = 20, tool: str = None, clear: bool = False) -> dict:
+    """
+    查看最近的慢工具调用（诊断用）
+
+    Args:
+        limit: 最多返回的条数，默认20
+        tool: 只返回指定工具的调用，例如 "remove_all_traffic"
+        clear: 返回后清空慢调用记录
+
+    Returns:
+        每次慢调用的墙钟耗时、CARLA RPC排队/执行时间、Python时间以及参数/结果大小
+    """
+    return get_slow_calls(limit, tool, clear)
+
+
+@mcp.tool
+def list_carla_instances() -> dict:
+    """
+    列出本MCP服务器管理的所有CARLA实例
+
+    Returns:
+        包含各实例ID、端口、连接状态和actor数量的字典
+    """
+    return list_instances()
+
+
+@mcp.tool
+async def remove_carla_instance(instance: str) -> dict:
+    """
+    停止并移除一个CARLA实例（默认实例不能移除）
+
+    Args:
+        instance: CARLA实例ID
+
+    Returns:
+        包含停止结果的字典
+    """
+    return await run_tool("stop_carla", remove_instance, instance)
+
+
+@mcp.tool
+def get_clear_job_progress(job_id: str = None) -> dict:
+    """
+    查询后台清除任务的进度
+
+    Args:
+        job_id: 任务ID（remove_all_traffic 后台模式返回），不指定时返回最近的任务
+
+    Returns:
+        包含任务状态、当前阶段、已清除数量和各阶段耗时的字典
+    """
+    return get_clear_job_status(job_id)
+
+
+@mcp.tool
+async def change_weather_condition(weather_preset: str = "ClearNoon",
+                                   instance: str = None, ctx: Context = None) -> dict:
     """
     设置天气条件
 
     Args:
         weather_preset: 天气预设，可选值: ClearNoon, CloudyNoon, WetNoon,
                        HardRainNoon, ClearSunset, CloudySunset, WetSunset, HardRainSunset
+        instance: CARLA实例ID，不指定时使用默认实例（或按会话区分的实例）
 
     Returns:
         包含天气设置结果的字典
     """
-    return set_weather(weather_preset)
+    return await run_tool("set_weather", set_weather, weather_preset, _instance(instance, ctx))
+
+
+async def _status(instance: str = None, fresh: bool = False) -> dict:
+    """已有快照时直接返回缓存（只读内存，不占用线程池）；fresh=True 或还没有快照时经线程池同步刷新"""
+    manager = registry.find(instance)
+    if not fresh and manager is not None and manager.status_cache.has_snapshot:
+        return get_status(instance)
+    return await run_tool("get_status", get_status, instance, fresh)
 
 
 @mcp.tool
-def get_simulation_status() -> dict:
+async def get_simulation_status(instance: str = None, fresh: bool = False, ctx: Context = None) -> dict:
     """
-    获取CARLA仿真器状态信息
+    获取CARLA仿真器状态信息（默认返回后台定期刷新的状态快照）
+
+    Args:
+        instance: CARLA实例ID，不指定时使用默认实例（或按会话区分的实例）
+        fresh: 为True时先同步刷新状态再返回
 
     Returns:
         包含详细状态信息的字典
     """
-    return get_status()
+    return await _status(_instance(instance, ctx), fresh)
 
 
 @mcp.tool
-def add_vehicles(count: int = 10) -> dict:
+async def add_vehicles(count: int = 10, instance: str = None, ctx: Context = None) -> dict:
     """
     仅添加车辆（不包括行人）
 
     Args:
         count: 要添加的车辆数量
+        instance: CARLA实例ID，不指定时使用默认实例（或按会话区分的实例）
 
     Returns:
         包含车辆生成结果的字典
     """
-    return spawn_vehicles(count)
+    return await run_tool("generate_traffic", spawn_vehicles, count, "random", _instance(instance, ctx))
 
 
 @mcp.tool
-def add_pedestrians(count: int = 10) -> dict:
+async def add_pedestrians(count: int = 10, instance: str = None, ctx: Context = None) -> dict:
     """
     仅添加行人（不包括车辆）
 
     Args:
         count: 要添加的行人数量
+        instance: CARLA实例ID，不指定时使用默认实例（或按会话区分的实例）
 
     Returns:
         包含行人生成结果的字典
     """
-    return spawn_pedestrians(count)
+    return await run_tool("generate_traffic", spawn_pedestrians, count, _instance(instance, ctx))
 
 
 @mcp.tool
-def check_carla_running() -> dict:
+async def check_carla_running(full_scan: bool = False,
+                              instance: str = None, ctx: Context = None) -> dict:
     """
     检查CARLA是否正在运行
 
+    Args:
+        full_scan: 是否重新扫描主机上的全部进程，默认只检查已知的CARLA进程
+        instance: CARLA实例ID，不指定时使用默认实例（或按会话区分的实例）
+
     Returns:
         包含运行状态的字典
     """
-    return is_running()
+    if full_scan:
+        # 遍历全部进程可能较慢，放到线程池中执行
+        return await run_tool("get_status", is_running, full_scan, _instance(instance, ctx))
+    # 只检查已知PID/租用状态，直接执行，不与其他工具争用线程池
+    return is_running(False, _instance(instance, ctx))
 
 
 # 添加一些常用工具的别名，提供更自然的语言接口
 @mcp.tool
-def launch_carla(map_name: str = "Town01") -> dict:
+async def launch_carla(map_name: str = "Town01") -> dict:
     """启动CARLA (start_carla_simulator的别名)"""
-    return start_carla_simulator(map_name)
+    return await start_carla_simulator(map_name)
 
 
 @mcp.tool
-def shutdown_carla() -> dict:
+async def shutdown_carla() -> dict:
     """关闭CARLA (stop_carla_simulator的别名)"""
-    return stop_carla_simulator()
+    return await stop_carla_simulator()
 
 
 @mcp.tool
-def spawn_traffic(vehicles: int = 30, pedestrians: int = 10) -> dict:
+async def spawn_traffic(vehicles: int = 30, pedestrians: int = 10) -> dict:
     """生成交通 (create_traffic_flow的别名)"""
-    return create_traffic_flow(vehicles, pedestrians)
+    return await create_traffic_flow(vehicles, pedestrians)
 
 
 @mcp.tool
-def clear_all_actors() -> dict:
+async def clear_all_actors() -> dict:
     """清空所有actors (remove_all_traffic的别名)"""
-    return remove_all_traffic()
+    return await remove_all_traffic()
 
 
 @mcp.tool
-def set_weather_to_rain() -> dict:
+async def set_weather_to_rain() -> dict:
     """设置为雨天"""
-    return change_weather_condition("HardRainNoon")
+    return await change_weather_condition("HardRainNoon")
 
 
 @mcp.tool
-def set_weather_to_clear() -> dict:
+async def set_weather_to_clear() -> dict:
     """设置为晴天"""
-    return change_weather_condition("ClearNoon")
+    return await change_weather_condition("ClearNoon")
 
 
 @mcp.tool
-def set_weather_to_sunset() -> dict:
+async def set_weather_to_sunset() -> dict:
     """设置为日落"""
-    return change_weather_condition("ClearSunset")
+    return await change_weather_condition("ClearSunset")
 
 
 # 自定义健康检查路由
@@ -205,7 +461,7 @@ async def health_check(request):
     from starlette.responses import PlainTextResponse
 
     try:
-        # 检查CARLA管理器状态
+        # 检查CARLA管理器状态（只检查进程/租用状态，直接执行，线程池被占满时健康检查也能及时返回）
         status = is_running()
         if status.get("status") == "success":
             return PlainTextResponse("OK - CARLA MCP Server is running")
@@ -217,16 +473,49 @@ async def health_check(request):
 
 @mcp.custom_route("/status", methods=["GET"])
 async def status_endpoint(request):
-    """状态查询端点"""
-    from starlette.responses import JSONResponse
+    """状态查询端点
+
+    返回缓存的状态快照；?fresh=1 强制同步刷新；响应带ETag，If-None-Match 命中时返回304
+    """
+    from starlette.responses import JSONResponse, Response
 
     try:
-        status = get_simulation_status()
-        return JSONResponse(status)
+        fresh = request.query_params.get("fresh", "").lower() in ("1", "true", "yes")
+        status = await _status(request.query_params.get("instance"), fresh)
+        etag = status.get("snapshot", {}).get("etag")
+        headers = {"ETag": etag, "Cache-Control": "no-cache"} if etag else {}
+        if etag and request.headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers=headers)
+        return JSONResponse(status, headers=headers)
     except Exception as e:
         return JSONResponse({"status": "error", "message": str(e)}, status_code=500)
 
 
+@mcp.custom_route("/metrics", methods=["GET"])
+async def metrics_endpoint(request):
+    """Prometheus指标端点（工具耗时/错误、actor数量、生成成功率、清除各阶段耗时、帧率、RPC队列深度）"""
+    from starlette.responses import Response
+
+    return Response(METRICS.render(), media_type=METRICS.CONTENT_TYPE)
+
+
+@mcp.custom_route("/jobs/clear", methods=["GET"])
+async def clear_jobs_endpoint(request):
+    """后台清除任务列表端点"""
+    from starlette.responses import JSONResponse
+
+    return JSONResponse({"status": "success", "jobs": clear_jobs.list()})
+
+
+@mcp.custom_route("/jobs/clear/{job_id}", methods=["GET"])
+async def clear_job_endpoint(request):
+    """后台清除任务进度端点"""
+    from starlette.responses import JSONResponse
+
+    result = get_clear_job_status(request.path_params["job_id"])
+    return JSONResponse(result, status_code=200 if result.get("status") == "success" else 404)
+
+
 def main():
     """主函数"""
     print("Starting CARLA MCP Server...")
@@ -241,10 +530,17 @@ def main():
     print("HTTP endpoints:")
     print("  - http://localhost:8002/health: 健康检查")
     print("  - http://localhost:8002/status: 状态查询")
+    print("  - http://localhost:8002/metrics: Prometheus指标")
+    print("  - http://localhost:8002/jobs/clear/{job_id}: 后台清除任务进度")
     print("  - http://localhost:8002/mcp/v1/*: MCP HTTP API")
     print()
     print("Server starting on HTTP mode...")
 
+    # 预启动服务器池
+    if server_pool.enabled:
+        print(f"Pre-launching {server_pool.size} CARLA servers...")
+        server_pool.start()
+
 
 if __name__ == "__main__":
     import sys
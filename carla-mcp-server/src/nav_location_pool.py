@@ -0,0 +1,172 @@
+"""
+Navigation Location Pool - 行人导航点池
+按地图缓存导航网格上的随机位置：一次性批量填充，用最小间距网格打散生成点，
+存量不足时异步补充（通过 schedule 交给实例的RPC工作线程，未提供时使用后台线程）；
+已取出的点作为占用位置保留在网格中，直到行人被清除后 release_reserved()，
+避免生成行人时逐个阻塞调用 get_random_location_from_navigation()
+"""
+
+import logging
+import math
+import random
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+
+class NavLocationPool:
+    """单张地图的导航点池"""
+
+    def __init__(self, world, map_name: str, capacity: int = 500,
+                 min_separation: float = 2.0, low_watermark: float = 0.25,
+                 max_attempts_factor: int = 2,
+                 schedule: Optional[Callable[[Callable[[], None]], None]] = None):
+        self.world = world
+        self.map_name = map_name
+        self.capacity = capacity
+        self.min_separation = min_separation
+        self.low_watermark = low_watermark
+        self.max_attempts_factor = max_attempts_factor
+
+        # 生成点（取出即移除，保证互不重叠）
+        self._spawn_locations: List = []
+        # 网格索引：cell -> 位置列表（含已取出的占用位置），用于最小间距检查
+        self._grid: Dict[Tuple[int, int], List] = {}
+        # 已取出、仍被行人占用的生成点
+        self._reserved: List = []
+        # 行走目的地（可重复使用，不需要间距约束）
+        self._destinations: List = []
+
+        self._lock = threading.Lock()
+        # schedule(fn) 安排异步补充；所有CARLA调用应在同一线程执行时由管理器提供
+        self.schedule = schedule
+        self._refill_pending = False
+        self.stats = {"fills": 0, "rpc_calls": 0, "rejected": 0, "taken": 0}
+
+        self.logger = logging.getLogger(__name__)
+
+    def _cell(self, location) -> Tuple[int, int]:
+        return (int(math.floor(location.x / self.min_separation)),
+                int(math.floor(location.y / self.min_separation)))
+
+    def _is_separated(self, location, cell: Tuple[int, int]) -> bool:
+        """检查与邻近网格中已有位置的距离是否满足最小间距"""
+        min_sq = self.min_separation * self.min_separation
+        cx, cy = cell
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                for other in self._grid.get((cx + dx, cy + dy), ()):
+                    if (other.x - location.x) ** 2 + (other.y - location.y) ** 2 < min_sq:
+                        return False
+        return True
+
+    def fill(self, target: int = None) -> int:
+        """批量填充到目标数量，返回新增的生成点数量"""
+        target = target or self.capacity
+        with self._lock:
+            missing = target - len(self._spawn_locations)
+        if missing <= 0:
+            return 0
+
+        added = 0
+        attempts = 0
+        max_attempts = missing * self.max_attempts_factor
+        while added < missing and attempts < max_attempts:
+            attempts += 1
+            location = self.world.get_random_location_from_navigation()
+            if location is None:
+                continue
+
+            with self._lock:
+                # 所有采样都可以作为行走目的地
+                if len(self._destinations) < self.capacity:
+                    self._destinations.append(location)
+
+                cell = self._cell(location)
+                if not self._is_separated(location, cell):
+                    self.stats["rejected"] += 1
+                    continue
+                self._grid.setdefault(cell, []).append(location)
+                self._spawn_locations.append(location)
+                added += 1
+
+        self.stats["fills"] += 1
+        self.stats["rpc_calls"] += attempts
+        self.logger.debug(f"Nav pool {self.map_name}: +{added} spawn locations ({len(self._spawn_locations)} available)")
+        return added
+
+    def take(self, count: int) -> List:
+        """取出最多count个互不重叠的生成点；不足时先同步补充"""
+        with self._lock:
+            available = len(self._spawn_locations)
+        if available < count:
+            self.fill(max(self.capacity, count))
+
+        with self._lock:
+            random.shuffle(self._spawn_locations)
+            taken = self._spawn_locations[:count]
+            del self._spawn_locations[:count]
+            # 取出的点留在网格中，后续补充的点不会与已生成的行人重叠
+            self._reserved.extend(taken)
+            self.stats["taken"] += len(taken)
+            remaining = len(self._spawn_locations)
+
+        if remaining < self.capacity * self.low_watermark:
+            self.refill_async()
+        return taken
+
+    def release_reserved(self) -> int:
+        """行人清除后释放已取出的占用位置，返回释放数量"""
+        with self._lock:
+            released = len(self._reserved)
+            for location in self._reserved:
+                cell_locations = self._grid.get(self._cell(location))
+                if cell_locations and location in cell_locations:
+                    cell_locations.remove(location)
+            self._reserved.clear()
+        return released
+
+    def destination(self):
+        """随机返回一个行走目的地（不从池中移除）"""
+        with self._lock:
+            if self._destinations:
+                return random.choice(self._destinations)
+        return self.world.get_random_location_from_navigation()
+
+    def refill_async(self):
+        """异步补充池（已有补充任务时不重复安排）"""
+        with self._lock:
+            if self._refill_pending:
+                return
+            self._refill_pending = True
+
+        def _refill():
+            try:
+                self.fill()
+            except Exception as e:
+                self.logger.debug(f"Nav pool background refill failed: {e}")
+            finally:
+                with self._lock:
+                    self._refill_pending = False
+
+        try:
+            if self.schedule is not None:
+                self.schedule(_refill)
+            else:
+                threading.Thread(target=_refill, name=f"nav-pool-{self.map_name}", daemon=True).start()
+        except Exception as e:
+            with self._lock:
+                self._refill_pending = False
+            self.logger.debug(f"Nav pool refill could not be scheduled: {e}")
+
+    def info(self) -> Dict:
+        """池状态"""
+        with self._lock:
+            return {
+                "map": self.map_name,
+                "available": len(self._spawn_locations),
+                "reserved": len(self._reserved),
+                "destinations": len(self._destinations),
+                "capacity": self.capacity,
+                "min_separation": self.min_separation,
+                **self.stats
+            }
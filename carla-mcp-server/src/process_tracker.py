@@ -0,0 +1,206 @@
+"""
+Process Tracker - CARLA进程跟踪
+记录已发现的CARLA服务器PID，日常检查只对这些PID做存活判断；
+全量扫描（psutil.process_iter）只在首次使用、缓存过期或显式请求时执行，
+也可以由后台线程定期扫描，使检查调用本身永远不遍历全部进程
+"""
+
+import logging
+import threading
+import time
+from typing import Dict, List, Optional
+
+import psutil
+
+
+class CarlaProcessTracker:
+    """已知CARLA进程的PID集合"""
+
+    def __init__(self, process_name: str = "CarlaUE4", rescan_ttl: float = 60.0,
+                 watch_interval: float = 0.0, port: int = None):
+        self.process_name = process_name
+        # 指定端口时只匹配在该RPC端口上启动的进程（多实例时区分各自的服务器）
+        self.port = port
+        self.rescan_ttl = rescan_ttl
+        self.watch_interval = watch_interval
+
+        self._procs: Dict[int, psutil.Process] = {}
+        self._last_scan: Optional[float] = None
+        self._lock = threading.Lock()
+        self._watcher: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+        self.stats = {"scans": 0, "scan_time": 0.0, "checks": 0}
+
+        self.logger = logging.getLogger(__name__)
+
+    def _matches(self, name: Optional[str], cmdline: Optional[List[str]] = None) -> bool:
+        if not name or self.process_name not in name:
+            return False
+        if self.port is None:
+            return True
+
+        port_args = [arg for arg in (cmdline or []) if arg.startswith("-carla-port=")]
+        if not port_args:
+            return self.port == 2000  # CARLA默认端口
+        return port_args[-1] == f"-carla-port={self.port}"
+
+    def track(self, pid: int):
+        """记录自己启动的进程（不要求进程名匹配）"""
+        try:
+            proc = psutil.Process(pid)
+        except psutil.NoSuchProcess:
+            return
+        with self._lock:
+            self._procs[pid] = proc
+
+    def forget(self, pid: int):
+        with self._lock:
+            self._procs.pop(pid, None)
+
+    def scan(self) -> List[psutil.Process]:
+        """全量扫描主机进程，合并匹配的CARLA进程并返回当前存活的全部已知进程"""
+        start = time.perf_counter()
+        found = {}
+        attrs = ['pid', 'name'] if self.port is None else ['pid', 'name', 'cmdline']
+        for proc in psutil.process_iter(attrs):
+            try:
+                if self._matches(proc.info['name'], proc.info.get('cmdline')):
+                    found[proc.info['pid']] = proc
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                continue
+
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            for pid, proc in found.items():
+                self._procs.setdefault(pid, proc)
+            self._last_scan = time.time()
+            self.stats["scans"] += 1
+            self.stats["scan_time"] = round(elapsed, 4)
+
+        self.logger.debug(f"CARLA process scan: {len(found)} found in {elapsed * 1000:.1f} ms")
+        return self.processes(rescan=False)
+
+    def _scan_due(self) -> bool:
+        # 有后台线程负责扫描时，检查调用不再触发扫描（首次除外）
+        if self._last_scan is None:
+            return True
+        if self._watcher and self._watcher.is_alive():
+            return False
+        return self.rescan_ttl > 0 and time.time() - self._last_scan > self.rescan_ttl
+
+    @staticmethod
+    def _alive(proc: psutil.Process) -> bool:
+        """PID级存活检查（is_running 会比对创建时间，防止PID复用误判）"""
+        try:
+            return proc.is_running() and proc.status() != psutil.STATUS_ZOMBIE
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            return False
+
+    def processes(self, rescan: Optional[bool] = None) -> List[psutil.Process]:
+        """返回存活的已知CARLA进程，并移除已退出的PID
+
+        rescan: True 强制全量扫描；False 不扫描；None 按缓存过期时间决定。
+        """
+        if rescan or (rescan is None and self._scan_due()):
+            return self.scan()
+
+        with self._lock:
+            self.stats["checks"] += 1
+            dead = [pid for pid, proc in self._procs.items() if not self._alive(proc)]
+            for pid in dead:
+                del self._procs[pid]
+            return list(self._procs.values())
+
+    def is_running(self, full_scan: bool = False, exclude: set = None) -> bool:
+        """是否有存活的CARLA进程；full_scan=True 时先全量扫描，exclude 中的PID不计入"""
+        exclude = exclude or set()
+        return any(proc.pid not in exclude for proc in self.processes(rescan=True if full_scan else None))
+
+    def shutdown(self, timeout: float = 15.0, kill_grace: float = 3.0, exclude: set = None) -> Dict:
+        """并行停止所有已知CARLA进程（先全量扫描，exclude 中的PID除外）
+
+        同时向全部进程发送terminate，用 psutil.wait_procs 统一等待；
+        总耗时不超过timeout，其中最后kill_grace秒留给批量kill。
+        返回每个PID的结果 (terminated / killed / already_exited / access_denied / still_running) 和总耗时。
+        """
+        start = time.perf_counter()
+        deadline = start + timeout
+        exclude = exclude or set()
+        procs = [proc for proc in self.processes(rescan=True) if proc.pid not in exclude]
+        outcomes: Dict[int, Dict] = {}
+
+        pending = []
+        for proc in procs:
+            try:
+                proc.terminate()
+                pending.append(proc)
+            except psutil.NoSuchProcess:
+                outcomes[proc.pid] = {"outcome": "already_exited"}
+            except psutil.AccessDenied:
+                outcomes[proc.pid] = {"outcome": "access_denied"}
+
+        def record(gone, outcome):
+            for proc in gone:
+                outcomes[proc.pid] = {
+                    "outcome": outcome,
+                    "returncode": None if proc.returncode is None else int(proc.returncode),
+                    "elapsed": round(time.perf_counter() - start, 3)
+                }
+
+        gone, alive = psutil.wait_procs(pending, timeout=max(timeout - kill_grace, 0.0))
+        record(gone, "terminated")
+
+        if alive:
+            for proc in alive:
+                try:
+                    proc.kill()
+                except psutil.NoSuchProcess:
+                    pass
+                except psutil.AccessDenied:
+                    outcomes[proc.pid] = {"outcome": "access_denied"}
+            alive = [proc for proc in alive if proc.pid not in outcomes]
+            gone, alive = psutil.wait_procs(alive, timeout=max(deadline - time.perf_counter(), 0.0))
+            record(gone, "killed")
+            for proc in alive:
+                outcomes[proc.pid] = {"outcome": "still_running"}
+
+        for pid, result in outcomes.items():
+            if result["outcome"] != "still_running":
+                self.forget(pid)
+
+        elapsed = time.perf_counter() - start
+        self.logger.info(f"Shutdown {len(procs)} CARLA processes in {elapsed:.3f}s")
+        return {
+            "processes": [{"pid": pid, **result} for pid, result in outcomes.items()],
+            "elapsed": round(elapsed, 3)
+        }
+
+    def start_watcher(self):
+        """启动后台扫描线程（watch_interval <= 0 时不启动）"""
+        if self.watch_interval <= 0 or (self._watcher and self._watcher.is_alive()):
+            return
+
+        def _watch():
+            while not self._stop_event.is_set():
+                try:
+                    self.scan()
+                except Exception as e:
+                    self.logger.debug(f"CARLA process watcher scan failed: {e}")
+                self._stop_event.wait(self.watch_interval)
+
+        self._stop_event.clear()
+        self._watcher = threading.Thread(target=_watch, name="carla-process-watcher", daemon=True)
+        self._watcher.start()
+
+    def stop_watcher(self):
+        self._stop_event.set()
+
+    def info(self) -> Dict:
+        with self._lock:
+            return {
+                "tracked_pids": sorted(self._procs),
+                "last_scan": self._last_scan,
+                "rescan_ttl": self.rescan_ttl,
+                "watcher": bool(self._watcher and self._watcher.is_alive()),
+                **self.stats
+            }
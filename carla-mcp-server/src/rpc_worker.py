@@ -0,0 +1,248 @@
+"""
+RPC Worker - CARLA调用的单一所有者线程
+CarlaManager 不是线程安全的（self.vehicles / self.world / self.client 会被修改），
+因此每个实例的所有CARLA调用都放进队列，由同一个工作线程依次执行。
+队列分为读、写两条通道：轻量的读请求（状态、数量）优先于批量写请求（生成、清除）；
+相邻的可合并写请求（例如两次添加车辆）合并为一次批量调用。
+协程（启动服务器）在工作线程自己的常驻事件循环中运行
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import Any, Callable, Dict, List, Optional
+
+from async_runner import remaining_time
+from tool_tracing import record_rpc
+
+
+class MergeSpec:
+    """写请求合并规则
+
+    key 相同的相邻写请求可以合并：combine(各请求的参数列表) 返回合并后的参数，
+    split(合并调用的结果, 各请求的参数列表) 返回每个请求各自的结果。
+    """
+
+    def __init__(self, key: str, combine: Callable[[List[tuple]], tuple],
+                 split: Callable[[Any, List[tuple]], List[Any]] = None):
+        self.key = key
+        self.combine = combine
+        self.split = split or (lambda result, arg_list: [result] * len(arg_list))
+
+
+class RpcRequest:
+    def __init__(self, op: str, fn: Callable, args: tuple, kwargs: Dict, lane: str,
+                 merge: Optional[MergeSpec]):
+        self.op = op
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.lane = lane
+        self.merge = merge
+        self.future: Future = Future()
+        self.enqueued_at = time.perf_counter()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+    def timing(self) -> tuple:
+        """(排队时间, 执行时间)；尚未开始/结束的部分按当前时间计算"""
+        now = time.perf_counter()
+        started = self.started_at or now
+        return started - self.enqueued_at, (self.finished_at or now) - started if self.started_at else 0.0
+
+
+class LaneStats:
+    def __init__(self):
+        self.enqueued = 0
+        self.processed = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.last_wait = 0.0
+
+    def record_wait(self, wait: float):
+        self.processed += 1
+        self.wait_total += wait
+        self.wait_max = max(self.wait_max, wait)
+        self.last_wait = wait
+
+    def info(self, depth: int) -> Dict:
+        return {
+            "depth": depth,
+            "enqueued": self.enqueued,
+            "processed": self.processed,
+            "wait_avg": round(self.wait_total / self.processed, 4) if self.processed else 0.0,
+            "wait_max": round(self.wait_max, 4),
+            "last_wait": round(self.last_wait, 4),
+        }
+
+
+class CarlaRpcWorker:
+    """单线程执行所有CARLA调用，读通道优先"""
+
+    LANES = ("read", "write")
+
+    def __init__(self, name: str = "carla-rpc", max_merge: int = 16):
+        self.name = name
+        self.max_merge = max_merge
+
+        self._queues = {lane: deque() for lane in self.LANES}
+        self._stats = {lane: LaneStats() for lane in self.LANES}
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._stopping = False
+
+        self._current: Optional[RpcRequest] = None
+        self._current_started = 0.0
+        self.merged = 0
+        # 每批写请求执行完后的回调（例如让状态快照过期）
+        self.after_write: Optional[Callable[[], None]] = None
+
+        self.logger = logging.getLogger(__name__)
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+
+    def on_worker_thread(self) -> bool:
+        return threading.current_thread() is self._thread
+
+    def _enqueue(self, op: str, fn: Callable, args: tuple, kwargs: Dict, lane: str,
+                 merge: Optional[MergeSpec]) -> RpcRequest:
+        request = RpcRequest(op, fn, args, kwargs, lane, merge)
+        with self._cond:
+            self._ensure_thread()
+            self._queues[lane].append(request)
+            self._stats[lane].enqueued += 1
+            self._cond.notify()
+        return request
+
+    def submit(self, op: str, fn: Callable, *args, lane: str = "write",
+               merge: MergeSpec = None, **kwargs) -> Future:
+        """把调用放入指定通道，返回 concurrent.futures.Future"""
+        return self._enqueue(op, fn, args, kwargs, lane, merge).future
+
+    def call(self, op: str, fn: Callable, *args, lane: str = "write",
+             merge: MergeSpec = None, timeout: float = None, **kwargs) -> Any:
+        """提交并阻塞等待结果；在工作线程内部调用时直接执行（避免自锁）
+
+        timeout 默认取当前工具调用的剩余时间；超时后仍在排队的请求会被取消并移出队列。
+        """
+        if self.on_worker_thread():
+            return self._execute(fn, args, kwargs)
+        if timeout is None:
+            timeout = remaining_time()
+        request = self._enqueue(op, fn, args, kwargs, lane, merge)
+        try:
+            return request.future.result(timeout)
+        except FutureTimeoutError:
+            self._cancel(request)
+            raise FutureTimeoutError(f"{op} 在RPC工作线程上超时（{timeout:.1f}秒）")
+        finally:
+            # 排队/执行时间计入当前工具调用的追踪span
+            record_rpc(op, *request.timing())
+
+    def _cancel(self, request: RpcRequest):
+        """取消尚未开始执行的请求（已在执行的请求无法中断）"""
+        if request.future.cancel():
+            with self._cond:
+                try:
+                    self._queues[request.lane].remove(request)
+                except ValueError:
+                    pass
+
+    def _next_batch(self) -> List[RpcRequest]:
+        """读通道优先；写请求取出后把紧邻的同key可合并请求一起取出"""
+        if self._queues["read"]:
+            return [self._queues["read"].popleft()]
+
+        writes = self._queues["write"]
+        batch = [writes.popleft()]
+        merge = batch[0].merge
+        if merge is not None:
+            while (writes and len(batch) < self.max_merge and writes[0].merge is not None
+                   and writes[0].merge.key == merge.key):
+                batch.append(writes.popleft())
+        return batch
+
+    def _execute(self, fn: Callable, args: tuple, kwargs: Dict) -> Any:
+        result = fn(*args, **kwargs)
+        if asyncio.iscoroutine(result):
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                asyncio.set_event_loop(self._loop)
+            result = self._loop.run_until_complete(result)
+        return result
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not any(self._queues.values()) and not self._stopping:
+                    self._cond.wait()
+                if self._stopping and not any(self._queues.values()):
+                    return
+                batch = self._next_batch()
+                now = time.perf_counter()
+                for request in batch:
+                    request.started_at = now
+                    self._stats[request.lane].record_wait(now - request.enqueued_at)
+                self._current, self._current_started = batch[0], now
+
+            # 已被调用方取消（例如超时）的请求不再执行
+            batch = [request for request in batch if request.future.set_running_or_notify_cancel()]
+            if batch:
+                self._process(batch)
+                finished = time.perf_counter()
+                for request in batch:
+                    request.finished_at = finished
+                if batch[0].lane == "write" and self.after_write is not None:
+                    try:
+                        self.after_write()
+                    except Exception as e:
+                        self.logger.debug(f"{self.name}: after_write callback failed: {e}")
+
+            with self._cond:
+                self._current = None
+
+    def _process(self, batch: List[RpcRequest]):
+        first = batch[0]
+        try:
+            if len(batch) == 1:
+                first.future.set_result(self._execute(first.fn, first.args, first.kwargs))
+                return
+
+            arg_list = [request.args for request in batch]
+            result = self._execute(first.fn, first.merge.combine(arg_list), first.kwargs)
+            self.merged += len(batch) - 1
+            self.logger.debug(f"{self.name}: merged {len(batch)} '{first.op}' requests")
+            for request, part in zip(batch, first.merge.split(result, arg_list)):
+                request.future.set_result(part)
+        except BaseException as e:
+            for request in batch:
+                if not request.future.done():
+                    request.future.set_exception(e)
+
+    def stop(self):
+        """处理完已排队的请求后停止工作线程"""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+
+    def info(self) -> Dict:
+        with self._cond:
+            data = {
+                "lanes": {lane: self._stats[lane].info(len(self._queues[lane])) for lane in self.LANES},
+                "merged": self.merged,
+                "busy": None,
+            }
+            if self._current is not None:
+                data["busy"] = {
+                    "op": self._current.op,
+                    "running_for": round(time.perf_counter() - self._current_started, 3)
+                }
+            return data
@@ -0,0 +1,66 @@
+"""
+Server Output - CARLA服务器输出收集
+后台线程持续读取服务器进程的 stdout / stderr，保存在有界的环形缓冲区中，
+既避免管道写满导致服务器阻塞，也保留最近的输出用于启动失败或崩溃时排查
+"""
+
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional
+
+
+class ServerOutputBuffer:
+    """服务器输出环形缓冲区（保留最近max_lines行）"""
+
+    def __init__(self, max_lines: int = 500):
+        self.max_lines = max_lines
+        self._lines: deque = deque(maxlen=max_lines)  # (timestamp, stream, line)
+        self._lock = threading.Lock()
+        self._threads: List[threading.Thread] = []
+        self.total_lines = 0
+
+    def attach(self, process, name: str = "carla"):
+        """为进程的 stdout / stderr 各启动一个读取线程"""
+        for stream_name, stream in (("stdout", process.stdout), ("stderr", process.stderr)):
+            if stream is None:
+                continue
+            thread = threading.Thread(
+                target=self._drain, args=(stream, stream_name),
+                name=f"{name}-{stream_name}", daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+
+    def _drain(self, stream, stream_name: str):
+        try:
+            for raw in iter(stream.readline, b""):
+                line = raw.decode("utf-8", errors="replace").rstrip()
+                if not line:
+                    continue
+                with self._lock:
+                    self._lines.append((time.time(), stream_name, line))
+                    self.total_lines += 1
+        except (OSError, ValueError):
+            pass  # 进程退出后管道关闭
+        finally:
+            try:
+                stream.close()
+            except OSError:
+                pass
+
+    def tail(self, lines: int = 50, stream: Optional[str] = None) -> List[Dict]:
+        """最近的输出行"""
+        with self._lock:
+            entries = [e for e in self._lines if stream is None or e[1] == stream]
+        return [
+            {"time": round(timestamp, 3), "stream": stream_name, "line": line}
+            for timestamp, stream_name, line in entries[-lines:]
+        ]
+
+    def tail_text(self, lines: int = 20) -> str:
+        return "\n".join(entry["line"] for entry in self.tail(lines))
+
+    def info(self) -> Dict:
+        with self._lock:
+            return {"buffered_lines": len(self._lines), "total_lines": self.total_lines, "max_lines": self.max_lines}
@@ -0,0 +1,307 @@
+"""
+Server Pool - 预启动的CARLA服务器池
+预先在不同的RPC端口上启动N个CARLA服务器（每个服务器分配独立的TrafficManager端口），
+start_carla_simulator 时直接租用一个已就绪的服务器，省去引擎启动时间；
+归还时在后台重置（重新加载地图），崩溃的服务器由后台线程重新拉起；
+进程退出时（atexit）终止池中所有服务器。
+就绪判断只做RPC端口的TCP连接，因此可以用 examples/fake_carla_server.py 之类的替身程序测试
+"""
+
+import atexit
+import logging
+import os
+import socket
+import subprocess
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+from server_output import ServerOutputBuffer
+
+
+class PooledServer:
+    """池中的单个CARLA服务器"""
+
+    def __init__(self, index: int, port: int, tm_port: int):
+        self.index = index
+        self.port = port
+        self.tm_port = tm_port
+        self.process: Optional[subprocess.Popen] = None
+        self.output: Optional[ServerOutputBuffer] = None
+        self.state = "stopped"  # stopped / restarting / starting / ready / leased / resetting / failed
+        self.owner: Optional[str] = None
+        # 每次(重新)启动加一，租用方据此判断租到的服务器是否已被替换
+        self.generation = 0
+        self.launched_at: Optional[float] = None
+        self.ready_at: Optional[float] = None
+        self.restarts = 0
+        self.last_error: Optional[str] = None
+
+    @property
+    def pid(self) -> Optional[int]:
+        return self.process.pid if self.process else None
+
+    def exited(self) -> bool:
+        return self.process is None or self.process.poll() is not None
+
+    def info(self) -> Dict:
+        data = {
+            "index": self.index,
+            "port": self.port,
+            "tm_port": self.tm_port,
+            "pid": self.pid,
+            "state": self.state,
+            "owner": self.owner,
+            "generation": self.generation,
+            "restarts": self.restarts,
+        }
+        if self.launched_at and self.ready_at:
+            data["boot_time"] = round(self.ready_at - self.launched_at, 3)
+        if self.last_error:
+            data["last_error"] = self.last_error
+        return data
+
+
+class CarlaServerPool:
+    """CARLA服务器池"""
+
+    def __init__(self, config: Dict, command_builder: Callable[[int], List[str]],
+                 reset_fn: Callable[[PooledServer], None] = None):
+        pool_config = config.get("server_pool", {})
+        self.enabled = pool_config.get("enabled", False)
+        self.size = pool_config.get("size", 2)
+        self.host = config["carla"].get("host", "localhost")
+        self.boot_timeout = pool_config.get("boot_timeout", config["carla"].get("timeout", 60))
+        self.health_interval = pool_config.get("health_interval", 5.0)
+        self.cwd = pool_config.get("cwd") or config["carla"].get("path")
+        self.output_lines = pool_config.get("output_buffer_lines", 200)
+
+        # command 可替换为替身程序，例如 ["python", "examples/fake_carla_server.py"]，端口参数会自动追加
+        self.command = pool_config.get("command")
+        self.command_builder = command_builder
+        self.reset_fn = reset_fn
+
+        base_port = pool_config.get("base_port", 2000)
+        port_step = pool_config.get("port_step", 3)  # CARLA占用 port / port+1 / port+2
+        tm_base_port = pool_config.get("tm_base_port", 8000)
+        self.servers = [
+            PooledServer(i, base_port + i * port_step, tm_base_port + i)
+            for i in range(self.size)
+        ]
+
+        self._lock = threading.Condition()
+        self._monitor: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+        self._atexit_registered = False
+        self.stats = {"leases": 0, "releases": 0, "crashes": 0, "reset_failures": 0, "lease_wait": 0.0}
+
+        self.logger = logging.getLogger(__name__)
+
+    def _build_command(self, port: int) -> List[str]:
+        if self.command:
+            return list(self.command) + [f"-carla-port={port}"]
+        return self.command_builder(port)
+
+    def port_open(self, port: int, timeout: float = 0.5) -> bool:
+        """TCP连接RPC端口判断服务器是否在监听"""
+        try:
+            with socket.create_connection((self.host, port), timeout=timeout):
+                return True
+        except OSError:
+            return False
+
+    def start(self):
+        """启动池中所有服务器和后台监控线程（重复调用无副作用）"""
+        if not self.enabled or (self._monitor and self._monitor.is_alive()):
+            return
+
+        self._stop_event.clear()
+        if not self._atexit_registered:
+            # MCP进程退出时不留下孤儿CARLA服务器
+            atexit.register(self.shutdown)
+            self._atexit_registered = True
+        for server in self.servers:
+            if server.state == "stopped":
+                self._launch(server)
+
+        self._monitor = threading.Thread(target=self._watch, name="carla-server-pool", daemon=True)
+        self._monitor.start()
+        self.logger.info(f"Server pool started: {self.size} servers on ports {[s.port for s in self.servers]}")
+
+    def _launch(self, server: PooledServer):
+        """(重新)启动服务器进程，并在后台线程中等待端口就绪（会阻塞等待旧进程退出，不要在监控线程上调用）"""
+        if server.process and server.process.poll() is None:
+            server.process.kill()
+            try:
+                server.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.logger.warning(f"Pool server {server.index} (pid {server.pid}) did not exit after kill")
+        if self._stop_event.is_set():
+            return
+
+        cmd = self._build_command(server.port)
+        cwd = self.cwd if self.cwd and os.path.isdir(self.cwd) else None
+        with self._lock:
+            server.state = "starting"
+            server.owner = None
+            server.generation += 1
+            server.launched_at = time.time()
+            server.ready_at = None
+        try:
+            # 服务器输出由后台线程读入环形缓冲区，避免管道写满阻塞服务器
+            server.process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, cwd=cwd)
+            server.output = ServerOutputBuffer(self.output_lines)
+            server.output.attach(server.process, name=f"carla-pool-{server.index}")
+        except Exception as e:
+            self._mark_failed(server, f"launch failed: {e}")
+            return
+
+        self.logger.info(f"Pool server {server.index} launching on port {server.port} (pid {server.pid})")
+        threading.Thread(target=self._wait_ready, args=(server, server.generation),
+                         name=f"carla-pool-boot-{server.index}", daemon=True).start()
+
+    def _wait_ready(self, server: PooledServer, generation: int):
+        deadline = server.launched_at + self.boot_timeout
+        delay = 0.1
+        while time.time() < deadline and not self._stop_event.is_set():
+            if server.generation != generation:
+                return
+            if server.exited():
+                self._mark_failed(server, f"exited during boot (code {server.process.poll()}): "
+                                          f"{server.output.tail_text(5)}")
+                return
+            if self.port_open(server.port):
+                with self._lock:
+                    if server.generation == generation:
+                        server.state = "ready"
+                        server.ready_at = time.time()
+                        server.last_error = None
+                        self._lock.notify_all()
+                self.logger.info(f"Pool server {server.index} ready in {server.ready_at - server.launched_at:.2f}s")
+                return
+            # 指数退避，避免启动早期频繁连接
+            time.sleep(delay)
+            delay = min(delay * 2, 2.0)
+
+        if server.generation == generation and not self._stop_event.is_set():
+            self._mark_failed(server, f"port {server.port} not open within {self.boot_timeout}s")
+
+    def _mark_failed(self, server: PooledServer, error: str):
+        self.logger.warning(f"Pool server {server.index}: {error}")
+        with self._lock:
+            server.state = "failed"
+            server.owner = None
+            server.last_error = error
+            self._lock.notify_all()
+
+    def _relaunch(self, server: PooledServer):
+        """在独立线程中重启服务器（kill/wait 不占用监控线程或调用方）"""
+        threading.Thread(target=self._launch, args=(server,),
+                         name=f"carla-pool-relaunch-{server.index}", daemon=True).start()
+
+    def _watch(self):
+        """后台监控：替换崩溃或启动失败的服务器"""
+        while not self._stop_event.wait(self.health_interval):
+            for server in self.servers:
+                with self._lock:
+                    if server.state in ("ready", "leased") and server.exited():
+                        self.stats["crashes"] += 1
+                        server.last_error = f"crashed (code {server.process.poll()}): {server.output.tail_text(5)}"
+                        self.logger.warning(f"Pool server {server.index} crashed (state {server.state}), relaunching")
+                    elif server.state != "failed":
+                        continue
+                    # 标记为重启中，下一轮检查不会重复拉起
+                    server.state = "restarting"
+                    server.owner = None
+                    server.restarts += 1
+                self._relaunch(server)
+
+    def lease(self, owner: str, timeout: float = None) -> Optional[PooledServer]:
+        """租用一个已就绪的服务器；没有就绪的服务器时最多等待timeout秒（默认boot_timeout）"""
+        if not self.enabled:
+            return None
+        self.start()
+
+        start = time.time()
+        deadline = start + (self.boot_timeout if timeout is None else timeout)
+        with self._lock:
+            while True:
+                for server in self.servers:
+                    if server.state == "ready":
+                        server.state = "leased"
+                        server.owner = owner
+                        self.stats["leases"] += 1
+                        self.stats["lease_wait"] = round(time.time() - start, 3)
+                        self.logger.info(f"Pool server {server.index} (port {server.port}) leased to {owner}")
+                        return server
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return None
+                self._lock.wait(min(remaining, 1.0))
+
+    def is_leased(self, server: PooledServer, generation: int) -> bool:
+        """租到的服务器是否仍然有效（未崩溃、未被替换）"""
+        return server.state == "leased" and server.generation == generation and not server.exited()
+
+    def release(self, server: PooledServer):
+        """归还服务器，在后台重置后重新进入就绪状态；重置失败则重启"""
+        with self._lock:
+            if server.state != "leased":
+                return
+            server.state = "resetting"
+            server.owner = None
+            self.stats["releases"] += 1
+        generation = server.generation
+
+        def _reset():
+            try:
+                if self.reset_fn:
+                    self.reset_fn(server)
+                with self._lock:
+                    if server.generation == generation and not server.exited():
+                        server.state = "ready"
+                        self._lock.notify_all()
+                        return
+            except Exception as e:
+                with self._lock:
+                    self.stats["reset_failures"] += 1
+                    server.last_error = f"reset failed: {e}"
+                self.logger.warning(f"Pool server {server.index} reset failed: {e}")
+            with self._lock:
+                if server.generation != generation or self._stop_event.is_set():
+                    return
+                server.state = "restarting"
+                server.restarts += 1
+            self._launch(server)
+
+        threading.Thread(target=_reset, name=f"carla-pool-reset-{server.index}", daemon=True).start()
+
+    def pids(self) -> set:
+        return {server.pid for server in self.servers if server.pid and not server.exited()}
+
+    def shutdown(self, timeout: float = 10.0):
+        """停止监控线程并终止池中所有服务器"""
+        self._stop_event.set()
+        processes = [server.process for server in self.servers if server.process and not server.exited()]
+        for process in processes:
+            process.terminate()
+        deadline = time.time() + timeout
+        for process in processes:
+            try:
+                process.wait(timeout=max(deadline - time.time(), 0.0))
+            except subprocess.TimeoutExpired:
+                process.kill()
+        with self._lock:
+            for server in self.servers:
+                server.state = "stopped"
+                server.owner = None
+            self._lock.notify_all()
+
+    def info(self) -> Dict:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "size": self.size,
+                "servers": [server.info() for server in self.servers],
+                **self.stats
+            }
@@ -0,0 +1,189 @@
+"""
+Spawn Planner - 无碰撞生成点规划
+候选生成点保存在NumPy数组中，通过均匀网格索引选出满足最小间距的N个点，
+并排除已有车辆附近的位置，尽量让 apply_batch_sync 中的生成命令全部成功；
+同时按道路/车道长度索引候选点，支持按密度（辆/公里）或按道路分配数量
+"""
+
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# 3x3 邻域偏移
+_NEIGHBOR_OFFSETS = np.array([(dx, dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1)], dtype=np.int64)
+
+
+class SpawnPlanner:
+    """基于均匀网格的生成点规划器（每张地图构建一次）"""
+
+    def __init__(self, transforms: Sequence, min_spacing: float = 6.0,
+                 road_ids: Sequence[int] = None, lane_ids: Sequence[int] = None,
+                 s_values: Sequence[float] = None, lane_lengths: Dict[Tuple[int, int], float] = None,
+                 sample_distance: float = 30.0):
+        self.transforms = list(transforms)
+        self.min_spacing = float(min_spacing)
+        self.positions = np.array(
+            [(t.location.x, t.location.y, t.location.z) for t in self.transforms],
+            dtype=np.float64
+        ).reshape(-1, 3)
+        self._cells = self._cell_of(self.positions[:, :2])
+        self._keys = self._key_of(self._cells)
+
+        # 道路/车道索引（可选，用于按密度分配）
+        count = len(self.transforms)
+        self.road_ids = np.asarray(road_ids if road_ids is not None else np.zeros(count), dtype=np.int64)
+        self.lane_ids = np.asarray(lane_ids if lane_ids is not None else np.zeros(count), dtype=np.int64)
+        self.s_values = np.asarray(s_values if s_values is not None else np.arange(count), dtype=np.float64)
+        self._lane_keys = self._key_of(np.stack([self.road_ids, self.lane_ids], axis=1))
+
+        # 每条车道的长度（米）：优先使用地图拓扑给出的长度，缺失时按采样点数估算
+        self.lanes, first_of_lane, self._lane_index, lane_counts = np.unique(
+            self._lane_keys, return_index=True, return_inverse=True, return_counts=True
+        )
+        self._lane_index = self._lane_index.reshape(-1)
+        self.lane_road_ids = self.road_ids[first_of_lane]
+        lane_lengths = lane_lengths or {}
+        self.lane_lengths = np.array([
+            lane_lengths.get((int(self.road_ids[i]), int(self.lane_ids[i])), lane_counts[k] * sample_distance)
+            for k, i in enumerate(first_of_lane)
+        ], dtype=np.float64)
+
+    def __len__(self) -> int:
+        return len(self.transforms)
+
+    def _cell_of(self, xy: np.ndarray) -> np.ndarray:
+        return np.floor(xy / self.min_spacing).astype(np.int64)
+
+    @staticmethod
+    def _key_of(cells: np.ndarray) -> np.ndarray:
+        """把二维网格坐标压缩为一维键，便于 np.isin / np.unique"""
+        return (cells[:, 0] << 32) ^ (cells[:, 1] & 0xFFFFFFFF)
+
+    def blocked_mask(self, occupied_xy: Optional[np.ndarray], chunk: int = 1024) -> np.ndarray:
+        """标记距离已占用位置小于最小间距的候选点"""
+        blocked = np.zeros(len(self.transforms), dtype=bool)
+        if occupied_xy is None or len(occupied_xy) == 0 or len(self.transforms) == 0:
+            return blocked
+
+        occupied_xy = np.asarray(occupied_xy, dtype=np.float64).reshape(-1, 2)
+        occupied_cells = self._cell_of(occupied_xy)
+        near_cells = (occupied_cells[:, None, :] + _NEIGHBOR_OFFSETS[None, :, :]).reshape(-1, 2)
+
+        # 网格粗筛：只有落在已占用位置邻域网格内的候选点才需要精确计算距离
+        candidates = np.nonzero(np.isin(self._keys, self._key_of(near_cells)))[0]
+        min_sq = self.min_spacing * self.min_spacing
+        for start in range(0, len(candidates), chunk):
+            idx = candidates[start:start + chunk]
+            diff = self.positions[idx, None, :2] - occupied_xy[None, :, :]
+            blocked[idx] = (np.einsum('ijk,ijk->ij', diff, diff) < min_sq).any(axis=1)
+        return blocked
+
+    def plan(self, count: int, occupied_xy: Optional[np.ndarray] = None,
+             rng: Optional[np.random.Generator] = None,
+             candidates: Optional[np.ndarray] = None) -> List[int]:
+        """随机选出最多count个两两间距不小于min_spacing的候选点索引
+
+        candidates 可限定候选范围（索引数组），默认使用全部候选点。
+        """
+        if count <= 0 or len(self.transforms) == 0:
+            return []
+
+        rng = rng or np.random.default_rng()
+        pool = np.arange(len(self.transforms)) if candidates is None else np.asarray(candidates, dtype=np.int64)
+        pool = pool[~self.blocked_mask(occupied_xy)[pool]]
+        if len(pool) == 0:
+            return []
+
+        # 向量化预筛：打乱后每个网格只保留第一个点（同一网格内的点彼此过近）
+        order = rng.permutation(pool)
+        _, first = np.unique(self._keys[order], return_index=True)
+        order = order[np.sort(first)]
+
+        # 相邻网格之间仍可能过近，按打乱顺序贪心接受并检查3x3邻域
+        min_sq = self.min_spacing * self.min_spacing
+        accepted: Dict[tuple, int] = {}
+        selected: List[int] = []
+        for index in order:
+            cx, cy = self._cells[index]
+            px, py = self.positions[index, 0], self.positions[index, 1]
+            too_close = False
+            for dx, dy in _NEIGHBOR_OFFSETS:
+                other = accepted.get((cx + dx, cy + dy))
+                if other is not None:
+                    ox, oy = self.positions[other, 0], self.positions[other, 1]
+                    if (ox - px) ** 2 + (oy - py) ** 2 < min_sq:
+                        too_close = True
+                        break
+            if too_close:
+                continue
+
+            accepted[(cx, cy)] = index
+            selected.append(int(index))
+            if len(selected) >= count:
+                break
+
+        return selected
+
+    @staticmethod
+    def allocate(total: int, weights: np.ndarray, capacity: np.ndarray) -> np.ndarray:
+        """按权重把total个名额分配到各组（最大余数法），每组不超过capacity"""
+        counts = np.zeros(len(weights), dtype=np.int64)
+        weights = np.where(capacity > 0, np.asarray(weights, dtype=np.float64), 0.0)
+        remaining = int(min(total, capacity.sum()))
+
+        # 容量截断后重新分配剩余名额，直到分完或所有组都已满
+        while remaining > 0 and weights.sum() > 0:
+            quotas = remaining * weights / weights.sum()
+            add = np.minimum(np.floor(quotas).astype(np.int64), capacity - counts)
+            leftover = remaining - int(add.sum())
+            if leftover > 0:
+                free = (capacity - counts - add) > 0
+                order = np.argsort(-(quotas - np.floor(quotas)) * free, kind="stable")
+                bonus = order[:leftover][free[order[:leftover]]]
+                add[bonus] += 1
+            if add.sum() == 0:
+                break
+            counts += add
+            remaining -= int(add.sum())
+            weights = np.where(counts >= capacity, 0.0, weights)
+        return counts
+
+    def plan_density(self, vehicles_per_km: float = None, road_counts: Dict[int, int] = None,
+                     occupied_xy: Optional[np.ndarray] = None,
+                     rng: Optional[np.random.Generator] = None) -> List[int]:
+        """按道路长度加权选点
+
+        vehicles_per_km: 目标密度（辆/公里车道），按车道长度分配；
+        road_counts: {road_id: 数量}，在该道路的各车道间按长度分配。
+        每条车道内的点按 s 均匀间隔选取，rng 只决定起始偏移，结果可复现。
+        """
+        if len(self.transforms) == 0:
+            return []
+
+        rng = rng or np.random.default_rng()
+        available = ~self.blocked_mask(occupied_xy)
+        capacity = np.bincount(self._lane_index[available], minlength=len(self.lanes))
+
+        if road_counts:
+            per_lane = np.zeros(len(self.lanes), dtype=np.int64)
+            for road_id, count in road_counts.items():
+                in_road = self.lane_road_ids == int(road_id)
+                if in_road.any():
+                    per_lane[in_road] = self.allocate(int(count), self.lane_lengths[in_road], capacity[in_road])
+        else:
+            total = int(round((vehicles_per_km or 0.0) * self.lane_lengths.sum() / 1000.0))
+            per_lane = self.allocate(total, self.lane_lengths, capacity)
+
+        # 可用候选点按 (车道, s) 排序，每条车道内均匀间隔取 per_lane 个
+        candidates = np.nonzero(available)[0]
+        candidates = candidates[np.lexsort((self.s_values[candidates], self._lane_index[candidates]))]
+        lane_of = self._lane_index[candidates]
+        starts = np.searchsorted(lane_of, np.arange(len(self.lanes)))
+
+        lanes = np.repeat(np.arange(len(self.lanes)), per_lane)
+        if len(lanes) == 0:
+            return []
+        slot = np.arange(len(lanes)) - np.repeat(np.cumsum(per_lane) - per_lane, per_lane)
+        offset = rng.random(len(self.lanes))[lanes]
+        position = np.floor((slot + offset) * capacity[lanes] / per_lane[lanes]).astype(np.int64)
+        return candidates[starts[lanes] + position].tolist()
@@ -0,0 +1,163 @@
+"""
+Status Cache - 状态快照缓存
+get_status 每次都要做多次阻塞RPC（地图名、天气、快照）和进程检查，而仪表盘会高频轮询 /status。
+这里由后台线程按TTL刷新状态快照，读取时直接返回缓存，不再访问仿真器；
+快照带有版本号和ETag，内容变化时版本号递增；fresh=True 时同步刷新。
+一段时间没有读取时后台刷新自动暂停，下次读取时恢复
+"""
+
+import copy
+import hashlib
+import json
+import logging
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+
+class StatusSnapshotCache:
+    """按TTL后台刷新的状态快照"""
+
+    # 每次刷新都会变化的字段，不参与版本号/ETag计算
+    VOLATILE_KEYS = ("tick", "frame_rate", "rpc_worker", "status_cache", "carla_processes")
+
+    def __init__(self, refresh_fn: Callable[[], Dict], ttl: float = 1.0, idle_timeout: float = 30.0,
+                 name: str = "status"):
+        self.refresh_fn = refresh_fn
+        self.ttl = ttl
+        self.idle_timeout = idle_timeout
+        self.name = name
+
+        self._snapshot: Optional[Dict] = None
+        self._etag: Optional[str] = None
+        self._digest: Optional[str] = None
+        self.version = 0
+        self._refreshed_at = 0.0
+        self._last_read = 0.0
+
+        self._lock = threading.Lock()
+        # 同一时间只允许一次刷新，并发的同步刷新等待正在进行的刷新结果
+        self._refresh_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.stats = {"hits": 0, "refreshes": 0, "sync_refreshes": 0, "errors": 0}
+
+        self.logger = logging.getLogger(__name__)
+
+    def _digest_of(self, result: Dict) -> str:
+        data = result.get("data")
+        if isinstance(data, dict):
+            data = {k: v for k, v in data.items() if k not in self.VOLATILE_KEYS}
+            result = dict(result, data=data)
+        payload = json.dumps(result, sort_keys=True, default=str)
+        return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+    def refresh(self) -> Dict:
+        """同步执行一次刷新，返回新的快照"""
+        started = time.time()
+        with self._refresh_lock:
+            # 等锁期间其他线程已完成刷新，直接复用
+            if self._refreshed_at >= started and self._snapshot is not None:
+                return self._snapshot
+            try:
+                result = self.refresh_fn()
+            except Exception as e:
+                self.stats["errors"] += 1
+                result = {"status": "error", "message": str(e)}
+
+            digest = self._digest_of(result)
+            with self._lock:
+                if digest != self._digest:
+                    self.version += 1
+                    self._digest = digest
+                    self._etag = f'"{self.name}-{self.version}-{digest[:12]}"'
+                self._snapshot = result
+                self._refreshed_at = time.time()
+                self.stats["refreshes"] += 1
+            return result
+
+    def get(self, fresh: bool = False) -> Dict:
+        """返回状态快照及元信息 {result, version, etag, age, fresh}
+
+        有快照时直接返回缓存（过期时唤醒后台刷新）；没有快照或 fresh=True 时同步刷新。
+        """
+        with self._lock:
+            self._last_read = time.time()
+        self._ensure_thread()
+
+        refreshed = False
+        if fresh or self._snapshot is None:
+            self.stats["sync_refreshes"] += 1
+            self.refresh()
+            refreshed = True
+        else:
+            self.stats["hits"] += 1
+            if self.age() > self.ttl:
+                self._wakeup.set()
+
+        with self._lock:
+            return {
+                "result": copy.deepcopy(self._snapshot),
+                "version": self.version,
+                "etag": self._etag,
+                "age": round(self.age(), 3),
+                "fresh": refreshed,
+            }
+
+    @property
+    def has_snapshot(self) -> bool:
+        """是否已有快照（有快照时 get() 不访问仿真器，只返回缓存）"""
+        return self._snapshot is not None
+
+    @property
+    def refreshing(self) -> bool:
+        """后台刷新是否在运行（一段时间无人读取后会暂停）"""
+        return bool(self._thread and self._thread.is_alive())
+
+    def age(self) -> float:
+        return time.time() - self._refreshed_at if self._refreshed_at else float("inf")
+
+    def invalidate(self):
+        """标记快照过期并唤醒后台刷新（仍返回旧快照直到刷新完成）"""
+        with self._lock:
+            self._refreshed_at = min(self._refreshed_at, time.time() - self.ttl - 1)
+        self._wakeup.set()
+
+    def _ensure_thread(self):
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._run, name=f"{self.name}-refresher", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            if self.idle_timeout and time.time() - self._last_read > self.idle_timeout:
+                # 长时间无人读取：暂停刷新，下次读取时重新启动线程
+                with self._lock:
+                    if time.time() - self._last_read > self.idle_timeout:
+                        self._thread = None
+                        self.logger.debug(f"{self.name} refresher idle, pausing")
+                        return
+                continue
+            if self.age() >= self.ttl:
+                self.refresh()
+            self._wakeup.wait(max(self.ttl - self.age(), 0.05))
+            self._wakeup.clear()
+
+    def stop(self):
+        self._stop_event.set()
+        self._wakeup.set()
+
+    def info(self) -> Dict:
+        return {
+            "ttl": self.ttl,
+            "version": self.version,
+            "age": round(self.age(), 3) if self._refreshed_at else None,
+            "refresher_running": self.refreshing,
+            **self.stats
+        }
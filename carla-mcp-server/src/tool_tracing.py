@@ -0,0 +1,290 @@
+"""
+Tool Tracing - MCP工具调用追踪
+每次工具调用生成一个span，记录墙钟耗时、在CARLA RPC工作线程中的排队/执行时间、
+其余的Python时间，以及参数和结果的大小。超过阈值的慢调用保存在有界的内存队列中，
+可通过诊断工具查询；span可以按OpenTelemetry的OTLP/JSON格式逐行导出到本地文件
+（由后台写线程从有界队列中取出写入，队列满时丢弃并计数，文件I/O不在事件循环上）。
+
+当前span通过 contextvars 传递：异步门面把上下文带进线程池，RPC工作线程的
+call() 在调用方线程中把排队和执行时间累加到当前span上
+"""
+
+import atexit
+import contextvars
+import json
+import logging
+import os
+import queue
+import secrets
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional
+
+
+_current_span: contextvars.ContextVar = contextvars.ContextVar("carla_tool_span", default=None)
+
+
+class ToolSpan:
+    """一次工具调用"""
+
+    # 单个span中保留的RPC明细条数上限
+    MAX_RPC_DETAILS = 32
+
+    def __init__(self, tool: str, arg_bytes: int = 0, instance: str = None):
+        self.tool = tool
+        self.trace_id = secrets.token_hex(16)
+        self.span_id = secrets.token_hex(8)
+        self.instance = instance
+        self.start_ns = time.time_ns()
+        self._start = time.perf_counter()
+        self.wall = 0.0
+        self.rpc_wait = 0.0
+        self.rpc_exec = 0.0
+        self.rpc_calls = 0
+        self.rpc_details: List[Dict] = []
+        self.arg_bytes = arg_bytes
+        self.result_bytes = 0
+        self.error: Optional[str] = None
+        self.end_ns = 0
+        self._lock = threading.Lock()
+
+    def add_rpc(self, op: str, wait: float, run: float):
+        with self._lock:
+            self.rpc_calls += 1
+            self.rpc_wait += wait
+            self.rpc_exec += run
+            if len(self.rpc_details) < self.MAX_RPC_DETAILS:
+                self.rpc_details.append({"op": op, "wait": round(wait, 4), "exec": round(run, 4)})
+
+    def finish(self, result_bytes: int = 0, error: str = None):
+        self.wall = time.perf_counter() - self._start
+        self.end_ns = self.start_ns + int(self.wall * 1e9)
+        self.result_bytes = result_bytes
+        self.error = error
+
+    @property
+    def python_time(self) -> float:
+        """墙钟时间中不在RPC工作线程上（排队或执行）的部分"""
+        return max(self.wall - self.rpc_wait - self.rpc_exec, 0.0)
+
+    def to_dict(self) -> Dict:
+        return {
+            "tool": self.tool,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "instance": self.instance,
+            "start": round(self.start_ns / 1e9, 3),
+            "wall": round(self.wall, 4),
+            "rpc_wait": round(self.rpc_wait, 4),
+            "rpc_exec": round(self.rpc_exec, 4),
+            "python": round(self.python_time, 4),
+            "rpc_calls": self.rpc_calls,
+            "rpc_details": list(self.rpc_details),
+            "arg_bytes": self.arg_bytes,
+            "result_bytes": self.result_bytes,
+            "error": self.error,
+        }
+
+    def to_otlp(self, service_name: str) -> Dict:
+        """OTLP/JSON 格式（每行一个 resourceSpans 对象）"""
+        attributes = {
+            "mcp.tool.name": self.tool,
+            "carla.instance": self.instance or "",
+            "carla.rpc.wait_seconds": round(self.rpc_wait, 6),
+            "carla.rpc.exec_seconds": round(self.rpc_exec, 6),
+            "carla.rpc.calls": self.rpc_calls,
+            "python.seconds": round(self.python_time, 6),
+            "mcp.tool.arg_bytes": self.arg_bytes,
+            "mcp.tool.result_bytes": self.result_bytes,
+        }
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": f"tools/call {self.tool}",
+            "kind": 2,  # SPAN_KIND_SERVER
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [_otlp_attribute(key, value) for key, value in attributes.items()],
+            "events": [
+                {"name": "carla.rpc", "attributes": [_otlp_attribute(k, v) for k, v in detail.items()]}
+                for detail in self.rpc_details
+            ],
+            "status": {"code": 2, "message": self.error} if self.error else {"code": 1},
+        }
+        return {
+            "resourceSpans": [{
+                "resource": {"attributes": [_otlp_attribute("service.name", service_name)]},
+                "scopeSpans": [{"scope": {"name": "carla-mcp-server.tool_tracing"}, "spans": [span]}],
+            }]
+        }
+
+
+def _otlp_attribute(key: str, value) -> Dict:
+    if isinstance(value, bool):
+        typed = {"boolValue": value}
+    elif isinstance(value, int):
+        typed = {"intValue": str(value)}
+    elif isinstance(value, float):
+        typed = {"doubleValue": value}
+    else:
+        typed = {"stringValue": str(value)}
+    return {"key": key, "value": typed}
+
+
+def current_span() -> Optional[ToolSpan]:
+    return _current_span.get()
+
+
+def record_rpc(op: str, wait: float, run: float):
+    """把一次RPC工作线程调用的排队/执行时间计入当前span（没有span时什么都不做）"""
+    span = _current_span.get()
+    if span is not None:
+        span.add_rpc(op, wait, run)
+
+
+class ToolTracer:
+    """span的开始/结束、慢调用存储和文件导出"""
+
+    def __init__(self, enabled: bool = True, slow_threshold: float = 1.0, max_slow_calls: int = 100,
+                 export_path: str = None, export_mode: str = "slow", service_name: str = "carla-mcp-server",
+                 export_queue_size: int = 1000):
+        self.enabled = enabled
+        self.slow_threshold = slow_threshold
+        self.export_path = export_path
+        # all：导出所有span；slow：只导出慢调用
+        self.export_mode = export_mode
+        self.service_name = service_name
+
+        self._slow_calls: deque = deque(maxlen=max_slow_calls)
+        self._lock = threading.Lock()
+        # 导出队列和后台写线程（第一次导出时启动）
+        self._export_queue: queue.Queue = queue.Queue(maxsize=export_queue_size)
+        self._writer: Optional[threading.Thread] = None
+        self._atexit_registered = False
+        self.stats = {"spans": 0, "slow": 0, "exported": 0, "export_errors": 0, "export_dropped": 0}
+
+        self.logger = logging.getLogger(__name__)
+
+    @classmethod
+    def from_config(cls, config: Dict) -> "ToolTracer":
+        tracing_config = config.get("tracing", {})
+        return cls(
+            enabled=tracing_config.get("enabled", True),
+            slow_threshold=tracing_config.get("slow_threshold", 1.0),
+            max_slow_calls=tracing_config.get("max_slow_calls", 100),
+            export_path=tracing_config.get("export_path"),
+            export_mode=tracing_config.get("export_mode", "slow"),
+            export_queue_size=tracing_config.get("export_queue_size", 1000),
+        )
+
+    def start(self, tool: str, arg_bytes: int = 0, instance: str = None):
+        """开始一个span并设为当前span，返回 (span, token)；未启用时返回 (None, None)"""
+        if not self.enabled:
+            return None, None
+        span = ToolSpan(tool, arg_bytes, instance)
+        return span, _current_span.set(span)
+
+    def finish(self, span: Optional[ToolSpan], token, result_bytes: int = 0, error: str = None):
+        if span is None:
+            return
+        _current_span.reset(token)
+        span.finish(result_bytes, error)
+
+        slow = span.wall >= self.slow_threshold
+        with self._lock:
+            self.stats["spans"] += 1
+            if slow:
+                self.stats["slow"] += 1
+                self._slow_calls.append(span)
+        if slow:
+            self.logger.info(
+                f"Slow tool call {span.tool}: {span.wall:.3f}s "
+                f"(rpc wait {span.rpc_wait:.3f}s, rpc exec {span.rpc_exec:.3f}s, python {span.python_time:.3f}s)"
+            )
+        if self.export_path and (slow or self.export_mode == "all"):
+            self._export(span)
+
+    def _export(self, span: ToolSpan):
+        """把span放入导出队列（不阻塞调用方，队列满时丢弃）"""
+        self._ensure_writer()
+        try:
+            self._export_queue.put_nowait(span.to_otlp(self.service_name))
+        except queue.Full:
+            with self._lock:
+                self.stats["export_dropped"] += 1
+
+    def _ensure_writer(self):
+        with self._lock:
+            if self._writer is not None and self._writer.is_alive():
+                return
+            self._writer = threading.Thread(target=self._write_loop, name="tool-span-writer", daemon=True)
+            self._writer.start()
+            if not self._atexit_registered:
+                # 进程退出前写完队列中剩余的span
+                atexit.register(self.shutdown)
+                self._atexit_registered = True
+
+    def _write_loop(self):
+        """后台写线程：批量取出队列中的span追加到导出文件，收到None时写完并退出"""
+        while True:
+            batch = [self._export_queue.get()]
+            while True:
+                try:
+                    batch.append(self._export_queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = None in batch
+            spans = [item for item in batch if item is not None]
+            if spans:
+                self._write(spans)
+            if stop:
+                return
+
+    def _write(self, spans: List[Dict]):
+        lines = "".join(json.dumps(item, ensure_ascii=False) + "\n" for item in spans)
+        try:
+            directory = os.path.dirname(self.export_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.export_path, "a", encoding="utf-8") as f:
+                f.write(lines)
+            with self._lock:
+                self.stats["exported"] += len(spans)
+        except OSError as e:
+            with self._lock:
+                self.stats["export_errors"] += len(spans)
+            self.logger.warning(f"Failed to export {len(spans)} spans to {self.export_path}: {e}")
+
+    def shutdown(self, timeout: float = 5.0):
+        """写完队列中剩余的span并停止后台写线程"""
+        writer = self._writer
+        if writer is None or not writer.is_alive():
+            return
+        try:
+            self._export_queue.put(None, timeout=timeout)
+        except queue.Full:
+            return
+        writer.join(timeout)
+
+    def slow_calls(self, limit: int = 20, tool: str = None) -> List[Dict]:
+        """最近的慢调用（新的在前）"""
+        with self._lock:
+            spans = [span for span in reversed(self._slow_calls) if tool is None or span.tool == tool]
+        return [span.to_dict() for span in spans[:limit]]
+
+    def clear(self):
+        with self._lock:
+            self._slow_calls.clear()
+
+    def info(self) -> Dict:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "slow_threshold": self.slow_threshold,
+                "stored_slow_calls": len(self._slow_calls),
+                "export_path": self.export_path,
+                "export_mode": self.export_mode,
+                "export_queue": self._export_queue.qsize(),
+                **self.stats
+            }